@@ -0,0 +1,234 @@
+"""
+Pasos por segundo del agente: `AgentExecutor.invoke` contra el LLM falso de
+`benchmarks/fake_llm_server.py`, en conversaciones de varias herramientas por turno.
+
+Cada conversación es un usuario con su `Memory` (sobre un Firestore en memoria), un `Agent`
+propio apuntando al servidor falso y herramientas locales que solo esperan `--tool-ms`. El
+servidor responde por reglas: `--tool-steps` acciones por turno y después el `final_answer`,
+así que cada turno son `--tool-steps + 1` pasos del agente (más los reintentos, si hay errores
+o salidas que no se pueden parsear). Se mide el throughput de pasos y turnos y la latencia por
+turno, con streaming o sin él, en modo texto o function calling.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.agent_steps --conversations 40 --concurrency 8 --turns 2 --tool-steps 2 --stream --usage-style groq
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_llm_server import add_arguments, build_server
+from benchmarks.loadtest.fakes import FakeFirestore, write_dummy_credentials
+from src.utils.stats import RollingWindow
+
+MODEL = "llama-3.3-70b-versatile"
+
+TEXTS = [
+    "Agenda una reunión con Ana mañana a las 10 y avísale por correo",
+    "¿Qué tengo el viernes? Si hay algo a las 9, muévelo a las 11",
+    "Envía un correo a juan@example.com diciendo que llego tarde",
+]
+
+
+def _configure_env(args, workdir: str, firebase_path: str, client_secret_path: str):
+    """Variables que lee `Config`; deben estar antes de importar `src`."""
+    os.environ.update(
+        {
+            "META_BASE_ENDPOINT": "http://127.0.0.1:9",
+            "META_TOKEN": "bench",
+            "META_ID": "bench",
+            "GROQ_API_KEY": "bench",
+            "HF_TOKEN": "bench",
+            "SECRET_KEY": "bench",
+            "FIREBASE_CREDENTIALS_PATH": firebase_path,
+            "CLIENT_SECRET_PATH": client_secret_path,
+            "REDIRECT_URI": "http://127.0.0.1",
+            "TIMEZONE": "America/Lima",
+            "LANGUAGE": "es",
+            "EMAIL_JOBS_SQLITE_PATH": os.path.join(workdir, "email_jobs.sqlite3"),
+            "DEDUP_SQLITE_PATH": "",
+            "LLM_TELEMETRY_PATH": "",
+            "LLM_ROUTING_ENABLED": "false",
+            "LLM_COMPLEXITY_ROUTING_ENABLED": "false",
+            "AGENT_STREAMING": str(args.stream).lower(),
+            "AGENT_TOOL_MODE": args.tool_mode,
+            # Que el presupuesto por turno no corte los `--tool-steps` (salvo que se fije a mano)
+            "AGENT_TURN_MAX_TOOL_CALLS": os.environ.get("AGENT_TURN_MAX_TOOL_CALLS", "0"),
+            "AGENT_NATIVE_TOOLS_MODELS": MODEL,
+            "LOG_LEVEL": args.log_level,
+        }
+    )
+
+
+def _bench_tools(tool_ms: float) -> dict:
+    """Herramientas locales con la misma forma que las reales (collector, `BaseToolResponse`) y latencia fija."""
+    import uuid
+
+    from src.agent.tools.collectors import BaseToolCollector, Collector
+    from src.components.tool import set_action
+
+    def run(tool_name: str, response: dict, kwargs: dict):
+        call_id = f"tool-call--{uuid.uuid4().hex}"
+        collector: Collector = kwargs.get("collector", Collector())
+        collector.add_tool_collector(BaseToolCollector, call_id)
+        collector.set_last_tool_call_id(call_id=call_id)
+        time.sleep(tool_ms / 1000)
+        return collector.ToolsCollector[call_id].add_tool_response(
+            call_id=call_id,
+            tool_name=tool_name,
+            tool_response=response,
+            tool_friendly_response=response,
+            response_type=dict,
+            usage={"response_time": tool_ms / 1000},
+        )
+
+    @set_action
+    def search_events(date: str, **kwargs) -> dict:
+        """
+        To list the user's calendar events on a given date.
+
+        Args:
+            date: The date to search, in YYYY-MM-DD format.
+        """
+        return run("search_events", {"events": [{"summary": "Reunión", "start": f"{date}T09:00:00"}]}, kwargs)
+
+    @set_action
+    def create_event(summary: str, start: str, **kwargs) -> dict:
+        """
+        To create an event in the user's calendar.
+
+        Args:
+            summary: The title of the event.
+            start: The start date and time, in ISO 8601 format.
+        """
+        return run("create_event", {"status": "confirmed", "summary": summary, "start": start}, kwargs)
+
+    @set_action
+    def send_email(to: str, body: str, **kwargs) -> dict:
+        """
+        To send an email on behalf of the user.
+
+        Args:
+            to: The recipient email address.
+            body: The body of the email.
+        """
+        return run("send_email", {"status": "sent", "to": to}, kwargs)
+
+    return {tool.name: tool for tool in (search_events, create_event, send_email)}
+
+
+def _conversation(index: int, args, llm_url: str, firestore: FakeFirestore, tools: dict) -> list[float]:
+    """Los turnos de un usuario; devuelve la latencia de cada uno."""
+    from src.agent.agent_ import Agent, AgentExecutor
+    from src.agent.tools.collectors import Collector
+    from src.components.llms import BaseGenericLLM
+    from src.components.memory import Memory
+    from src.firebase.users_manager import UserManager
+
+    user_manager = UserManager(firestore, f"5199{index:07d}", "bench", f"wamid.BENCH{index}")
+    memory = Memory(tools=tools, user_manager=user_manager)
+    agent = Agent()
+    agent.llm_model = BaseGenericLLM(api_key="bench", base_url=f"{llm_url}/v1", default_model_name=MODEL)
+
+    latencies = []
+    for turn in range(args.turns):
+        memory.add_user_message(TEXTS[(index + turn) % len(TEXTS)], f"wamid.BENCH{index}-{turn}")
+        executor = AgentExecutor(agent, tools, memory, Collector())
+        start = time.perf_counter()
+        response = executor.invoke(max_iterations=args.tool_steps + 2)
+        latencies.append(time.perf_counter() - start)
+        memory.add_assistant_message(response.final_answer, f"wamid.BENCH{index}-{turn}-out")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8, help="conversaciones simultáneas")
+    parser.add_argument("--turns", type=int, default=2, help="mensajes del usuario por conversación")
+    parser.add_argument("--tool-ms", type=float, default=50, help="latencia de cada herramienta")
+    parser.add_argument("--stream", action="store_true", help="AGENT_STREAMING=true")
+    parser.add_argument("--tool-mode", choices=["text", "native"], default="text")
+    parser.add_argument("--firestore-ms", type=float, default=0, help="latencia media de Firestore")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="imprime también el resultado en JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agent-steps-")
+    firebase_path, client_secret_path = write_dummy_credentials(workdir)
+    _configure_env(args, workdir, firebase_path, client_secret_path)
+
+    from src.agent.budget import turn_stats
+    from src.agent.native_tools import tool_mode_stats
+    from src.agent.parsing import parse_stats
+    from src.agent.streaming import stream_stats
+
+    llm = build_server(args).start()
+    firestore = FakeFirestore(latency_ms=args.firestore_ms, seed=args.seed)
+    tools = _bench_tools(args.tool_ms)
+
+    turn_latency = RollingWindow(max_samples=1_000_000)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(_conversation, i, args, llm.url, firestore, tools) for i in range(args.conversations)
+            ]
+            for future in futures:
+                for latency in future.result():
+                    turn_latency.add(latency)
+        elapsed = time.perf_counter() - start
+    finally:
+        llm.stop()
+
+    server = llm.snapshot()
+    modes = tool_mode_stats.snapshot()
+    steps = sum(count for key, count in modes["counts"].items() if key.endswith("_steps"))
+    turns = args.conversations * args.turns
+    latency = turn_latency.summary()
+
+    print(
+        f"modo: {args.tool_mode}{' + streaming' if args.stream else ''}  uso: {args.usage_style}  "
+        f"herramientas por turno: {args.tool_steps}  concurrencia: {args.concurrency}"
+    )
+    print(f"turnos: {turns} en {elapsed:.2f}s = {turns / elapsed:.2f} turnos/s")
+    print(f"pasos del agente: {steps} = {steps / elapsed:.2f} pasos/s  ({steps / max(turns, 1):.2f} por turno)")
+    print(
+        "latencia por turno (s): "
+        f"p50={latency['p50']:.3f} p95={latency['p95']:.3f} p99={latency['p99']:.3f} "
+        f"max={latency['max']:.3f} media={latency['mean']:.3f}"
+    )
+    print(
+        f"LLM falso: llamadas={server['calls']} streams={server['streams']} fallidas={server['failed']} "
+        f"acciones={server['tool_calls']} final_answer={server['final_answers']} "
+        f"tokens entrada={server['prompt_tokens']} salida={server['completion_tokens']}"
+    )
+    print(f"fin de turno: {turn_stats.snapshot()['outcomes']}")
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "steps_per_second": steps / elapsed,
+                    "turns_per_second": turns / elapsed,
+                    "turn_latency": latency,
+                    "server": server,
+                    "tool_modes": modes,
+                    "agent_parsing": parse_stats.snapshot(),
+                    "agent_streaming": stream_stats.snapshot(),
+                    "agent_turns": turn_stats.snapshot(),
+                },
+                default=str,
+            )
+        )
+    print(f"archivos temporales en {workdir}")
+
+
+if __name__ == "__main__":
+    main()
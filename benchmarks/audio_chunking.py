@@ -0,0 +1,140 @@
+"""
+Transcripción de notas de voz: una sola petición vs chunks en paralelo (`ChunkedTranscriber`).
+
+Genera notas sintéticas en OGG/Opus (como las de WhatsApp) de varias duraciones: ráfagas de
+tono de 1.5 a 5 segundos, separadas por pausas de 0.3 a 1.2 segundos, sobre ruido de fondo.
+Whisper se reemplaza por un stand-in cuya latencia es la de una subida a `--uplink-mbps` más
+un overhead fijo por petición más la duración del audio dividida por `--speed` (el factor de
+tiempo real del proveedor), así que el resultado depende de cómo se corta la nota y de cuánto
+pesan los chunks, no de la red.
+
+Necesita pydub y ffmpeg (con libopus).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.audio_chunking --lengths 15 60 180 300 --speed 60 --overhead-ms 300 --workers 4
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+os.environ.update(
+    {
+        name: os.environ.get(name, "bench")
+        for name in (
+            "GROQ_API_KEY", "HF_TOKEN", "SECRET_KEY", "FIREBASE_CREDENTIALS_PATH", "CLIENT_SECRET_PATH",
+            "REDIRECT_URI", "META_BASE_ENDPOINT", "META_TOKEN", "META_ID",
+        )
+    }
+)
+os.environ.setdefault("TIMEZONE", "America/Lima")
+os.environ.setdefault("LANGUAGE", "es")
+
+from pydub import AudioSegment
+from pydub.generators import Sine, WhiteNoise
+
+from src.whatsapp.audio import ChunkedTranscriber
+
+
+def synthetic_note(seconds: float, rng: random.Random) -> bytes:
+    """Una nota OGG/Opus de `seconds` segundos con 'frases' (tonos) y pausas."""
+    length_ms = int(seconds * 1000)
+    parts = []
+    position = 0
+    while position < length_ms:
+        speech = min(rng.randint(1500, 5000), length_ms - position)
+        parts.append(Sine(rng.randint(140, 320)).to_audio_segment(duration=speech, volume=-12))
+        position += speech
+        pause = min(rng.randint(300, 1200), max(0, length_ms - position))
+        if pause:
+            parts.append(AudioSegment.silent(duration=pause, frame_rate=48000))
+            position += pause
+
+    voice = sum(parts[1:], parts[0]).set_frame_rate(48000)
+    noise = WhiteNoise().to_audio_segment(duration=len(voice), volume=-55).set_frame_rate(48000)
+    buffer = io.BytesIO()
+    voice.overlay(noise).export(buffer, format="ogg", codec="libopus", bitrate="24k")
+    return buffer.getvalue()
+
+
+class StandInWhisper:
+    """`audio_transcription_llm` con latencia de subida + overhead + duración / velocidad."""
+
+    def __init__(self, *, speed: float, overhead_ms: float, uplink_mbps: float):
+        self.speed = speed
+        self.overhead_ms = overhead_ms
+        self.uplink_mbps = uplink_mbps
+        self.calls = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def audio_transcription_llm(self, file_path=None, temperature=0.1, *, audio: bytes, filename: str = "audio.ogg"):
+        start = time.perf_counter()
+        duration = len(AudioSegment.from_file(io.BytesIO(audio))) / 1000
+        with self._lock:
+            self.calls += 1
+            self.bytes += len(audio)
+        target = self.overhead_ms / 1000 + len(audio) * 8 / (self.uplink_mbps * 1e6) + duration / self.speed
+        time.sleep(max(0.0, target - (time.perf_counter() - start)))
+        return f"[{filename}: {duration:.1f}s]"
+
+
+def _timed(fn, repeat: int) -> tuple[float, str]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=float, nargs="+", default=[15, 60, 180, 300], help="segundos de cada nota")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por nota (se reporta la mediana)")
+    parser.add_argument("--speed", type=float, default=60, help="segundos de audio transcritos por segundo")
+    parser.add_argument("--overhead-ms", type=float, default=300, help="latencia fija por petición")
+    parser.add_argument("--uplink-mbps", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="chunks transcritos a la vez")
+    parser.add_argument("--chunk-seconds", type=float, default=30)
+    parser.add_argument("--max-chunk-seconds", type=float, default=60)
+    parser.add_argument("--chunk-format", default="flac")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    whisper = StandInWhisper(speed=args.speed, overhead_ms=args.overhead_ms, uplink_mbps=args.uplink_mbps)
+    transcriber = ChunkedTranscriber(
+        whisper,
+        chunk_seconds=args.chunk_seconds,
+        max_chunk_seconds=args.max_chunk_seconds,
+        chunk_format=args.chunk_format,
+        workers=args.workers,
+    )
+
+    print(f"{'nota':>7} {'KB':>7} {'una petición':>13} {'chunks':>8} {'paralelo':>9} {'preproc.':>9} {'speedup':>8}")
+    for seconds in args.lengths:
+        note = synthetic_note(seconds, rng)
+        single, _ = _timed(lambda: whisper.audio_transcription_llm(audio=note, filename="note.ogg"), args.repeat)
+        chunked, _ = _timed(lambda: transcriber.transcribe(note, "note.ogg"), args.repeat)
+        start = time.perf_counter()
+        chunks = len(transcriber.split(note))
+        preprocessing = time.perf_counter() - start
+        print(
+            f"{seconds:>6.0f}s {len(note) / 1024:>7.1f} {single:>12.2f}s {chunks:>8} {chunked:>8.2f}s "
+            f"{preprocessing * 1000:>7.0f}ms {single / chunked:>7.2f}x"
+        )
+
+    print(f"stand-in: {whisper.calls} peticiones, {whisper.bytes / 1024:.0f} KB subidos")
+    print(f"transcriptor: {transcriber.snapshot()['counts']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput de la cola de entrada con cada backend de ejecución (thread, process, asyncio).
+
+Cada tarea imita un turno del agente sin red: parte CPU (deserializar y serializar un
+documento `UsersCollection` con historial largo y armar el prompt) y parte I/O simulada
+(esperar al LLM y a Firestore).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.executor_backends --tasks 200 --users 50 --workers 1 4 8 --history 200 --io-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from functools import partial
+
+# Los procesos del pool leen `Config` al arrancar (logging y límites de los LLMs)
+os.environ.update(
+    {
+        name: os.environ.get(name, "bench")
+        for name in (
+            "GROQ_API_KEY", "HF_TOKEN", "SECRET_KEY", "FIREBASE_CREDENTIALS_PATH", "CLIENT_SECRET_PATH",
+            "REDIRECT_URI", "META_BASE_ENDPOINT", "META_TOKEN", "META_ID",
+        )
+    }
+)
+os.environ.setdefault("TIMEZONE", "America/Lima")
+os.environ.setdefault("LANGUAGE", "es")
+
+from src.components.prompt import ChatTemplate
+from src.firebase.types import UsersCollection
+from src.ingress.executors import EXECUTOR_MODES, create_backend
+from src.ingress.ingress import IngressQueue
+
+
+def _user_document(user_phone: str, history: int) -> dict:
+    return {
+        "phone": user_phone,
+        "bot_phone": "15550000000",
+        "current_waids": [f"wamid.{i}" for i in range(100)],
+        "messages": [
+            {
+                "sender": user_phone if i % 2 else "assistant",
+                "content": f"Mensaje {i}: " + "lorem ipsum dolor sit amet " * 20,
+                "created_at": "2025-01-01T00:00:00+00:00",
+                "waid": f"wamid.{i}",
+                "role": "user" if i % 2 else "assistant",
+            }
+            for i in range(history)
+        ],
+    }
+
+
+def _cpu_part(user_phone: str, history: int):
+    raw = json.dumps(_user_document(user_phone, history))
+    document = UsersCollection.from_json(json.loads(raw))
+    template = ChatTemplate(messages=[m.get_llm_legible_message() for m in document.messages])
+    json.dumps(template.get_messages_dict())
+    json.dumps(document.to_json())
+
+
+def bench_task(user_phone: str, payloads: list, history: int, io_ms: float):
+    _cpu_part(user_phone, history)
+    time.sleep(io_ms / 1000)
+
+
+async def _run_mode(mode: str, workers: int, tasks: int, users: int, history: int, io_ms: float) -> float:
+    # La misma tarea síncrona en todos los modos, como `run_chat_task` en producción
+    handler = partial(bench_task, history=history, io_ms=io_ms)
+    queue = IngressQueue(
+        handler,
+        backend=create_backend(mode, workers),
+        workers=workers,
+        max_pending=tasks,
+        max_pending_per_user=tasks,
+        max_batch=1,
+    )
+    await queue.start()
+    if mode == "process":
+        # Calentamos los procesos para no medir el arranque de `spawn`
+        await asyncio.gather(*(queue.backend.run(handler, "warmup", []) for _ in range(workers)))
+
+    start = time.perf_counter()
+    for i in range(tasks):
+        queue.submit(f"5199{i % users:07d}", {"n": i})
+    while queue.metrics.processed + queue.metrics.failed < tasks:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - start
+
+    await queue.stop()
+    assert queue.metrics.failed == 0, queue.snapshot()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(EXECUTOR_MODES), choices=EXECUTOR_MODES)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history", type=int, default=200, help="mensajes en el historial de cada usuario")
+    parser.add_argument("--io-ms", type=float, default=50.0, help="espera simulada de LLM/Firestore por tarea")
+    args = parser.parse_args()
+
+    print(f"tareas={args.tasks} usuarios={args.users} historial={args.history} io={args.io_ms}ms")
+    print(f"{'modo':>8} {'workers':>8} {'segundos':>9} {'tareas/s':>9}")
+    for mode in args.modes:
+        for workers in args.workers:
+            elapsed = asyncio.run(
+                _run_mode(mode, workers, args.tasks, args.users, args.history, args.io_ms)
+            )
+            print(f"{mode:>8} {workers:>8} {elapsed:>9.2f} {args.tasks / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
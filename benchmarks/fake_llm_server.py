@@ -0,0 +1,398 @@
+"""
+Servidor OpenAI-compatible falso y determinista para medir el agente sin gastar cuota del proveedor.
+
+Responde `/v1/chat/completions` (con y sin streaming) y `/v1/audio/transcriptions`, así que
+`BaseGenericLLM(base_url=".../v1")` lo usa como a cualquier proveedor. Las respuestas siguen
+el protocolo de `SYSTEM_2` (`Action:` + JSON + `<end_action>`) o, si la petición trae `tools`,
+son `tool_calls` de function calling. Dos modos:
+
+- por reglas (por defecto): en cada turno llama `--tool-steps` herramientas de las que ofrece
+  la petición (en orden, con argumentos de ejemplo según su tipo) y después da un `final_answer`;
+- guionado (`--script archivo.json`, una lista de textos): devuelve los textos en orden, tal
+  cual, para reproducir salidas concretas (mal formadas incluidas).
+
+La latencia es tiempo al primer token (`--ttft-ms`, distribución fija, uniforme o lognormal)
+más los tokens de salida a `--tokens-per-second`. En streaming el uso llega al final como en
+OpenAI (chunk sin `choices`) o como en Groq (`x_groq.usage`). Con `--error-rate` una fracción
+de las peticiones responde `--error-status` (429 con `retry-after`, 500, 503).
+
+El contenido es determinista; la latencia también, por petición: se sortea con una semilla
+derivada del cuerpo de la petición y de `--seed`.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.fake_llm_server --port 8800 --tool-steps 2 --ttft-ms 300 --tokens-per-second 250
+"""
+import argparse
+import ast
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+
+from benchmarks.loadtest.fakes import FakeHTTPServer
+
+ACTION_EXECUTED = "Action executed:"
+USER_MESSAGE = "User current message is:"
+
+# Herramientas en el system prompt de `SYSTEM_2` (`get_task_prompt`)
+_PROMPT_TOOL = re.compile(r"^- (\w+): (?:(?!^- ).)*?^\s*Takes inputs: (\{.*?\})\s*$", re.MULTILINE | re.DOTALL)
+
+_SAMPLE_VALUES = {
+    "string": "2025-01-01",
+    "integer": 1,
+    "number": 1.0,
+    "boolean": True,
+    "array": [],
+}
+
+
+class Latency:
+    """Latencia en segundos: `fixed`, `uniform` (±`spread`) o `lognormal` (cola larga) alrededor de `mean_ms`."""
+
+    KINDS = ("fixed", "uniform", "lognormal")
+
+    def __init__(self, mean_ms: float, kind: str = "lognormal", spread: float = 0.35):
+        if kind not in self.KINDS:
+            raise ValueError(f"Distribución desconocida: {kind}")
+        self.mean_ms = mean_ms
+        self.kind = kind
+        self.spread = spread
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.kind == "fixed":
+            return self.mean_ms / 1000
+        if self.kind == "uniform":
+            return self.mean_ms / 1000 * rng.uniform(1 - self.spread, 1 + self.spread)
+        # Normalizada para que la media sea `mean_ms`
+        return self.mean_ms / 1000 * rng.lognormvariate(0, self.spread) / math.exp(self.spread**2 / 2)
+
+
+def react_content(thought: str, action: str, action_input: dict) -> str:
+    """Una acción en el formato de `SYSTEM_2`."""
+    blob = json.dumps({"action": action, "action_input": action_input}, ensure_ascii=False)
+    return f"Thought: {thought}\nAction:\n{blob}<end_action>"
+
+
+def _text_of(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def offered_tools(request: dict) -> list[tuple[str, dict[str, str]]]:
+    """`(nombre, {parámetro: tipo})` de las herramientas de la petición: `tools` o, si no, el system prompt."""
+    if request.get("tools"):
+        tools = []
+        for tool in request["tools"]:
+            function = tool.get("function", {})
+            parameters = function.get("parameters", {})
+            required = set(parameters.get("required", []))
+            tools.append(
+                (
+                    function.get("name", ""),
+                    {
+                        name: spec.get("type", "string")
+                        for name, spec in parameters.get("properties", {}).items()
+                        if name in required
+                    },
+                )
+            )
+        return tools
+
+    system = next((_text_of(m) for m in request.get("messages", []) if m.get("role") == "system"), "")
+    tools = []
+    for name, inputs in _PROMPT_TOOL.findall(system):
+        try:
+            specs = ast.literal_eval(inputs)
+        except (ValueError, SyntaxError):
+            specs = {}
+        tools.append(
+            (
+                name,
+                {
+                    param: spec.get("type", "string")
+                    for param, spec in specs.items()
+                    if isinstance(spec, dict) and not spec.get("type", "").startswith("Optional[")
+                },
+            )
+        )
+    return tools
+
+
+def tool_steps_done(messages: list[dict]) -> int:
+    """Herramientas ejecutadas desde el último mensaje del usuario."""
+    last_user = max((i for i, m in enumerate(messages) if USER_MESSAGE in _text_of(m)), default=-1)
+    return sum(1 for m in messages[last_user + 1 :] if _text_of(m).startswith(ACTION_EXECUTED))
+
+
+class FakeOpenAIServer(FakeHTTPServer):
+    """
+    Proveedor OpenAI-compatible local. `script` (lista de textos) fija las respuestas en orden;
+    sin `script` responde por reglas con `tool_steps` herramientas por turno. `usage_style`
+    es `openai` o `groq` (dónde va el uso en streaming).
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        script: list[str] | None = None,
+        tool_steps: int = 1,
+        answer: str = "Listo, ya quedó. ¿Necesitas algo más?",
+        ttft: Latency | None = None,
+        tokens_per_second: float = 250.0,
+        chunk_tokens: int = 4,
+        usage_style: str = "openai",
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after: float = 1.0,
+        transcription: str = "Recuérdame revisar el correo mañana a las nueve.",
+        seed: int = 0,
+    ):
+        super().__init__(host, port)
+        self.script = script
+        self.tool_steps = tool_steps
+        self.answer = answer
+        self.ttft = ttft or Latency(300)
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.usage_style = usage_style
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.transcription = transcription
+        self.seed = seed
+        self.counts = {
+            "calls": 0,
+            "streams": 0,
+            "failed": 0,
+            "tool_calls": 0,
+            "final_answers": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self._script = itertools.cycle(script) if script else None
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _count(self, **amounts: int):
+        with self._lock:
+            for key, amount in amounts.items():
+                self.counts[key] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def _rng(self, body: bytes) -> random.Random:
+        return random.Random(zlib.crc32(body) ^ self.seed)
+
+    def _output_delay(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def handle(self, method, path, body):
+        path = path.split("?", 1)[0]
+        rng = self._rng(body)
+        self._count(calls=1)
+
+        if rng.random() < self.error_rate:
+            self._count(failed=1)
+            time.sleep(self.ttft.sample(rng))
+            return self._error(self.error_status)
+
+        if method == "POST" and path.endswith("/audio/transcriptions"):
+            time.sleep(self.ttft.sample(rng))
+            return self.json_response({"text": self.transcription})
+
+        if method == "POST" and path.endswith("/chat/completions"):
+            request = json.loads(body)
+            return self._chat(request, rng)
+
+        return self.json_response({"error": {"message": f"Ruta no soportada: {path}"}}, 404)
+
+    def _error(self, status: int) -> tuple:
+        if status == 429:
+            return (
+                *self.json_response(
+                    {"error": {"message": "Rate limit reached (fake)", "type": "tokens", "code": "rate_limit_exceeded"}},
+                    429,
+                ),
+                {"retry-after": f"{self.retry_after:g}", "x-ratelimit-reset-requests": f"{self.retry_after:g}s"},
+            )
+        return self.json_response({"error": {"message": "Fake overload", "type": "server_error"}}, status)
+
+    def _completion(self, request: dict) -> tuple[str | None, list[dict] | None, str | None]:
+        """`(texto, tool_calls, tipo)` de la respuesta; `tipo` es `tool`, `final` o `None` si es guionada."""
+        if self._script:
+            with self._lock:
+                return next(self._script), None, None
+
+        done = tool_steps_done(request.get("messages", []))
+        tools = offered_tools(request)
+        if tools and done < self.tool_steps:
+            name, params = tools[done % len(tools)]
+            arguments = {param: _SAMPLE_VALUES.get(kind, "valor") for param, kind in params.items()}
+            if request.get("tools"):
+                call = {"id": f"call_{next(self._ids):08d}", "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}}
+                return None, [call], "tool"
+            return react_content(f"Necesito usar {name} para avanzar.", name, arguments), None, "tool"
+
+        if request.get("tools"):
+            return self.answer, None, "final"
+        return react_content("Ya tengo todo lo necesario.", "final_answer", {"answer": self.answer}), None, "final"
+
+    def _chat(self, request: dict, rng: random.Random) -> tuple:
+        content, tool_calls, kind = self._completion(request)
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if content is not None:
+            # Como los proveedores: el texto termina antes de la secuencia de corte, que no se incluye
+            for stop in request.get("stop") or []:
+                if stop in content:
+                    content = content.split(stop, 1)[0]
+            max_tokens = request.get("max_tokens")
+            if max_tokens and len(content) > max_tokens * 4:
+                content = content[: max_tokens * 4]
+                finish_reason = "length"
+
+        prompt_tokens = (
+            sum(len(_text_of(m)) for m in request.get("messages", [])) + len(json.dumps(request.get("tools") or []))
+        ) // 4
+        completion_tokens = max(1, len(content or json.dumps(tool_calls)) // 4)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self._count(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            tool_calls=int(kind == "tool"),
+            final_answers=int(kind == "final"),
+        )
+        completion_id = f"chatcmpl-{rng.getrandbits(48):012x}"
+        model = request.get("model", "")
+        ttft = self.ttft.sample(rng)
+
+        if request.get("stream"):
+            self._count(streams=1)
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            return 200, "text/event-stream", self._stream(
+                completion_id, model, content, tool_calls, finish_reason, usage, ttft, include_usage
+            )
+
+        time.sleep(ttft + self._output_delay(completion_tokens))
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return self.json_response(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+        )
+
+    def _stream(self, completion_id, model, content, tool_calls, finish_reason, usage, ttft, include_usage):
+        """Eventos SSE: rol, el texto en chunks de `chunk_tokens` tokens al ritmo configurado, fin y uso."""
+        created = int(time.time())
+
+        def event(choices: list[dict], **extra) -> bytes:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+
+        def delta(fields: dict, finish: str | None = None) -> list[dict]:
+            return [{"index": 0, "delta": fields, "finish_reason": finish}]
+
+        groq = self.usage_style == "groq"
+        time.sleep(ttft)
+        yield event(delta({"role": "assistant", "content": ""}), **({"x_groq": {"id": f"req_{completion_id}"}} if groq else {}))
+
+        if tool_calls:
+            time.sleep(self._output_delay(usage["completion_tokens"]))
+            yield event(delta({"tool_calls": [{"index": i, **call} for i, call in enumerate(tool_calls)]}))
+        else:
+            step = self.chunk_tokens * 4
+            for start in range(0, len(content), step):
+                time.sleep(self._output_delay(self.chunk_tokens))
+                yield event(delta({"content": content[start : start + step]}))
+
+        if groq:
+            yield event(delta({}, finish_reason), x_groq={"id": f"req_{completion_id}", "usage": usage})
+        else:
+            yield event(delta({}, finish_reason))
+            if include_usage:
+                yield event([], usage=usage)
+        yield b"data: [DONE]\n\n"
+
+
+def build_server(args, **kwargs) -> FakeOpenAIServer:
+    """El servidor con las opciones de `add_arguments`."""
+    script = None
+    if args.script:
+        with open(args.script) as file:
+            script = json.load(file)
+    return FakeOpenAIServer(
+        script=script,
+        tool_steps=args.tool_steps,
+        ttft=Latency(args.ttft_ms, args.latency, args.latency_spread),
+        tokens_per_second=args.tokens_per_second,
+        chunk_tokens=args.chunk_tokens,
+        usage_style=args.usage_style,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        **kwargs,
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--script", default=None, help="JSON con la lista de respuestas a devolver en orden")
+    parser.add_argument("--tool-steps", type=int, default=1, help="herramientas por turno antes del final_answer")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="tiempo medio al primer token")
+    parser.add_argument("--latency", choices=Latency.KINDS, default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.35)
+    parser.add_argument("--tokens-per-second", type=float, default=250, help="ritmo de generación (0: instantáneo)")
+    parser.add_argument("--chunk-tokens", type=int, default=4, help="tokens por chunk en streaming")
+    parser.add_argument("--usage-style", choices=["openai", "groq"], default="openai")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, choices=[429, 500, 503], default=503)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="segundos de `retry-after` en los 429")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = build_server(args, host=args.host, port=args.port).start()
+    print(f"LLM falso en {server.url}/v1 (Ctrl+C para terminar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
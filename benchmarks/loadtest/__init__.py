@@ -0,0 +1,5 @@
+"""
+Prueba de carga de punta a punta: levanta `src.app.app` con uvicorn y reemplaza los servicios
+externos por stand-ins locales (Graph API de Meta, endpoint OpenAI-compatible y Firestore en
+memoria). Ver `benchmarks/loadtest/__main__.py`.
+"""
@@ -0,0 +1,300 @@
+"""
+Prueba de carga de punta a punta del webhook.
+
+Levanta `src.app.app` con uvicorn en un hilo y reemplaza los servicios externos por stand-ins
+locales (`benchmarks/loadtest/fakes.py`): la Graph API de Meta (envío de mensajes y descarga de
+notas de voz), un endpoint OpenAI-compatible para `BaseGenericLLM` (chat y transcripción) y un
+Firestore en memoria en lugar de `db`. Después envía webhooks de texto y audio a
+`/wsp-webhook` a un ritmo fijo (lazo abierto) y mide, por mensaje, el tiempo desde que se envía
+el webhook hasta que el bot envía la respuesta a ese usuario.
+
+Con debounce activo varios mensajes de un usuario se responden con un solo envío: todos los
+mensajes pendientes del usuario se dan por respondidos en ese envío.
+
+Solo sirve con los backends `thread` y `asyncio`: los procesos de `process` importan sus
+propios clientes y no verían los stand-ins.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.loadtest --rate 20 --duration 30 --users 200 --audio-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.loadtest.fakes import FakeFirestore, FakeGraphAPI, FakeLLMAPI, write_dummy_credentials
+from benchmarks.payloads import BOT_PHONE_ID, audio_webhook, text_webhook
+from src.utils.stats import RollingWindow
+
+TEXTS = [
+    "Hola, ¿qué tengo en mi agenda hoy?",
+    "Agenda una reunión con Ana mañana a las 10",
+    "Envía un correo a juan@example.com diciendo que llego tarde",
+    "¿Tengo algo el viernes por la tarde?",
+    "Gracias!",
+]
+
+
+class LatencyTracker:
+    """Empareja cada webhook enviado con la siguiente respuesta que el bot envía al mismo usuario."""
+
+    def __init__(self, max_samples: int = 1_000_000):
+        self.latency = RollingWindow(max_samples=max_samples)
+        self.replies = 0
+        self.first_receipt = 0.0
+        self.last_reply = 0.0
+        self._pending: dict[str, list[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def receipt(self, user_phone: str) -> float:
+        sent_at = time.perf_counter()
+        with self._lock:
+            self._pending[user_phone].append(sent_at)
+            self.first_receipt = self.first_receipt or sent_at
+        return sent_at
+
+    def cancel(self, user_phone: str, sent_at: float):
+        with self._lock:
+            if sent_at in self._pending[user_phone]:
+                self._pending[user_phone].remove(sent_at)
+
+    def on_send(self, user_phone: str, sent_at: float):
+        with self._lock:
+            answered = [t for t in self._pending[user_phone] if t <= sent_at]
+            self._pending[user_phone] = [t for t in self._pending[user_phone] if t > sent_at]
+            self.replies += 1
+            self.last_reply = sent_at
+        for received_at in answered:
+            self.latency.add(sent_at - received_at)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(times) for times in self._pending.values())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_env(args, graph: FakeGraphAPI, workdir: str, firebase_path: str, client_secret_path: str):
+    """Variables que lee `Config`; deben estar antes de importar `src`."""
+    env = {
+        "META_BASE_ENDPOINT": graph.url,
+        "META_TOKEN": "loadtest",
+        "META_ID": BOT_PHONE_ID,
+        "GROQ_API_KEY": "loadtest",
+        "HF_TOKEN": "loadtest",
+        "SECRET_KEY": "loadtest",
+        "FIREBASE_CREDENTIALS_PATH": firebase_path,
+        "CLIENT_SECRET_PATH": client_secret_path,
+        "REDIRECT_URI": "http://127.0.0.1",
+        "TIMEZONE": "America/Lima",
+        "LANGUAGE": "es",
+        "EMAIL_JOBS_SQLITE_PATH": os.path.join(workdir, "email_jobs.sqlite3"),
+        "DEDUP_SQLITE_PATH": "",
+        "INGRESS_EXECUTOR": args.executor,
+        "INGRESS_WORKERS": str(args.workers),
+        "LOG_LEVEL": args.log_level,
+    }
+    if args.debounce_ms is not None:
+        env["INGRESS_DEBOUNCE_MS"] = str(args.debounce_ms)
+    if args.max_pending is not None:
+        env["INGRESS_MAX_PENDING"] = str(args.max_pending)
+    os.environ.update(env)
+
+
+def _install_stand_ins(llm_url: str, firestore: FakeFirestore):
+    """Cambia `db` y los clientes de `default_llms` ya importados por los stand-ins."""
+    from openai import OpenAI
+
+    import src.google.google_services as google_services
+    from src.components.llms import default_llms
+    from src.components.routing import routing_llm_70b
+    from src.agent.complexity import complexity_router
+
+    real_db = google_services.db
+    for name, module in list(sys.modules.items()):
+        if name.startswith("src") and getattr(module, "db", None) is real_db:
+            module.db = firestore
+
+    for llm in [*default_llms.values(), *routing_llm_70b.providers, complexity_router.small]:
+        llm.llm_client = OpenAI(api_key="loadtest", base_url=f"{llm_url}/v1")
+
+
+async def _drive(base_url: str, args, tracker: LatencyTracker) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    users = [f"5199{i:07d}" for i in range(args.users)]
+    # Notas "reenviadas": el mismo contenido (sha256) llega a varios usuarios
+    forwarded = [f"{rng.getrandbits(256):064x}" for _ in range(args.forwarded_notes)]
+    total = int(args.rate * args.duration)
+    results = Counter()
+    kinds = Counter()
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+
+        async def post(user_phone: str, body: bytes):
+            sent_at = tracker.receipt(user_phone)
+            try:
+                response = await client.post(
+                    "/wsp-webhook", content=body, headers={"Content-Type": "application/json"}
+                )
+                results[response.status_code] += 1
+                if response.status_code != 200:
+                    tracker.cancel(user_phone, sent_at)
+            except httpx.HTTPError:
+                results["exception"] += 1
+                tracker.cancel(user_phone, sent_at)
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            user_phone = rng.choice(users)
+            if rng.random() < args.audio_ratio:
+                kinds["audio"] += 1
+                sha256 = rng.choice(forwarded) if forwarded and rng.random() < args.forwarded_ratio else None
+                body = audio_webhook(user_phone, sha256=sha256)
+            else:
+                kinds["text"] += 1
+                body = text_webhook(user_phone, rng.choice(TEXTS))
+            tasks.append(asyncio.create_task(post(user_phone, json.dumps(body).encode())))
+
+        await asyncio.gather(*tasks)
+        send_elapsed = time.perf_counter() - start
+
+        deadline = time.perf_counter() + args.drain_timeout
+        while tracker.pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        metrics = (await client.get("/metrics")).json()
+
+    return {
+        "total": total,
+        "kinds": kinds,
+        "results": results,
+        "send_elapsed": send_elapsed,
+        "metrics": metrics,
+    }
+
+
+def _report(args, run: dict, tracker: LatencyTracker, graph: FakeGraphAPI, llm: FakeLLMAPI, firestore: FakeFirestore):
+    total = run["total"]
+    results = run["results"]
+    accepted = results[200]
+    rejected = results[503]
+    errors = total - accepted - rejected
+    latency = tracker.latency.summary()
+    window = (tracker.last_reply - tracker.first_receipt) if tracker.replies else 0.0
+    ingress = run["metrics"].get("ingress", {})
+
+    print(f"webhooks: {total} ({dict(run['kinds'])}) en {run['send_elapsed']:.1f}s = {total / run['send_elapsed']:.1f}/s")
+    print(f"  aceptados 200: {accepted}  rechazados 503: {rejected} ({rejected / total:.1%})  errores: {errors} ({errors / total:.1%})")
+    print(f"respuestas enviadas: {tracker.replies}  throughput: {tracker.replies / window if window else 0:.2f} respuestas/s")
+    print(f"  mensajes respondidos: {latency['count']}  sin respuesta: {tracker.pending} ({tracker.pending / max(accepted, 1):.1%})")
+    print(
+        "latencia webhook -> envío (s): "
+        f"p50={latency['p50']:.3f} p95={latency['p95']:.3f} p99={latency['p99']:.3f} "
+        f"max={latency['max']:.3f} media={latency['mean']:.3f}"
+    )
+    print(
+        f"stand-ins: graph enviados={graph.sent} fallidos={graph.failed}  "
+        f"llm llamadas={llm.calls} fallidas={llm.failed}  firestore lecturas={firestore.reads} escrituras={firestore.writes}"
+    )
+    print(
+        f"ingress: procesados={ingress.get('processed')} fallidos={ingress.get('failed')} "
+        f"descartados={ingress.get('dropped')} rechazados={ingress.get('rejected')} "
+        f"max_depth={ingress.get('max_depth')} llamadas LLM ahorradas={ingress.get('llm_calls_saved')}"
+    )
+    transcriptions = run["metrics"].get("transcription_cache", {})
+    print(
+        f"transcripciones: caché {transcriptions.get('hit_rate', 0):.1%} de aciertos {transcriptions.get('counts', {})}"
+    )
+    if args.json:
+        print(json.dumps({"latency": latency, "results": {str(k): v for k, v in results.items()}, "metrics": run["metrics"]}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10.0, help="webhooks por segundo")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos enviando webhooks")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--audio-ratio", type=float, default=0.2)
+    parser.add_argument("--forwarded-ratio", type=float, default=0.0, help="fracción de audios que son notas reenviadas")
+    parser.add_argument("--forwarded-notes", type=int, default=10, help="notas distintas entre las reenviadas")
+    parser.add_argument("--connections", type=int, default=100, help="conexiones HTTP simultáneas al webhook")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="segundos esperando respuestas al final")
+    parser.add_argument("--executor", choices=["thread", "asyncio"], default="thread")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--debounce-ms", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--llm-ms", type=float, default=900, help="latencia media del chat del LLM")
+    parser.add_argument("--stt-ms", type=float, default=400, help="latencia media de la transcripción")
+    parser.add_argument("--meta-ms", type=float, default=80, help="latencia media de la Graph API")
+    parser.add_argument("--firestore-ms", type=float, default=20, help="latencia media de Firestore")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--meta-error-rate", type=float, default=0.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="imprime también el resultado en JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    tracker = LatencyTracker()
+    graph = FakeGraphAPI(
+        BOT_PHONE_ID, on_send=tracker.on_send, send_ms=args.meta_ms, media_ms=args.meta_ms,
+        error_rate=args.meta_error_rate, seed=args.seed,
+    ).start()
+    llm = FakeLLMAPI(
+        chat_ms=args.llm_ms, transcription_ms=args.stt_ms, error_rate=args.llm_error_rate, seed=args.seed,
+    ).start()
+    firestore = FakeFirestore(latency_ms=args.firestore_ms, seed=args.seed)
+
+    firebase_path, client_secret_path = write_dummy_credentials(workdir)
+    _configure_env(args, graph, workdir, firebase_path, client_secret_path)
+
+    import uvicorn
+
+    from src.app import app
+
+    _install_stand_ins(llm.url, firestore)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        run = asyncio.run(_drive(f"http://127.0.0.1:{port}", args, tracker))
+    finally:
+        server.should_exit = True
+        server_thread.join(timeout=30)
+        graph.stop()
+        llm.stop()
+
+    _report(args, run, tracker, graph, llm, firestore)
+    print(f"archivos temporales en {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Stand-ins locales de Meta Graph API, del proveedor de LLM (OpenAI-compatible) y de Firestore."""
+import copy
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+def _jitter(mean_ms: float, rng: random.Random) -> float:
+    """Latencia en segundos con cola larga (lognormal) alrededor de `mean_ms`."""
+    if mean_ms <= 0:
+        return 0.0
+    return mean_ms / 1000 * rng.lognormvariate(0, 0.35) / 1.063
+
+
+class FakeHTTPServer:
+    """
+    `ThreadingHTTPServer` en un hilo daemon; las subclases definen `handle(method, path, body)`,
+    que devuelve `(status, content_type, payload)` o `(status, content_type, payload, headers)`.
+    Si `payload` es un iterable de bytes en lugar de bytes, se envía con `Transfer-Encoding: chunked`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, content_type, payload, *extra = server.handle(method, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in (extra[0] if extra else {}).items():
+                    self.send_header(name, value)
+                if isinstance(payload, bytes):
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                # Streaming: cada chunk del iterable sale apenas se genera
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in payload:
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente cortó el stream (p. ej. el agente ya tenía la acción completa)
+                    self.close_connection = True
+                finally:
+                    close = getattr(payload, "close", None)
+                    if close:
+                        close()
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple:
+        raise NotImplementedError
+
+    @staticmethod
+    def json_response(data: dict, status: int = 200) -> tuple[int, str, bytes]:
+        return status, "application/json", json.dumps(data).encode()
+
+
+class FakeGraphAPI(FakeHTTPServer):
+    """
+    Graph API de WhatsApp Cloud: envío de mensajes (`POST /{phone_id}/messages`), URL de un
+    media (`GET /{media_id}`) y descarga del media (`GET /media/{media_id}`). Cada envío llama
+    a `on_send(to_phone, perf_counter)` para medir la latencia de punta a punta.
+    """
+
+    def __init__(
+        self,
+        phone_id: str,
+        *,
+        on_send: Callable[[str, float], None] | None = None,
+        send_ms: float = 80,
+        media_ms: float = 60,
+        media_bytes: int = 24_000,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.phone_id = phone_id
+        self.on_send = on_send
+        self.send_ms = send_ms
+        self.media_ms = media_ms
+        self.media = os.urandom(media_bytes)
+        self.error_rate = error_rate
+        self.sent = 0
+        self.failed = 0
+        self._rng = random.Random(seed)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def handle(self, method, path, body):
+        path = path.split("?", 1)[0]
+        with self._lock:
+            delay = _jitter(self.send_ms if method == "POST" else self.media_ms, self._rng)
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+
+        if method == "POST" and path == f"/{self.phone_id}/messages":
+            if fail:
+                with self._lock:
+                    self.failed += 1
+                return self.json_response({"error": {"message": "Fake error", "code": 131000}}, 500)
+
+            to_phone = json.loads(body)["to"]
+            with self._lock:
+                self.sent += 1
+                waid = f"wamid.OUT{next(self._ids):012d}"
+            if self.on_send:
+                self.on_send(to_phone, time.perf_counter())
+            return self.json_response({"messaging_product": "whatsapp", "messages": [{"id": waid}]})
+
+        if method == "GET" and path.startswith("/media/"):
+            return 200, "audio/ogg", self.media
+
+        if method == "GET":
+            media_id = path.strip("/")
+            return self.json_response(
+                {"url": f"{self.url}/media/{media_id}", "mime_type": "audio/ogg", "id": media_id}
+            )
+
+        return self.json_response({"error": {"message": f"Ruta no soportada: {path}"}}, 404)
+
+
+class FakeLLMAPI(FakeHTTPServer):
+    """
+    Endpoint OpenAI-compatible mínimo: `/chat/completions` responde siempre con un
+    `final_answer` en el formato de `SYSTEM_2` y `/audio/transcriptions` con un texto fijo.
+    """
+
+    def __init__(
+        self,
+        *,
+        chat_ms: float = 900,
+        transcription_ms: float = 400,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.chat_ms = chat_ms
+        self.transcription_ms = transcription_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.failed = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def handle(self, method, path, body):
+        path = path.split("?", 1)[0]
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+            delay = _jitter(self.transcription_ms if "transcriptions" in path else self.chat_ms, self._rng)
+        time.sleep(delay)
+
+        if fail:
+            with self._lock:
+                self.failed += 1
+            return self.json_response({"error": {"message": "Fake overload", "type": "server_error"}}, 503)
+
+        if path.endswith("/audio/transcriptions"):
+            return self.json_response({"text": "Recuérdame revisar el correo mañana a las nueve."})
+
+        if path.endswith("/chat/completions"):
+            request = json.loads(body)
+            prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+            answer = "Listo, lo tengo anotado. ¿Necesitas algo más?"
+            content = (
+                "Thought: El usuario solo necesita una respuesta directa.\n"
+                "Action:\n"
+                + json.dumps({"action": "final_answer", "action_input": {"answer": answer}}, ensure_ascii=False)
+                + "<end_action>"
+            )
+            return self.json_response(
+                {
+                    "id": f"chatcmpl-{self._rng.getrandbits(48):012x}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", ""),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt_tokens + len(content) // 4,
+                    },
+                }
+            )
+
+        return self.json_response({"error": {"message": f"Ruta no soportada: {path}"}}, 404)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, data: dict | None):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self) -> dict | None:
+        return self._data
+
+
+class FakeDocumentReference:
+    def __init__(self, store: "FakeFirestore", collection: str, document_id: str):
+        self._store = store
+        self._key = (collection, document_id)
+
+    def get(self) -> FakeDocumentSnapshot:
+        return FakeDocumentSnapshot(self._store._read(self._key))
+
+    def create(self, data: dict):
+        self._store._write(self._key, data, merge=False)
+
+    def set(self, data: dict):
+        self._store._write(self._key, data, merge=False)
+
+    def update(self, data: dict):
+        self._store._write(self._key, data, merge=True)
+
+
+class FakeCollection:
+    def __init__(self, store: "FakeFirestore", name: str):
+        self._store = store
+        self._name = name
+
+    def document(self, document_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self._store, self._name, document_id)
+
+
+class FakeFirestore:
+    """
+    Reemplazo en memoria del `firestore.Client` con lo que usa `UserManager`
+    (`collection().document()` con `get`, `create`, `set` y `update`). Los documentos se
+    copian al leer y escribir, como si viajaran por la red, con una latencia opcional.
+    """
+
+    def __init__(self, latency_ms: float = 20, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.reads = 0
+        self.writes = 0
+        self._documents: dict[tuple[str, str], dict] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def _sleep(self):
+        with self._lock:
+            delay = _jitter(self.latency_ms, self._rng)
+        time.sleep(delay)
+
+    def _read(self, key: tuple[str, str]) -> dict | None:
+        self._sleep()
+        with self._lock:
+            self.reads += 1
+            data = self._documents.get(key)
+            return copy.deepcopy(data) if data is not None else None
+
+    def _write(self, key: tuple[str, str], data: dict, *, merge: bool):
+        self._sleep()
+        data = copy.deepcopy(data)
+        with self._lock:
+            self.writes += 1
+            if merge and key in self._documents:
+                self._documents[key].update(data)
+            else:
+                self._documents[key] = data
+
+
+def write_dummy_credentials(directory: str) -> tuple[str, str]:
+    """
+    Genera una cuenta de servicio de Firebase y un client secret de OAuth falsos para que
+    `src.google.google_services` se pueda importar sin credenciales reales.
+    Devuelve `(firebase_credentials_path, client_secret_path)`.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+    firebase_path = os.path.join(directory, "firebase-loadtest.json")
+    with open(firebase_path, "w") as file:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "loadtest",
+                "private_key_id": "loadtest",
+                "private_key": pem,
+                "client_email": "loadtest@loadtest.iam.gserviceaccount.com",
+                "client_id": "0",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            file,
+        )
+
+    client_secret_path = os.path.join(directory, "client-secret-loadtest.json")
+    with open(client_secret_path, "w") as file:
+        json.dump(
+            {
+                "web": {
+                    "client_id": "loadtest.apps.googleusercontent.com",
+                    "client_secret": "loadtest",
+                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "redirect_uris": ["http://127.0.0.1/callback"],
+                }
+            },
+            file,
+        )
+
+    return firebase_path, client_secret_path
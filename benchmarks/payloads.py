@@ -0,0 +1,117 @@
+"""Payloads sintéticos del webhook de WhatsApp Cloud API para benchmarks y pruebas de carga."""
+import itertools
+import random
+import time
+
+BOT_PHONE = "15550000000"
+BOT_PHONE_ID = "100000000000001"
+
+_waid_counter = itertools.count()
+
+
+def new_waid() -> str:
+    return f"wamid.BENCH{next(_waid_counter):012d}"
+
+
+def text_message(user_phone: str, body: str, timestamp: int | None = None) -> dict:
+    return {
+        "from": user_phone,
+        "id": new_waid(),
+        "timestamp": str(timestamp or int(time.time())),
+        "type": "text",
+        "text": {"body": body},
+    }
+
+
+def audio_message(
+    user_phone: str, media_id: str | None = None, timestamp: int | None = None, sha256: str | None = None
+) -> dict:
+    media_id = media_id or f"{random.randrange(10**15, 10**16)}"
+    return {
+        "from": user_phone,
+        "id": new_waid(),
+        "timestamp": str(timestamp or int(time.time())),
+        "type": "audio",
+        "audio": {
+            "mime_type": "audio/ogg; codecs=opus",
+            "sha256": sha256 or f"{random.getrandbits(256):064x}",
+            "id": media_id,
+            "voice": True,
+        },
+    }
+
+
+def status(user_phone: str, state: str = "delivered", timestamp: int | None = None) -> dict:
+    return {
+        "id": new_waid(),
+        "status": state,
+        "timestamp": str(timestamp or int(time.time())),
+        "recipient_id": user_phone,
+        "conversation": {"id": f"{random.getrandbits(64):016x}", "origin": {"type": "service"}},
+        "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+    }
+
+
+def change(messages: list[dict] | None = None, statuses: list[dict] | None = None) -> dict:
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": BOT_PHONE, "phone_number_id": BOT_PHONE_ID},
+    }
+    if messages:
+        phones = dict.fromkeys(m["from"] for m in messages)
+        value["contacts"] = [{"profile": {"name": f"User {p[-4:]}"}, "wa_id": p} for p in phones]
+        value["messages"] = messages
+    if statuses:
+        value["statuses"] = statuses
+    return {"value": value, "field": "messages"}
+
+
+def webhook(changes: list[dict], entries: int = 1) -> dict:
+    per_entry = max(1, len(changes) // entries)
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"id": f"WABA{i}", "changes": changes[i * per_entry:(i + 1) * per_entry if i < entries - 1 else None]}
+            for i in range(entries)
+        ],
+    }
+
+
+def text_webhook(user_phone: str, body: str = "Hola, ¿qué tengo en mi agenda hoy?") -> dict:
+    return webhook([change(messages=[text_message(user_phone, body)])])
+
+
+def audio_webhook(user_phone: str, media_id: str | None = None, sha256: str | None = None) -> dict:
+    return webhook([change(messages=[audio_message(user_phone, media_id, sha256=sha256)])])
+
+
+def status_webhook(user_phone: str, state: str = "delivered") -> dict:
+    return webhook([change(statuses=[status(user_phone, state)])])
+
+
+def batch_webhook(
+    *,
+    entries: int,
+    changes_per_entry: int,
+    messages_per_change: int,
+    users: int = 50,
+    audio_ratio: float = 0.2,
+    statuses_per_change: int = 0,
+    seed: int = 0,
+) -> dict:
+    """Webhook con `entries * changes_per_entry * messages_per_change` mensajes, timestamps desordenados."""
+    rng = random.Random(seed)
+    base_ts = int(time.time())
+    changes = []
+    for _ in range(entries * changes_per_entry):
+        messages = []
+        for _ in range(messages_per_change):
+            phone = f"5199{rng.randrange(users):07d}"
+            ts = base_ts + rng.randrange(0, 120)
+            if rng.random() < audio_ratio:
+                messages.append(audio_message(phone, timestamp=ts))
+            else:
+                messages.append(text_message(phone, f"mensaje {rng.random():.6f}", timestamp=ts))
+        statuses = [status(f"5199{rng.randrange(users):07d}") for _ in range(statuses_per_change)]
+        changes.append(change(messages=messages, statuses=statuses))
+    return webhook(changes, entries=entries)
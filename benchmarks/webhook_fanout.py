@@ -0,0 +1,61 @@
+"""
+Benchmark del fan-out de webhooks con varios mensajes.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.webhook_fanout --sizes 1 10 100 1000 --repeat 20
+"""
+import argparse
+import time
+
+from benchmarks.payloads import batch_webhook
+from src.whatsapp.types import Props
+
+
+def _shape(size: int) -> dict:
+    # Repartimos los mensajes en varios entry/changes como hace Meta con los lotes grandes
+    entries = max(1, min(size // 50, 10))
+    changes_per_entry = max(1, min(size // (entries * 10), 10))
+    messages_per_change = max(1, size // (entries * changes_per_entry))
+    return {
+        "entries": entries,
+        "changes_per_entry": changes_per_entry,
+        "messages_per_change": messages_per_change,
+    }
+
+
+def run(sizes: list[int], repeat: int):
+    print(f"{'mensajes':>9} {'first-only ms':>14} {'fan-out ms':>11} {'fan-out msg/s':>14} {'procesados':>11}")
+    for size in sizes:
+        body = batch_webhook(**_shape(size), statuses_per_change=2, seed=size)
+        total = sum(
+            len(change["value"].get("messages", []))
+            for entry in body["entry"]
+            for change in entry["changes"]
+        )
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            Props.filter_message_data(body)
+        first_only = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            props = Props.filter_messages_data(body)
+        fan_out = (time.perf_counter() - start) / repeat
+
+        assert len(props) == total
+        assert all(
+            int(a.messageInfo.time) <= int(b.messageInfo.time) for a, b in zip(props, props[1:])
+        )
+        print(
+            f"{total:>9} {first_only * 1000:>14.3f} {fan_out * 1000:>11.3f} "
+            f"{total / fan_out:>14.0f} {len(props):>5}/{total:<5}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
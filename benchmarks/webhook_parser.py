@@ -0,0 +1,59 @@
+"""
+Micro-benchmark del parser del webhook: camino anterior (dos `WhatsAppMessage.from_json`
+completos, uno para `is_notification` y otro para extraer los mensajes) contra
+`WebhookPayload` (una pasada, objetos con `__slots__` y sub-objetos perezosos).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.webhook_parser --repeat 20000
+"""
+import argparse
+import timeit
+
+from benchmarks.payloads import audio_webhook, batch_webhook, status_webhook, text_webhook
+from src.whatsapp.types import WebhookPayload, WhatsAppMessage
+
+
+def eager_path(body: dict) -> list:
+    parsed = WhatsAppMessage.from_json(body)
+    if any(not change.value.messages for entry in parsed.entry for change in entry.changes):
+        return []
+
+    parsed = WhatsAppMessage.from_json(body)
+    return [
+        (message.id, message.type, message.get_important_content(), message.timestamp)
+        for entry in parsed.entry
+        for change in entry.changes
+        for message in change.value.messages
+    ]
+
+
+def lazy_path(body: dict) -> list:
+    payload = WebhookPayload(body)
+    if payload.is_notification:
+        return []
+    return payload.to_props()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    payloads = {
+        "text": text_webhook("51999000001"),
+        "audio": audio_webhook("51999000001"),
+        "status": status_webhook("51999000001"),
+        "batch-50": batch_webhook(entries=1, changes_per_entry=5, messages_per_change=10),
+    }
+    repeat = args.repeat
+
+    print(f"{'payload':>9} {'eager us':>9} {'lazy us':>8} {'speedup':>8}")
+    for name, body in payloads.items():
+        n = repeat if name != "batch-50" else max(1, repeat // 50)
+        eager = timeit.timeit(lambda: eager_path(body), number=n) / n
+        lazy = timeit.timeit(lambda: lazy_path(body), number=n) / n
+        print(f"{name:>9} {eager * 1e6:>9.2f} {lazy * 1e6:>8.2f} {eager / lazy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
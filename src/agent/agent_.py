@@ -1,13 +1,42 @@
 from src.agent.tools.collectors import Collector
 from src.components.memory import Memory
-from src.components.llms import BaseGenericLLM, GenericLLM, default_llms
+from src.components.llms import RATE_LIMITED_MESSAGE, BaseGenericLLM, GenericLLM, default_llms
+from src.components.routing import RoutingLLM, routing_llm_70b
 from src.components.prompt import ChatTemplate
 from src.components.tool import BaseTool
 import uuid
 import logging
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from typing import Dict
 from src.agent.types import Base_Agent_Response, Base_LLM_Response, BaseToolResponse
+from src.agent.prompt.assembly import prompt_cache_stats
+from src.agent.streaming import AGENT_STOP_SEQUENCES, ActionStreamParser, estimate_tokens, stream_stats
+from src.agent.telemetry import llm_telemetry
+from src.agent.parsing import ActionParseError, is_provider_error, parse_action, parse_stats, reask_template
+from src.agent.budget import DEADLINE, FINAL_ANSWER, PARSE_ERROR, STEP_TIMEOUT, TurnBudget, turn_stats
+from src.agent.complexity import LARGE, SMALL, ComplexityRouter, complexity_router
+from src.agent.native_tools import NATIVE, TEXT, NativeToolCallError, schema_tokens, supports_native_tools, tool_mode_stats, tool_schemas
+from src.settings.settings import Config
+from src.utils.logs import payload
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_ANSWER = "Perdón, tuve un problema para procesar tu mensaje. ¿Podrías intentarlo de nuevo?"
+BEST_EFFORT_ANSWER = "Perdón, estoy tardando más de lo normal en responder. ¿Podrías intentarlo de nuevo en un momento?"
+BEST_EFFORT_PARTIAL_ANSWER = (
+    "Perdón, estoy tardando más de lo normal. Alcancé a hacer una parte de lo que me pediste; "
+    "revisa si falta algo y pídemelo de nuevo."
+)
+# Observación para el modelo cuando pide una herramienta con el presupuesto del turno agotado
+TOOL_BUDGET_EXHAUSTED = (
+    "Action Response: se agotó el presupuesto de herramientas de este turno, no se ejecutó. "
+    "Responde al usuario con la información que ya tienes.\n"
+)
+
+# Pasos del agente con tiempo máximo (`AGENT_STEP_TIMEOUT_SECONDS`)
+step_executor = ThreadPoolExecutor(max_workers=Config.AGENT_STEP_THREADS, thread_name_prefix="agent-step")
 
 
 def chat(
@@ -17,6 +46,7 @@ def chat(
     chat_messages: ChatTemplate,
     max_tokens=1500,
     has_stream=False,
+    tools: list[dict] | None = None,
 ):
     txt = ""
     usage = {}
@@ -28,6 +58,7 @@ def chat(
             messages=chat_messages,
             max_tokens=max_tokens,
             has_stream=has_stream,
+            tools=tools,
         ):
             if c:
                 txt += c
@@ -40,84 +71,565 @@ def chat(
     except Exception as e:
         return e, messages_list, usage
 
+async def achat(
+    *,
+    llm: BaseGenericLLM,
+    model_name: str = None,
+    chat_messages: ChatTemplate,
+    max_tokens=1500,
+    has_stream=False,
+    tools: list[dict] | None = None,
+):
+    """Igual que `chat`, pero sobre `achat_llm`: no bloquea el hilo mientras el LLM genera."""
+    txt = ""
+    usage = {}
+    messages_list = []
+
+    try:
+        async for c, m, u in llm.achat_llm(
+            model_name=model_name,
+            messages=chat_messages,
+            max_tokens=max_tokens,
+            has_stream=has_stream,
+            tools=tools,
+        ):
+            if c:
+                txt += c
+            if u:
+                usage.update(u)
+            if m:
+                messages_list = m
+        return txt, messages_list, usage
+
+    except Exception as e:
+        return e, messages_list, usage
+
+def stream_chat(
+    *,
+    llm: BaseGenericLLM,
+    model_name: str = None,
+    chat_messages: ChatTemplate,
+    max_tokens=1500,
+    llm_call_id: str = "",
+):
+    """
+    Como `chat` pero en streaming: pasa `AGENT_STOP_SEQUENCES` al proveedor, parsea el
+    `Action:` mientras llegan los tokens y corta el stream apenas el JSON está completo, para
+    poder ejecutar la herramienta sin esperar (ni pagar) el resto de la generación.
+    """
+    parser = ActionStreamParser()
+    usage = {}
+    messages_list = []
+    start = time.perf_counter()
+    first_token_at = action_at = None
+
+    generation = llm.chat_llm(
+        model_name=model_name,
+        messages=chat_messages,
+        max_tokens=max_tokens,
+        has_stream=True,
+        stop=AGENT_STOP_SEQUENCES,
+    )
+    try:
+        for c, m, u in generation:
+            if c:
+                first_token_at = first_token_at or time.perf_counter()
+                if parser.feed(c):
+                    action_at = time.perf_counter()
+                    break
+            if u:
+                usage.update(u)
+            if m:
+                messages_list = m
+
+    except Exception as e:
+        return e, messages_list, usage
+
+    finally:
+        generation.close()
+
+    content_ = _finish_stream_step(
+        parser, usage, start=start, first_token_at=first_token_at, action_at=action_at,
+        model_name=model_name or llm.default_model_name, llm_call_id=llm_call_id,
+    )
+    return content_, messages_list, usage
+
+async def astream_chat(
+    *,
+    llm: BaseGenericLLM,
+    model_name: str = None,
+    chat_messages: ChatTemplate,
+    max_tokens=1500,
+    llm_call_id: str = "",
+):
+    """Versión asíncrona de `stream_chat`, sobre `achat_llm`."""
+    parser = ActionStreamParser()
+    usage = {}
+    messages_list = []
+    start = time.perf_counter()
+    first_token_at = action_at = None
+
+    generation = llm.achat_llm(
+        model_name=model_name,
+        messages=chat_messages,
+        max_tokens=max_tokens,
+        has_stream=True,
+        stop=AGENT_STOP_SEQUENCES,
+    )
+    try:
+        async for c, m, u in generation:
+            if c:
+                first_token_at = first_token_at or time.perf_counter()
+                if parser.feed(c):
+                    action_at = time.perf_counter()
+                    break
+            if u:
+                usage.update(u)
+            if m:
+                messages_list = m
+
+    except Exception as e:
+        return e, messages_list, usage
+
+    finally:
+        await generation.aclose()
+
+    content_ = _finish_stream_step(
+        parser, usage, start=start, first_token_at=first_token_at, action_at=action_at,
+        model_name=model_name or llm.default_model_name, llm_call_id=llm_call_id,
+    )
+    return content_, messages_list, usage
+
+def _finish_stream_step(
+    parser: ActionStreamParser,
+    usage: dict,
+    *,
+    start: float,
+    first_token_at: float | None,
+    action_at: float | None,
+    model_name: str,
+    llm_call_id: str,
+) -> str:
+    """Completa `usage` cuando el stream se cortó antes del chunk final y registra las métricas del paso."""
+    output_tokens = usage.get("output_tokens") or estimate_tokens(parser.text, model_name)
+    discarded_tokens = estimate_tokens(parser.discarded, model_name)
+    time_to_first_token = first_token_at - start if first_token_at else None
+    time_to_action = action_at - start if action_at else None
+
+    usage.setdefault("output_tokens", output_tokens)
+    usage.setdefault("response_time", time.perf_counter() - start)
+    usage.setdefault("model", model_name)
+    usage["time_to_action"] = time_to_action
+
+    stream_stats.add_stream_step(
+        time_to_first_token=time_to_first_token,
+        time_to_action=time_to_action,
+        output_tokens=output_tokens,
+        discarded_tokens=discarded_tokens,
+        cut_early=action_at is not None,
+    )
+    logger.info(
+        "%s stream: primer token %s, acción %s, %d tokens generados, %d descartados",
+        llm_call_id,
+        f"{time_to_first_token:.2f}s" if time_to_first_token is not None else "-",
+        f"{time_to_action:.2f}s" if time_to_action is not None else "sin acción",
+        output_tokens,
+        discarded_tokens,
+    )
+    return parser.content
+
+def _record_full_step(content_, usage: dict):
+    """En modo sin streaming, lo generado después de `<end_action>` se paga y se descarta."""
+    if not isinstance(content_, str):
+        return
+    discarded = content_.split("<end_action>", 1)[1] if "<end_action>" in content_ else ""
+    stream_stats.add_full_step(
+        output_tokens=usage.get("output_tokens") or estimate_tokens(content_, usage.get("model")),
+        discarded_tokens=estimate_tokens(discarded.strip(), usage.get("model")),
+    )
+
 def base_agent_chat_generation_2(
     llm: BaseGenericLLM,
     chat_template: ChatTemplate,
     response_type="agent-generation",
     max_tokens=700,
     stream=False,
+    step: int | None = None,
+    user: str | None = None,
+    reask: bool = True,
 ) -> Base_Agent_Response:
+    """
+    Paso del agente con el protocolo de texto. Si la salida no se puede parsear ni reparar,
+    se le pide la acción al modelo una vez más (`reask`) sin streaming.
+    """
     llm_call_id = f"""llm-call--{uuid.uuid4().hex}"""
     model_name = llm.default_model_name
-    logging.info(f"{response_type} -- {llm.default_model_name} -- {llm_call_id}")
+    logger.info("%s -- %s -- %s", response_type, llm.default_model_name, llm_call_id)
+
+    if stream:
+        content_, messages_list, usage = stream_chat(
+            llm=llm,
+            model_name=model_name,
+            chat_messages=chat_template,
+            max_tokens=max_tokens,
+            llm_call_id=llm_call_id,
+        )
+    else:
+        content_, messages_list, usage = chat(
+            llm=llm,
+            model_name=model_name,
+            chat_messages=chat_template,
+            max_tokens=max_tokens,
+        )
+        _record_full_step(content_, usage)
+    logger.debug("%s: %s", llm_call_id, payload(str(content_)))
+    if "input_tokens" in usage:
+        prompt_cache_stats.add(usage, chat_template.prefix_version)
+
+    try:
+        return _parse_and_record(
+            content_,
+            llm=llm,
+            llm_call_id=llm_call_id,
+            response_type=response_type,
+            messages_list=messages_list,
+            usage=usage,
+            max_tokens=max_tokens,
+            stream=stream,
+            step=step,
+            user=user,
+        )
+    except ActionParseError as e:
+        if not reask:
+            raise
+        logger.info("%s: salida no válida (%s), se le pide la acción de nuevo al modelo", llm_call_id, e)
+        template = reask_template(chat_template, content_, e)
+
+    try:
+        response_dict = base_agent_chat_generation_2(
+            llm=llm,
+            chat_template=template,
+            response_type=f"{response_type}-reask",
+            max_tokens=max_tokens,
+            step=step,
+            user=user,
+            reask=False,
+        )
+    except ActionParseError:
+        parse_stats.reasked(False)
+        raise
+    parse_stats.reasked(True)
+    return response_dict
+
+async def abase_agent_chat_generation_2(
+    llm: BaseGenericLLM,
+    chat_template: ChatTemplate,
+    response_type="agent-generation",
+    max_tokens=700,
+    stream=False,
+    step: int | None = None,
+    user: str | None = None,
+    reask: bool = True,
+) -> Base_Agent_Response:
+    """Versión asíncrona de `base_agent_chat_generation_2`."""
+    llm_call_id = f"""llm-call--{uuid.uuid4().hex}"""
+    model_name = llm.default_model_name
+    logger.info("%s -- %s -- %s", response_type, llm.default_model_name, llm_call_id)
+
+    if stream:
+        content_, messages_list, usage = await astream_chat(
+            llm=llm,
+            model_name=model_name,
+            chat_messages=chat_template,
+            max_tokens=max_tokens,
+            llm_call_id=llm_call_id,
+        )
+    else:
+        content_, messages_list, usage = await achat(
+            llm=llm,
+            model_name=model_name,
+            chat_messages=chat_template,
+            max_tokens=max_tokens,
+        )
+        _record_full_step(content_, usage)
+    logger.debug("%s: %s", llm_call_id, payload(str(content_)))
+    if "input_tokens" in usage:
+        prompt_cache_stats.add(usage, chat_template.prefix_version)
+
+    try:
+        return _parse_and_record(
+            content_,
+            llm=llm,
+            llm_call_id=llm_call_id,
+            response_type=response_type,
+            messages_list=messages_list,
+            usage=usage,
+            max_tokens=max_tokens,
+            stream=stream,
+            step=step,
+            user=user,
+        )
+    except ActionParseError as e:
+        if not reask:
+            raise
+        logger.info("%s: salida no válida (%s), se le pide la acción de nuevo al modelo", llm_call_id, e)
+        template = reask_template(chat_template, content_, e)
+
+    try:
+        response_dict = await abase_agent_chat_generation_2(
+            llm=llm,
+            chat_template=template,
+            response_type=f"{response_type}-reask",
+            max_tokens=max_tokens,
+            step=step,
+            user=user,
+            reask=False,
+        )
+    except ActionParseError:
+        parse_stats.reasked(False)
+        raise
+    parse_stats.reasked(True)
+    return response_dict
+
+def native_agent_chat_generation(
+    llm: BaseGenericLLM,
+    chat_template: ChatTemplate,
+    tools: list[dict],
+    response_type="agent-generation-native",
+    max_tokens=700,
+    step: int | None = None,
+    user: str | None = None,
+) -> Base_Agent_Response:
+    """Paso del agente con function calling: las herramientas van como `tools` y la acción llega en `tool_calls`."""
+    llm_call_id = f"""llm-call--{uuid.uuid4().hex}"""
+    logger.info("%s -- %s -- %s", response_type, llm.default_model_name, llm_call_id)
 
     content_, messages_list, usage = chat(
         llm=llm,
-        model_name=model_name,
+        model_name=llm.default_model_name,
         chat_messages=chat_template,
         max_tokens=max_tokens,
-        has_stream=stream,
+        tools=tools,
     )
-    logging.info(content_)
+    logger.debug("%s: %s %s", llm_call_id, payload(str(content_)), payload(lambda: usage.get("tool_calls")))
+    if "input_tokens" in usage:
+        prompt_cache_stats.add(usage, chat_template.prefix_version)
 
-    cleaned_content = f"""{content_.split("<end_action>")[0].strip()}<end_action>"""
+    return _parse_and_record(
+        content_,
+        llm=llm,
+        llm_call_id=llm_call_id,
+        response_type=response_type,
+        messages_list=messages_list,
+        usage=usage,
+        max_tokens=max_tokens,
+        stream=False,
+        step=step,
+        user=user,
+        parser=parse_native_response,
+    )
 
-    thought = cleaned_content.split("Action:")[0].strip()
-    action_txt = cleaned_content.split("Action:")[1].split("<end_action>")[0].strip()
-    action_json = json.loads(action_txt)
+async def anative_agent_chat_generation(
+    llm: BaseGenericLLM,
+    chat_template: ChatTemplate,
+    tools: list[dict],
+    response_type="agent-generation-native",
+    max_tokens=700,
+    step: int | None = None,
+    user: str | None = None,
+) -> Base_Agent_Response:
+    llm_call_id = f"""llm-call--{uuid.uuid4().hex}"""
+    logger.info("%s -- %s -- %s", response_type, llm.default_model_name, llm_call_id)
 
-    action = action_json["action"]
-    parameters = action_json["action_input"]
+    content_, messages_list, usage = await achat(
+        llm=llm,
+        model_name=llm.default_model_name,
+        chat_messages=chat_template,
+        max_tokens=max_tokens,
+        tools=tools,
+    )
+    logger.debug("%s: %s %s", llm_call_id, payload(str(content_)), payload(lambda: usage.get("tool_calls")))
+    if "input_tokens" in usage:
+        prompt_cache_stats.add(usage, chat_template.prefix_version)
 
-    final_answer = action_json["action_input"]["answer"] if action == "final_answer" else ""
-    markdown_info = ""
+    return _parse_and_record(
+        content_,
+        llm=llm,
+        llm_call_id=llm_call_id,
+        response_type=response_type,
+        messages_list=messages_list,
+        usage=usage,
+        max_tokens=max_tokens,
+        stream=False,
+        step=step,
+        user=user,
+        parser=parse_native_response,
+    )
 
-    # current_scratchpad = """"""
-    # if thought.strip():
-    #     current_scratchpad += f"Thought: {thought}\n"
-    # if action.strip():
-    #     current_scratchpad += f"Action: {action}\n"
-    # if parameters:
-    #     current_scratchpad += f"Parameters: {parameters}\n"
-    # if final_answer.strip():
-    #     current_scratchpad += f"Answer: {final_answer}\n"
-    # if markdown_info.strip():
-    #     current_scratchpad += f"Markdown info: {markdown_info}\n"
+def _parse_and_record(
+    content_: str | Exception,
+    *,
+    llm: BaseGenericLLM,
+    llm_call_id: str,
+    response_type: str,
+    messages_list: list,
+    usage: dict,
+    max_tokens: int,
+    stream: bool,
+    step: int | None,
+    user: str | None,
+    parser=None,
+) -> Base_Agent_Response:
+    """Parsea la salida del paso y registra la llamada en `llm_telemetry`, también si falló."""
+    parser = parser or parse_agent_response
+    llm_response = Base_LLM_Response(
+        type=response_type,
+        messages_list=messages_list,
+        llm_response=str(content_).strip(),
+        formated_response=None,
+        model_name=usage.get("model") or llm.default_model_name,
+        llm_call_id=llm_call_id,
+        usage=usage,
+    )
+    error = str(content_) if isinstance(content_, Exception) else None
+    parsed = False
+    try:
+        response_dict = parser(
+            content_,
+            llm=llm,
+            llm_call_id=llm_call_id,
+            response_type=response_type,
+            messages_list=messages_list,
+            usage=usage,
+        )
+        llm_response.formated_response = response_dict.to_dict()
+        parsed = True
+        return response_dict
+    finally:
+        llm_telemetry.record(
+            llm_response, step=step, user=user, max_tokens=max_tokens, stream=stream, parsed=parsed, error=error
+        )
 
-    # print(current_scratchpad, "\n\n")
+def parse_agent_response(
+    content_: str,
+    *,
+    llm: BaseGenericLLM,
+    llm_call_id: str,
+    response_type: str,
+    messages_list: list,
+    usage: dict,
+) -> Base_Agent_Response:
+    """
+    Convierte la salida en formato `SYSTEM_2` (Thought / Action / `<end_action>`) en la respuesta del agente.
+    Los defectos comunes se reparan en `parse_action`; si no se puede, levanta `ActionParseError`.
+    """
+    try:
+        parsed = parse_action(content_)
+    except ActionParseError as e:
+        parse_stats.failed(e)
+        raise
+    parse_stats.parsed(parsed.repairs)
+
+    if parsed.repairs:
+        logger.info("%s: salida reparada (%s)", llm_call_id, ", ".join(parsed.repairs))
+        content = parsed.content
+    else:
+        content = f"""{content_.split("<end_action>")[0].strip()}<end_action>"""
 
     response_dict = Base_Agent_Response(
+        thought=parsed.thought,
+        action=parsed.action,
+        parameters=parsed.action_input,
+        final_answer=parsed.final_answer,
+        markdown_info="",
+        content=content,
+        usage=usage,
+        llm_call_id=llm_call_id,
+    )
+
+    return response_dict
+
+def parse_native_response(
+    content_: str | Exception,
+    *,
+    llm: BaseGenericLLM,
+    llm_call_id: str,
+    response_type: str,
+    messages_list: list,
+    usage: dict,
+) -> Base_Agent_Response:
+    """
+    Convierte la respuesta con function calling en la respuesta del agente: la primera
+    `tool_call` es la acción y, si no hay ninguna, el texto es la respuesta final. El
+    `content` se arma en formato `SYSTEM_2`, así el historial es el mismo en los dos modos.
+    """
+    if isinstance(content_, Exception):
+        raise NativeToolCallError(str(content_))
+
+    tool_calls = usage.pop("tool_calls", None)
+    text = (content_ or "").strip()
+    if is_provider_error(text):
+        # Sin esto el error del proveedor llegaría al usuario como respuesta final
+        raise NativeToolCallError(text)
+    if not tool_calls and "Action:" in text:
+        # El modelo respondió en el formato de texto igualmente
+        return parse_agent_response(
+            text, llm=llm, llm_call_id=llm_call_id, response_type=response_type,
+            messages_list=messages_list, usage=usage,
+        )
+
+    if tool_calls:
+        call = tool_calls[0]
+        try:
+            parameters = json.loads(call["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            raise NativeToolCallError(f"Argumentos inválidos para {call['name']}: {e}") from e
+        if not isinstance(parameters, dict):
+            raise NativeToolCallError(f"Argumentos inválidos para {call['name']}: {parameters!r}")
+        action, thought, final_answer = call["name"], text, ""
+    elif text:
+        action, thought, final_answer = "final_answer", "", text
+        parameters = {"answer": text}
+    else:
+        raise NativeToolCallError("Respuesta vacía")
+
+    action_blob = json.dumps({"action": action, "action_input": parameters}, ensure_ascii=False)
+    content = f"Thought: {thought}\nAction:\n{action_blob}<end_action>" if thought else f"Action:\n{action_blob}<end_action>"
+
+    return Base_Agent_Response(
         thought=thought,
-        action=action.replace("[", "")
-        .replace("]", "")
-        .replace("<", "")
-        .replace(">", "")
-        .strip(),
+        action=action,
         parameters=parameters,
         final_answer=final_answer,
-        markdown_info=markdown_info,
-        content=cleaned_content,
+        markdown_info="",
+        content=content,
         usage=usage,
         llm_call_id=llm_call_id,
     )
 
-    output = Base_LLM_Response(
-        type=response_type,
-        messages_list=messages_list,
-        llm_response=cleaned_content.strip(),
-        formated_response=response_dict.to_dict(),
-        model_name=llm.default_model_name,
-        llm_call_id=llm_call_id,
-        usage=usage,
+def fallback_response(answer: str = FALLBACK_ANSWER) -> Base_Agent_Response:
+    """Respuesta final cuando el modelo no dio una acción válida ni reparándola ni re-preguntando."""
+    action_input = {"answer": answer}
+    return Base_Agent_Response(
+        thought="",
+        action="final_answer",
+        parameters=action_input,
+        final_answer=answer,
+        markdown_info="",
+        content=f"Action:\n{json.dumps({'action': 'final_answer', 'action_input': action_input}, ensure_ascii=False)}<end_action>",
+        usage={},
     )
 
-    return response_dict
+def best_effort_response(done_actions: list[str]) -> Base_Agent_Response:
+    """Respuesta final cuando el turno se quedó sin presupuesto: si se alcanzó a hacer algo, sin inventar el resto."""
+    return fallback_response(BEST_EFFORT_PARTIAL_ANSWER if done_actions else BEST_EFFORT_ANSWER)
 
 class Agent:
     def __init__(self):
-        self.llm_model: BaseGenericLLM = None
+        self.llm_model: BaseGenericLLM | RoutingLLM = None
         self.memory: Memory = None
         self.collector: Collector | None = None
+        self.router: ComplexityRouter | None = None
 
     @classmethod
     def from_groq_llama3_3_70b(
@@ -141,86 +653,217 @@ class Agent:
 
         agent_instance.llm_model = default_llms["from_HF_llama3_3_70b_instruct"]
         return agent_instance
+
+    @classmethod
+    def from_routing_llama3_3_70b(
+        cls,
+    ):
+        """Llama-3.3-70B en HF con Groq como backup (hedging y failover)."""
+        agent_instance = cls()
+
+        agent_instance.llm_model = routing_llm_70b
+        return agent_instance
+
+    def for_turn(self) -> "Agent":
+        """
+        Agente para un solo turno: comparte el modelo y el router (sin estado por usuario), pero
+        no la memoria ni el collector, así los turnos de usuarios distintos pueden correr a la vez.
+        """
+        agent_instance = self.__class__()
+        agent_instance.llm_model = self.llm_model
+        agent_instance.router = self.router
+        return agent_instance
     
 
-    def agent_loop_2(
+    def step(
         self,
+        llm: BaseGenericLLM | RoutingLLM,
+        step: int,
         tools: dict[str, BaseTool],
-        max_iterarions=5,
-        current_iteration=1,
+        max_tokens: int = 1000,
+        reask: bool = True,
     ) -> Base_Agent_Response:
-        response_dict: Base_Agent_Response = base_agent_chat_generation_2(
-            llm=self.llm_model,
-            chat_template=self.memory.get_messages_chat_template(),
-            max_tokens=1000,
-            stream=False,
+        """
+        Un paso del agente. Con `AGENT_TOOL_MODE=native` y un modelo que lo soporta, usa
+        function calling; si la respuesta no sirve, repite el paso con el protocolo de texto.
+        """
+        user = self.memory.user_manager.user_phone
+        if supports_native_tools(llm.default_model_name):
+            schemas = tool_schemas(tools)
+            start = time.perf_counter()
+            try:
+                response_dict = native_agent_chat_generation(
+                    llm=llm,
+                    chat_template=self.memory.get_messages_chat_template(
+                        model_name=llm.default_model_name,
+                        reserve_tokens=max_tokens + schema_tokens(schemas, llm.default_model_name),
+                        native=True,
+                    ),
+                    tools=schemas,
+                    max_tokens=max_tokens,
+                    step=step,
+                    user=user,
+                )
+                if response_dict.action != "final_answer" and response_dict.action not in tools:
+                    raise NativeToolCallError(f"Herramienta desconocida: {response_dict.action}")
+                tool_mode_stats.add(NATIVE, time.perf_counter() - start, response_dict.usage, response_dict.action)
+                return response_dict
+            except (ValueError, IndexError, KeyError, AttributeError) as e:
+                tool_mode_stats.fallback(e)
+
+        start = time.perf_counter()
+        response_dict = base_agent_chat_generation_2(
+            llm=llm,
+            chat_template=self.memory.get_messages_chat_template(
+                model_name=llm.default_model_name,
+                reserve_tokens=max_tokens,
+            ),
+            max_tokens=max_tokens,
+            stream=Config.AGENT_STREAMING,
+            step=step,
+            user=user,
+            reask=reask,
         )
+        tool_mode_stats.add(TEXT, time.perf_counter() - start, response_dict.usage, response_dict.action)
+        return response_dict
+
+    def routed_step(self, tools: dict[str, BaseTool], step: int) -> Base_Agent_Response:
+        """Paso con el modelo que elige `self.router` (el grande si no hay router), escalando si el chico falla."""
+        if self.router is None:
+            return self.step(self.llm_model, step, tools)
+
+        route, reason = self.router.classify(self.memory.user_manager.user_document.messages, step)
+        start = time.perf_counter()
+        if route == SMALL:
+            small = self.router.small
+            try:
+                response_dict = self.step(small, step, tools, reask=False)
+                if response_dict.action != "final_answer" and response_dict.action not in tools:
+                    raise ValueError(f"Acción desconocida: {response_dict.action}")
+                if response_dict.final_answer == RATE_LIMITED_MESSAGE:
+                    # El 429 del chico no es una respuesta para el usuario: el grande tiene su propio límite
+                    raise ValueError(f"Rate limit en {small.default_model_name}")
+                usage = response_dict.usage or {}
+                self.router.record(
+                    SMALL, reason, latency=time.perf_counter() - start, usage=usage,
+                    model=usage.get("model") or small.default_model_name,
+                    large_model=self.llm_model.default_model_name,
+                )
+                return response_dict
+            except (ValueError, IndexError, KeyError, AttributeError) as e:
+                self.router.escalated(e)
+                reason = "escalated"
+
+        response_dict = self.step(self.llm_model, step, tools)
+        usage = response_dict.usage or {}
+        self.router.record(
+            LARGE, reason, latency=time.perf_counter() - start, usage=usage,
+            model=usage.get("model") or self.llm_model.default_model_name,
+            large_model=self.llm_model.default_model_name,
+        )
+        return response_dict
+
+    def _run_step(self, tools: dict[str, BaseTool], step: int, timeout: float | None) -> Base_Agent_Response:
+        """
+        `routed_step` con tiempo máximo. Al vencer, el hilo del paso queda terminando en el pool
+        (el cliente del LLM tiene su propio timeout), pero el turno ya no lo espera.
+        """
+        if timeout is None:
+            return self.routed_step(tools, step)
+        return step_executor.submit(self.routed_step, tools, step).result(timeout=timeout)
+
+    def _run_tool(self, tool: BaseTool, action_name: str, parameters) -> bool:
+        """Ejecuta la herramienta y deja su resultado (o el error) en memoria como mensaje `tool`."""
+        try:
+            parameters["collector"] = self.collector
+            parameters["memory"] = self.memory
+        except Exception as e:
+            message = f"Error al ingresar los parametros en el action: {e}\n"
+            self.memory.add_tool_message(message, action_name)
+            logger.debug(message)
+            return False
+
+        try:
+            action_response: BaseToolResponse = tool(**parameters)
+        except Exception as e:
+            message = f"Action Response: {e}\n"
+            logger.debug(message)
+            self.memory.add_tool_message(message, action_name)
+            return False
+
+        action_response_message = action_response.tool_friendly_response
+        logger.debug("Action response: %s", payload(action_response_message))
+        self.memory.add_tool_message(action_response_message, action_name)
+        return True
 
-        logging.info("\n\n\nresponse_dict:")
-        logging.info(response_dict.to_dict())
-        logging.info("\n\n\n")
-
-        if response_dict.action == "final_answer":
-            return  response_dict
+    def agent_loop_2(
+        self,
+        tools: dict[str, BaseTool],
+        max_iterarions=5,
+        budget: TurnBudget | None = None,
+    ) -> Base_Agent_Response:
+        """
+        El turno del agente: pasos del LLM y herramientas hasta una respuesta final o hasta agotar
+        el presupuesto (`budget`; si no se pasa, solo `max_iterarions` pasos). Los pasos con error
+        también cuentan. Agotados los pasos o los tokens, el modelo tiene un último paso para
+        responder con lo que ya vio; agotadas las herramientas, se le avisa como observación. Si
+        se acaba el tiempo o un paso no responde a tiempo, se responde con lo que se hizo hasta ahí
+        en vez de seguir esperando al proveedor.
+        """
+        budget = budget or TurnBudget(max_steps=max_iterarions)
+        done_actions: list[str] = []
+        last_step = False
+
+        while True:
+            reason = budget.exhausted()
+            if reason and (last_step or reason == DEADLINE):
+                return self._end_turn(reason, budget, best_effort_response(done_actions))
+            last_step = bool(reason)
+
+            step = budget.steps + 1
+            try:
+                response_dict = self._run_step(tools, step, budget.next_step_timeout())
+            except ActionParseError as e:
+                budget.charge_step(None)
+                logger.warning("Paso %d sin acción válida, se responde con el mensaje de respaldo: %s", step, e)
+                return self._end_turn(PARSE_ERROR, budget, fallback_response())
+            except FutureTimeout:
+                budget.charge_step(None)
+                logger.warning("Paso %d sin respuesta del LLM en %.1fs", step, budget.elapsed())
+                return self._end_turn(STEP_TIMEOUT, budget, best_effort_response(done_actions))
+
+            budget.charge_step(response_dict.usage)
+            logger.debug("response_dict: %s", payload(response_dict.to_dict))
+
+            if response_dict.action == "final_answer":
+                return self._end_turn(FINAL_ANSWER, budget, response_dict)
+            if last_step:
+                # En el último paso el modelo pidió otra herramienta en vez de responder
+                return self._end_turn(reason, budget, best_effort_response(done_actions))
 
-        else:
             action_name = response_dict.action
-            action_input = response_dict.parameters
-
             self.memory.add_assistant_message(response_dict.content, "tool")
-            logging.info(f"Action: {action_name}")
-
-            if action_name in tools:
-                action = tools[action_name]
-                logging.info(f"{action_input}\n\n")
-
-                parameters = action_input
-
-                try:
-                    parameters["collector"] = self.collector
-                    parameters["memory"] = self.memory
-
-
-                except Exception as e:
-                    message = f"Error al ingresar los parametros en el action: {e}\n"
-                    self.memory.add_tool_message(message, action_name)
-                    logging.debug(message)
-
-                    return self.agent_loop_2(
-                        tools,
-                        max_iterarions,
-                        current_iteration + 1,
-                    )
-
-                try:
-                    action_response: BaseToolResponse = action(**parameters)
-                    action_response_message = action_response.tool_friendly_response
-                    
-                    logging.info(action_response_message)
-
-                    self.memory.add_tool_message(action_response_message, action_name)
-
-                except Exception as e:
-                    message = f"Action Response: {e}\n"
-                    logging.debug(message)
-                    self.memory.add_tool_message(message, action_name)
-
-                    return self.agent_loop_2(
-                        tools,
-                        max_iterarions,
-                        current_iteration + 1,
-                    )
-
-                if current_iteration < max_iterarions:
-                    return self.agent_loop_2(
-                        tools,
-                        max_iterarions,
-                        current_iteration + 1,
-                    )
-                else:
-                    return Base_Agent_Response(
-                        final_answer=message
-                    )
+            logger.info("Action: %s", action_name)
+
+            if action_name not in tools:
+                self.memory.add_tool_message(f"Action Response: la herramienta {action_name} no existe\n", action_name)
+                continue
+
+            if budget.tools_exhausted():
+                turn_stats.tool_call_denied()
+                self.memory.add_tool_message(TOOL_BUDGET_EXHAUSTED, action_name)
+                continue
+
+            logger.debug("Action input: %s", payload(response_dict.parameters))
+            budget.charge_tool_call()
+            if self._run_tool(tools[action_name], action_name, response_dict.parameters):
+                done_actions.append(action_name)
+
+    def _end_turn(self, outcome: str, budget: TurnBudget, response: Base_Agent_Response) -> Base_Agent_Response:
+        turn_stats.add(outcome, budget)
+        if outcome != FINAL_ANSWER:
+            logger.info("Turno terminado por %s: %s", outcome, budget.to_dict())
+        return response
 
 class AgentExecutor:
     def __init__(self, agent: Agent, tools: Dict[str, BaseTool], memory: Memory, collector: Collector):
@@ -236,9 +879,22 @@ class AgentExecutor:
         response = self.agent.agent_loop_2(
             tools=self.tools,
             max_iterarions=max_iterations,
+            budget=TurnBudget(
+                max_steps=max_iterations,
+                max_seconds=Config.AGENT_TURN_TIMEOUT_SECONDS,
+                max_tokens=Config.AGENT_TURN_MAX_TOKENS,
+                max_tool_calls=Config.AGENT_TURN_MAX_TOOL_CALLS,
+                step_timeout=Config.AGENT_STEP_TIMEOUT_SECONDS,
+            ),
         )
 
         return response
 
 
-default_agent = Agent.from_HF_llama3_3_70b_instruct()
+default_agent = (
+    Agent.from_routing_llama3_3_70b()
+    if Config.LLM_ROUTING_ENABLED
+    else Agent.from_HF_llama3_3_70b_instruct()
+)
+if Config.LLM_COMPLEXITY_ROUTING_ENABLED:
+    default_agent.router = complexity_router
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import Counter
+
+from src.utils.stats import RollingWindow
+
+# Motivos de fin de turno
+FINAL_ANSWER = "final_answer"
+PARSE_ERROR = "parse_error"
+MAX_STEPS = "max_steps"
+DEADLINE = "deadline"
+STEP_TIMEOUT = "step_timeout"
+TOKENS = "tokens"
+
+
+class TurnBudget:
+    """
+    Lo que puede gastar un turno del agente: pasos del LLM, segundos de reloj, tokens del LLM
+    (entrada + salida, sumando todos los pasos) y llamadas a herramientas. `None` o 0 es sin límite.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_steps: int = 10,
+        max_seconds: float | None = None,
+        max_tokens: int | None = None,
+        max_tool_calls: int | None = None,
+        step_timeout: float | None = None,
+    ):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds or None
+        self.max_tokens = max_tokens or None
+        self.max_tool_calls = max_tool_calls or None
+        self.step_timeout = step_timeout or None
+        self.started = time.monotonic()
+        self.steps = 0
+        self.tokens = 0
+        self.tool_calls = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining_seconds(self) -> float | None:
+        return self.max_seconds - self.elapsed() if self.max_seconds else None
+
+    def next_step_timeout(self) -> float | None:
+        """Tiempo para el próximo paso: el del paso, recortado a lo que le queda al turno."""
+        limits = [limit for limit in (self.step_timeout, self.remaining_seconds()) if limit is not None]
+        return max(0.0, min(limits)) if limits else None
+
+    def charge_step(self, usage: dict | None):
+        usage = usage if isinstance(usage, dict) else {}
+        self.steps += 1
+        self.tokens += (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+
+    def charge_tool_call(self):
+        self.tool_calls += 1
+
+    def exhausted(self) -> str | None:
+        """El motivo por el que no se puede dar otro paso (salvo el último), o `None` si todavía hay presupuesto."""
+        if self.steps >= self.max_steps:
+            return MAX_STEPS
+        if self.max_seconds and self.elapsed() >= self.max_seconds:
+            return DEADLINE
+        if self.max_tokens and self.tokens >= self.max_tokens:
+            return TOKENS
+        return None
+
+    def tools_exhausted(self) -> bool:
+        """Las herramientas se controlan antes de ejecutarlas, no antes del paso: el modelo siempre ve el último resultado."""
+        return bool(self.max_tool_calls) and self.tool_calls >= self.max_tool_calls
+
+    def to_dict(self) -> dict:
+        return {
+            "steps": self.steps,
+            "seconds": round(self.elapsed(), 3),
+            "tokens": self.tokens,
+            "tool_calls": self.tool_calls,
+        }
+
+
+class TurnStats:
+    """Cómo terminan los turnos del agente (respuesta, error, presupuesto agotado) y cuánto gastan."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.seconds = RollingWindow(max_samples)
+        self.steps = RollingWindow(max_samples)
+        self.tokens = RollingWindow(max_samples)
+        self.outcomes = Counter()
+        self.denied_tool_calls = 0
+        self._lock = threading.Lock()
+
+    def tool_call_denied(self):
+        with self._lock:
+            self.denied_tool_calls += 1
+
+    def add(self, outcome: str, budget: TurnBudget):
+        with self._lock:
+            self.outcomes[outcome] += 1
+        self.seconds.add(budget.elapsed())
+        self.steps.add(budget.steps)
+        self.tokens.add(budget.tokens)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            denied_tool_calls = self.denied_tool_calls
+        return {
+            "outcomes": outcomes,
+            "denied_tool_calls": denied_tool_calls,
+            "seconds": self.seconds.summary(),
+            "steps": self.steps.summary(),
+            "tokens": self.tokens.summary(),
+        }
+
+
+turn_stats = TurnStats()
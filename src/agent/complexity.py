@@ -0,0 +1,135 @@
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+
+from src.components.llms import GROQ_API_KEY, BaseGenericLLM, GenericLLM
+from src.components.memory import user_message_mask
+from src.firebase.types import MessageDataType
+from src.settings.settings import Config
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+SMALL = "small"
+LARGE = "large"
+
+# Palabras que suelen terminar en una herramienta (correo, calendario, cuenta de Google),
+# direcciones de correo y números (fechas, horas)
+TOOL_HINTS = re.compile(
+    r"correo|e-?mail|mail|envi|mand|program|agend|calendar|event|reuni|cita|record|"
+    r"mañana|hoy|semana|lunes|martes|miércoles|miercoles|jueves|viernes|sábado|sabado|domingo|"
+    r"hora|google|cuenta|login|sesi|cancel|mov|cambi|borr|elimin|@|\d",
+    re.IGNORECASE,
+)
+
+_USER_PREFIX, _USER_SUFFIX = user_message_mask.split("{user_message}")
+
+
+def user_text(content: str) -> str:
+    """El texto que escribió el usuario, sin la plantilla de `user_message_mask`."""
+    content = content.removeprefix(_USER_PREFIX)
+    return content.removesuffix(_USER_SUFFIX).strip()
+
+
+class RouteStats:
+    """Llamadas, escaladas, latencia, tokens y costo estimado de una ruta."""
+
+    def __init__(self):
+        self.latency = RollingWindow()
+        self.counts = Counter()
+        self.reasons = Counter()
+        self.cost = 0.0
+        self.saved = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "reasons": dict(self.reasons),
+            "latency": self.latency.summary(),
+            "cost_usd": round(self.cost, 6),
+            "saved_usd": round(self.saved, 6),
+        }
+
+
+class ComplexityRouter:
+    """
+    Decide, en cada paso del agente, si alcanza el modelo chico o hace falta el grande.
+
+    Va al chico solo el primer paso de un turno corto que no parece necesitar herramientas
+    (saludos, agradecimientos, charla). Los pasos posteriores a una herramienta, los mensajes
+    largos, los que mencionan correos, fechas o eventos, y las respuestas a una pregunta del
+    asistente sobre una acción pendiente van al grande. Si la salida del chico no se puede
+    parsear (o pide una herramienta que no existe), el agente repite el paso con el grande.
+
+    `prices` es el costo por millón de tokens de cada modelo, para estimar el ahorro.
+    """
+
+    def __init__(
+        self,
+        small: BaseGenericLLM,
+        *,
+        max_simple_chars: int = 80,
+        prices: dict[str, float] | None = None,
+    ):
+        self.small = small
+        self.max_simple_chars = max_simple_chars
+        self.prices = prices or {}
+        self.stats: dict[str, RouteStats] = defaultdict(RouteStats)
+        self._lock = threading.Lock()
+
+    def classify(self, history: list[MessageDataType], step: int) -> tuple[str, str]:
+        """`(ruta, motivo)` para el paso `step` (1 es el primero del turno)."""
+        if step > 1:
+            return LARGE, "post_tool"
+
+        last_user = next((i for i in range(len(history) - 1, -1, -1) if history[i].role == "user"), None)
+        if last_user is None:
+            return LARGE, "no_user_message"
+
+        text = user_text(history[last_user].content)
+        if len(text) > self.max_simple_chars:
+            return LARGE, "long_message"
+        if TOOL_HINTS.search(text):
+            return LARGE, "tool_hint"
+
+        previous = history[last_user - 1] if last_user > 0 else None
+        if previous is not None and previous.role == "assistant" and "?" in previous.content:
+            if TOOL_HINTS.search(previous.content):
+                return LARGE, "pending_confirmation"
+
+        return SMALL, "simple"
+
+    def _cost(self, model: str, usage: dict | None) -> tuple[float, int]:
+        usage = usage if isinstance(usage, dict) else {}
+        tokens = (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+        return tokens * self.prices.get(model, 0.0) / 1_000_000, tokens
+
+    def record(self, route: str, reason: str, *, latency: float, usage: dict | None, model: str, large_model: str):
+        cost, tokens = self._cost(model, usage)
+        with self._lock:
+            stats = self.stats[route]
+            stats.counts["calls"] += 1
+            stats.counts["tokens"] += tokens
+            stats.reasons[reason] += 1
+            stats.latency.add(latency)
+            stats.cost += cost
+            if route == SMALL:
+                stats.saved += self._cost(large_model, usage)[0] - cost
+
+    def escalated(self, error: Exception):
+        """La salida del chico no sirvió: el paso se repite con el grande y se registra en esa ruta."""
+        with self._lock:
+            self.stats[SMALL].counts["escalated"] += 1
+        logger.info("Salida del modelo chico no válida, se repite el paso con el grande: %s", error)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {route: stats.snapshot() for route, stats in self.stats.items()}
+
+
+complexity_router = ComplexityRouter(
+    GenericLLM.from_groq_llama3_1_8b(GROQ_API_KEY),
+    max_simple_chars=Config.LLM_SMALL_MAX_CHARS,
+    prices=Config.LLM_PRICE_PER_MTOK,
+)
@@ -0,0 +1,74 @@
+import logging
+import threading
+from collections import Counter
+
+from src.components.tokens import token_counter
+from src.components.tool import BaseTool
+from src.settings.settings import Config
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+TEXT = "text"
+NATIVE = "native"
+
+
+class NativeToolCallError(ValueError):
+    """La respuesta en modo function calling no sirve (error del proveedor, argumentos inválidos, herramienta inexistente)."""
+
+
+_schemas: dict[tuple[str, ...], list[dict]] = {}
+_schemas_lock = threading.Lock()
+
+
+def tool_schemas(tools: dict[str, BaseTool]) -> list[dict]:
+    """`tools` para la petición, en el mismo orden siempre (así no rompen la caché de prompt del proveedor)."""
+    key = tuple(tools)
+    with _schemas_lock:
+        if key not in _schemas:
+            _schemas[key] = [tool.to_openai_tool() for tool in tools.values()]
+        return _schemas[key]
+
+
+def schema_tokens(schemas: list[dict], model_name: str | None = None) -> int:
+    """Aproximación de lo que ocupan los esquemas en el contexto (el proveedor los inyecta en el prompt)."""
+    return token_counter.count(str(schemas), model_name)
+
+
+def supports_native_tools(model_name: str) -> bool:
+    return Config.AGENT_TOOL_MODE == NATIVE and model_name in Config.AGENT_NATIVE_TOOLS_MODELS
+
+
+class ToolModeStats:
+    """Latencia y tokens por paso en cada modo (texto `SYSTEM_2` o function calling), y las caídas a texto."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.latency = {mode: RollingWindow(max_samples) for mode in (TEXT, NATIVE)}
+        self.input_tokens = {mode: RollingWindow(max_samples) for mode in (TEXT, NATIVE)}
+        self.output_tokens = {mode: RollingWindow(max_samples) for mode in (TEXT, NATIVE)}
+        self.counts = Counter()
+
+    def add(self, mode: str, latency: float, usage: dict | None, action: str | None):
+        usage = usage if isinstance(usage, dict) else {}
+        self.counts[f"{mode}_steps"] += 1
+        self.counts[f"{mode}_final_answers"] += int(action == "final_answer")
+        self.latency[mode].add(latency)
+        if usage.get("input_tokens") is not None:
+            self.input_tokens[mode].add(usage["input_tokens"])
+        if usage.get("output_tokens") is not None:
+            self.output_tokens[mode].add(usage["output_tokens"])
+
+    def fallback(self, error: Exception):
+        self.counts["native_fallbacks"] += 1
+        logger.info("Function calling sin respuesta válida, se repite el paso en modo texto: %s", error)
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "latency": {mode: window.summary() for mode, window in self.latency.items()},
+            "input_tokens": {mode: window.summary() for mode, window in self.input_tokens.items()},
+            "output_tokens": {mode: window.summary() for mode, window in self.output_tokens.items()},
+        }
+
+
+tool_mode_stats = ToolModeStats()
@@ -0,0 +1,252 @@
+import ast
+import json
+import logging
+import re
+import threading
+from collections import Counter
+
+from src.agent.streaming import ACTION_MARKER, END_ACTION
+from src.components.prompt import ChatMessage, ChatTemplate
+from src.utils.utils import ensure_json_format, str_in_placeholders
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_ERROR_PREFIX = "Error en la solicitud"
+
+_ACTION_MARKER = re.compile(r"\baction\s*:", re.IGNORECASE)
+_CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+# Pedido puntual al modelo cuando la salida no se pudo reparar
+REASK_MESSAGE = """Your previous message could not be processed ({error}).
+Reply again with a single action using exactly this format and nothing else:
+Action:
+{{
+  "action": $TOOL_NAME,
+  "action_input": $INPUT
+}}<end_action>"""
+
+
+def is_provider_error(text: str) -> bool:
+    """El texto que devuelve `chat_llm` (sin `raise_on_error`) cuando falla el proveedor."""
+    answer = str_in_placeholders(text, ["<Answer>", "</Answer>"]) or text
+    return answer.strip().startswith(PROVIDER_ERROR_PREFIX)
+
+
+class ActionParseError(ValueError):
+    """La salida del modelo no se pudo convertir en una acción, ni reparándola."""
+
+    def __init__(self, message: str, kind: str = "invalid"):
+        super().__init__(message)
+        self.kind = kind
+
+
+class ParsedAction:
+    def __init__(self, *, thought: str, action: str, action_input: dict, repairs: list[str]):
+        self.thought = thought
+        self.action = action
+        self.action_input = action_input
+        self.repairs = repairs
+
+    @property
+    def final_answer(self) -> str:
+        if self.action != "final_answer":
+            return ""
+        answer = self.action_input.get("answer", "")
+        return answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+
+    @property
+    def content(self) -> str:
+        """La acción reescrita en formato `SYSTEM_2` limpio (es lo que queda en el historial)."""
+        blob = json.dumps({"action": self.action, "action_input": self.action_input}, ensure_ascii=False)
+        return f"{self.thought}\n{ACTION_MARKER}\n{blob}{END_ACTION}" if self.thought else f"{ACTION_MARKER}\n{blob}{END_ACTION}"
+
+
+def _balanced_object(text: str, start: int) -> tuple[str, bool]:
+    """El objeto JSON que abre en `start` y si estaba completo (acepta strings con comillas simples o dobles)."""
+    depth = 0
+    quote = None
+    escape = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1], True
+    return text[start:] + "}" * max(depth, 1), False
+
+
+def _load_object(blob: str, repairs: list[str]) -> dict:
+    """`json.loads` y, si falla, las reparaciones locales en orden de menor a mayor intervención."""
+    try:
+        return json.loads(blob)
+    except json.JSONDecodeError:
+        pass
+
+    candidate = _TRAILING_COMMA.sub(r"\1", blob)
+    if candidate != blob:
+        try:
+            value = json.loads(candidate)
+            repairs.append("trailing_comma")
+            return value
+        except json.JSONDecodeError:
+            pass
+
+    try:
+        # Comillas simples, True/False/None: el modelo escribió un dict de Python
+        value = ast.literal_eval(candidate)
+        if isinstance(value, dict):
+            repairs.append("python_literal")
+            return value
+    except (ValueError, SyntaxError):
+        pass
+
+    quoted = ensure_json_format(candidate, ["action", "action_input", "answer"])
+    try:
+        value = json.loads(quoted)
+        repairs.append("unquoted_keys")
+        return value
+    except json.JSONDecodeError as e:
+        raise ActionParseError(f"JSON inválido: {e}") from e
+
+
+def parse_action(content: str | Exception) -> ParsedAction:
+    """
+    Convierte la salida en formato `SYSTEM_2` en una acción, reparando localmente los defectos
+    más comunes: bloques de código, falta de `<end_action>` o de `Action:`, comillas simples,
+    comas finales, claves sin comillas, llaves sin cerrar, y respuestas en el formato viejo
+    `<Answer>...</Answer>` o como texto plano. Lo que no se puede reparar levanta `ActionParseError`.
+    """
+    if isinstance(content, Exception):
+        raise ActionParseError(str(content), kind="provider_error")
+    if not content or not content.strip():
+        raise ActionParseError("Respuesta vacía", kind="empty")
+
+    repairs: list[str] = []
+    text = content.strip()
+
+    answer = str_in_placeholders(text, ["<Answer>", "</Answer>"]).strip()
+    if is_provider_error(text):
+        raise ActionParseError(answer or text, kind="provider_error")
+
+    # Sin `<end_action>` no es un defecto: es la secuencia de corte en streaming y el proveedor no la devuelve
+    text = text.split(END_ACTION, 1)[0]
+
+    fenced = _CODE_FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = text[: fenced.start()] + fenced.group(1) + text[fenced.end() :]
+        repairs.append("code_fence")
+
+    marker = _ACTION_MARKER.search(text)
+    if marker:
+        if marker.group(0) != ACTION_MARKER:
+            repairs.append("action_marker")
+        thought = text[: marker.start()].strip()
+        brace = text.find("{", marker.end())
+    else:
+        brace = text.find("{")
+        thought = text[:brace].strip() if brace >= 0 else ""
+
+    if brace < 0:
+        if answer:
+            repairs.append("answer_tags")
+            return ParsedAction(thought="", action="final_answer", action_input={"answer": answer}, repairs=repairs)
+        if marker or text.lower().startswith("thought"):
+            raise ActionParseError("Falta el JSON de la acción")
+        # Sin acción ni JSON: el modelo le respondió directo al usuario
+        repairs.append("plain_text_answer")
+        return ParsedAction(thought="", action="final_answer", action_input={"answer": text}, repairs=repairs)
+
+    blob, complete = _balanced_object(text, brace)
+    if not complete:
+        repairs.append("unbalanced_braces")
+    action_json = _load_object(blob, repairs)
+
+    if not isinstance(action_json, dict) or "action" not in action_json:
+        raise ActionParseError("El JSON no tiene `action`")
+    if not marker:
+        repairs.append("missing_action_marker")
+
+    action = str(action_json["action"]).replace("[", "").replace("]", "").replace("<", "").replace(">", "").strip()
+    action_input = action_json.get("action_input", {})
+    if isinstance(action_input, str):
+        if action == "final_answer":
+            action_input = {"answer": action_input}
+            repairs.append("answer_as_string")
+        else:
+            action_input = _load_object(action_input, repairs) if action_input.strip().startswith("{") else {}
+    if not isinstance(action_input, dict):
+        raise ActionParseError("`action_input` no es un objeto")
+    if action == "final_answer" and "answer" not in action_input:
+        raise ActionParseError("`final_answer` sin `answer`")
+
+    return ParsedAction(thought=thought, action=action, action_input=action_input, repairs=repairs)
+
+
+def reask_template(chat_template: ChatTemplate, content: str | Exception, error: ActionParseError) -> ChatTemplate:
+    """
+    Plantilla para el único reintento: la misma conversación más la salida rota y el pedido
+    de repetir solo la acción. Si el problema fue del proveedor, se repite la misma petición.
+    """
+    if error.kind == "provider_error" or isinstance(content, Exception):
+        return chat_template
+    return ChatTemplate(
+        messages=[
+            *chat_template.messages,
+            ChatMessage(role="assistant", content=content),
+            ChatMessage(role="user", content=REASK_MESSAGE.format(error=error)),
+        ],
+        prefix_version=chat_template.prefix_version,
+    )
+
+
+class ParseStats:
+    """Cuántas salidas se parsean tal cual, cuántas se reparan (y cómo), cuántas necesitan re-preguntar."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.repairs = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def parsed(self, repairs: list[str]):
+        with self._lock:
+            self.counts["parsed"] += 1
+            self.counts["repaired"] += int(bool(repairs))
+            self.repairs.update(repairs)
+
+    def failed(self, error: ActionParseError):
+        with self._lock:
+            self.counts["failed"] += 1
+            self.errors[error.kind] += 1
+
+    def reasked(self, ok: bool):
+        with self._lock:
+            self.counts["reasks"] += 1
+            self.counts["reask_ok"] += int(ok)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            parsed = self.counts["parsed"]
+            total = parsed + self.counts["failed"]
+            return {
+                "counts": dict(self.counts),
+                "repairs": dict(self.repairs),
+                "errors": dict(self.errors),
+                "repair_rate": self.counts["repaired"] / total if total else 0.0,
+                "reask_rate": self.counts["reasks"] / total if total else 0.0,
+            }
+
+
+parse_stats = ParseStats()
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from src.agent.prompt.prompt import get_native_task_prompt, get_task_prompt
+from src.components.prompt import ChatMessage, ChatTemplate
+from src.components.tokens import token_counter
+from src.components.tool import BaseTool
+from src.firebase.types import MessageDataType
+from src.settings.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Lo único que cambia en cada llamada va al final, fuera del prefijo que cachea el proveedor
+volatile_context_mask = """Context (not part of the conversation): {now}"""
+
+
+class PromptAssembler:
+    """
+    Arma los mensajes de cada paso del agente con un prefijo byte a byte estable:
+
+    1. el system prompt generado desde el código actual (`get_task_prompt`), versionado con
+       un hash de su contenido; los system prompts viejos guardados en Firestore se ignoran,
+    2. el historial tal cual se guardó (no se reescribe),
+    3. al final, un mensaje con los datos volátiles (fecha y hora) que no se persiste.
+
+    Así cada paso comparte con el anterior todo el prefijo hasta el último mensaje y el
+    proveedor puede reutilizar su caché de prompt.
+
+    Con `model_name`, el historial se recorta para que el prompt entre en la ventana del
+    modelo. Se descartan los mensajes más viejos en bloques de `trim_block` contados desde el
+    inicio del historial: el punto de corte no se mueve con cada mensaje nuevo, solo cuando
+    vuelve a faltar espacio, y el prefijo sigue siendo cacheable entre esos saltos.
+    """
+
+    def __init__(self, timezone: str | None = None, trim_block: int = 10):
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self.trim_block = max(1, trim_block)
+        self._system_prompts: dict[tuple, tuple[ChatMessage, str]] = {}
+        self._lock = threading.Lock()
+
+    def system_prompt(self, tools: dict[str, BaseTool], native: bool = False) -> tuple[ChatMessage, str]:
+        """`(mensaje, versión)` del system prompt para este set de herramientas (`native`: function calling)."""
+        key = (native, *tools)
+        with self._lock:
+            if key not in self._system_prompts:
+                content = get_native_task_prompt(tools=tools) if native else get_task_prompt(tools=tools)
+                version = hashlib.sha256(content.encode()).hexdigest()[:12]
+                self._system_prompts[key] = (ChatMessage(role="system", content=content), version)
+            return self._system_prompts[key]
+
+    def volatile_context(self, now: datetime | None = None) -> str:
+        now = now or datetime.now(self.timezone)
+        return volatile_context_mask.format(
+            now=now.strftime("Today's date is %A, %B %d, %Y, and the current time is %H:%M.")
+        )
+
+    def assemble(
+        self,
+        tools: dict[str, BaseTool],
+        history: list[MessageDataType],
+        now: datetime | None = None,
+        *,
+        model_name: str | None = None,
+        reserve_tokens: int = 0,
+        native: bool = False,
+    ) -> ChatTemplate:
+        system_message, version = self.system_prompt(tools, native)
+        context_message = ChatMessage(role="user", content=self.volatile_context(now))
+        history = [msg for msg in history if msg.role != "system"]
+
+        if model_name:
+            available = (
+                token_counter.input_budget(model_name, reserve_tokens)
+                - token_counter.count_message(system_message, model_name)
+                - token_counter.count_message(context_message, model_name)
+            )
+            history = self.fit_history(history, available, model_name)
+
+        messages = [system_message]
+        messages.extend(msg.get_llm_legible_message() for msg in history)
+        messages.append(context_message)
+        return ChatTemplate(messages=messages, prefix_version=version)
+
+    def fit_history(self, history: list[MessageDataType], available: int, model_name: str) -> list[MessageDataType]:
+        """Sufijo del historial que entra en `available` tokens (el último mensaje siempre se mantiene)."""
+        counts = [token_counter.count_message(msg, model_name) for msg in history]
+        total = sum(counts)
+        if total <= available:
+            return history
+
+        cut = 0
+        while total > available and cut < len(history) - 1:
+            block_end = min(cut + self.trim_block, len(history) - 1)
+            total -= sum(counts[cut:block_end])
+            cut = block_end
+
+        logger.info(
+            "Historial recortado a %d de %d mensajes (%d tokens, disponibles %d) para %s",
+            len(history) - cut, len(history), total, available, model_name,
+        )
+        return history[cut:]
+
+
+class PromptCacheStats:
+    """Tokens de entrada y tokens servidos desde la caché del proveedor, por versión de prefijo y modelo."""
+
+    def __init__(self):
+        self._stats: dict[tuple[str, str], dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "cache_hits": 0, "input_tokens": 0, "cached_tokens": 0}
+        )
+        self._lock = threading.Lock()
+
+    def add(self, usage: dict, prefix_version: str | None):
+        input_tokens = usage.get("input_tokens") or 0
+        cached_tokens = usage.get("cached_tokens") or 0
+        key = (prefix_version or "-", usage.get("model", ""))
+        with self._lock:
+            stats = self._stats[key]
+            stats["calls"] += 1
+            stats["cache_hits"] += int(cached_tokens > 0)
+            stats["input_tokens"] += input_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                f"{version}/{model}": {
+                    **stats,
+                    "cached_ratio": stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0,
+                }
+                for (version, model), stats in self._stats.items()
+            }
+
+
+prompt_assembler = PromptAssembler(Config.TIMEZONE, trim_block=Config.HISTORY_TRIM_BLOCK)
+prompt_cache_stats = PromptCacheStats()
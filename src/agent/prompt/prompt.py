@@ -98,6 +98,20 @@ Here are the rules you should always follow to solve your task:
 Now Begin! If you solve the task correctly, you will receive a reward of $1,000,000."""
 
 
+# Para proveedores con function calling: las herramientas van como `tools` en la petición,
+# así que el prompt no describe el formato Thought/Action
+SYSTEM_NATIVE = """You are an expert assistant who can solve any task using the tools you have been given. You will chat with a user and you have to find his current task according to the messages in the conversation.
+Once you find the current user task you have to solve as best you can.
+
+Here are the rules you should always follow to solve your task:
+1. Call at most **one** tool at a time and wait for its result before continuing.
+2. Always use the right arguments for the tools. Never use variable names as arguments, use the value instead.
+3. Never re-do a tool call that you previously did with the exact same parameters.
+4. Do not call a tool if the user hasn’t provided all required parameters. Instead, politely ask for the missing information.
+5. When you have the final answer for the user, reply with it directly as plain text, without calling any tool.
+6. Ensure your responses remain fun, friendly, and professional, maintaining a tone suitable for the context."""
+
+
 def get_agent_prompt_2(
     tools: dict[str, BaseTool],
 ):
@@ -130,3 +144,9 @@ def get_task_prompt(
     content = SYSTEM_2.replace("{{tools}}", tool_descriptions).replace("{{tool_names}}", tool_names)
     
     return content
+
+
+def get_native_task_prompt(
+    tools: dict[str, BaseTool],
+):
+    return SYSTEM_NATIVE
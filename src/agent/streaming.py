@@ -0,0 +1,159 @@
+from collections import Counter
+
+from src.components.tokens import token_counter
+from src.utils.stats import RollingWindow
+
+ACTION_MARKER = "Action:"
+END_ACTION = "<end_action>"
+# Si el modelo no cierra el JSON de la acción y sigue con la observación, el paso terminó. Solo
+# cuenta a principio de línea y ya abierto el JSON: el Thought puede mencionar "Observation:"
+OBSERVATION = "\nObservation:"
+
+# Secuencias de parada para el proveedor: el formato `SYSTEM_2` termina cada paso en `<end_action>`
+AGENT_STOP_SEQUENCES = [END_ACTION]
+
+
+def estimate_tokens(text: str, model_name: str | None = None) -> int:
+    """Para cuando el proveedor no informa `usage` (p. ej. al cortar un stream)."""
+    return token_counter.count(text, model_name)
+
+
+class ActionStreamParser:
+    """
+    Detecta, mientras llegan los tokens, cuándo el blob JSON que sigue a `Action:` está
+    completo (llaves balanceadas, respetando strings y escapes). Cada `feed` solo recorre el
+    texto nuevo. Si el modelo escribe `<end_action>` antes de cerrar el JSON (o una línea
+    `Observation:` con el JSON ya abierto), también se da por terminado y el parseo final decide.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.end = -1
+        self._scan = 0
+        self._action_at = -1
+        self._json_started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.end >= 0
+
+    @property
+    def content(self) -> str:
+        """Texto hasta el final del blob (o todo lo recibido si no terminó)."""
+        return self.text[: self.end] if self.done else self.text
+
+    @property
+    def discarded(self) -> str:
+        """Texto recibido después del blob, que no se usa."""
+        return self.text[self.end:] if self.done else ""
+
+    def feed(self, chunk: str) -> bool:
+        if self.done or not chunk:
+            return self.done
+
+        previous_length = len(self.text)
+        self.text += chunk
+
+        if self._action_at < 0:
+            found = self.text.find(ACTION_MARKER, max(0, previous_length - len(ACTION_MARKER)))
+            if found >= 0:
+                self._action_at = found
+                self._scan = found + len(ACTION_MARKER)
+
+        if self._action_at >= 0:
+            self._scan_json()
+
+        if not self.done:
+            self._find_end_marker(previous_length)
+        return self.done
+
+    def _scan_json(self):
+        text = self.text
+        for i in range(self._scan, len(text)):
+            char = text[i]
+            if not self._json_started:
+                if char == "{":
+                    self._json_started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "\n" and OBSERVATION.startswith(text[i:i + len(OBSERVATION)]):
+                if len(text) - i < len(OBSERVATION):
+                    # Puede ser el comienzo de la observación: se espera al próximo chunk
+                    self._scan = i
+                    return
+                # El salto de línea queda en el contenido; la observación no
+                self.end = i + 1
+                return
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return
+        self._scan = len(text)
+
+    def _find_end_marker(self, previous_length: int):
+        found = self.text.find(END_ACTION, max(0, previous_length - len(END_ACTION)))
+        if found >= 0 and (self.end < 0 or found < self.end):
+            self.end = found
+
+
+class StreamStepStats:
+    """Métricas por paso del agente: tiempo hasta la acción y tokens generados/descartados."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.time_to_first_token = RollingWindow(max_samples)
+        self.time_to_action = RollingWindow(max_samples)
+        self.output_tokens = {"stream": RollingWindow(max_samples), "full": RollingWindow(max_samples)}
+        self.discarded_tokens = {"stream": RollingWindow(max_samples), "full": RollingWindow(max_samples)}
+        self.counts = Counter()
+
+    def add_stream_step(
+        self,
+        *,
+        time_to_first_token: float | None,
+        time_to_action: float | None,
+        output_tokens: int,
+        discarded_tokens: int,
+        cut_early: bool,
+    ):
+        self.counts["stream_steps"] += 1
+        self.counts["cut_early"] += int(cut_early)
+        if time_to_first_token is not None:
+            self.time_to_first_token.add(time_to_first_token)
+        if time_to_action is not None:
+            self.time_to_action.add(time_to_action)
+        else:
+            self.counts["no_action"] += 1
+        self.output_tokens["stream"].add(output_tokens)
+        self.discarded_tokens["stream"].add(discarded_tokens)
+
+    def add_full_step(self, *, output_tokens: int, discarded_tokens: int):
+        self.counts["full_steps"] += 1
+        self.output_tokens["full"].add(output_tokens)
+        self.discarded_tokens["full"].add(discarded_tokens)
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "time_to_first_token": self.time_to_first_token.summary(),
+            "time_to_action": self.time_to_action.summary(),
+            "output_tokens": {mode: window.summary() for mode, window in self.output_tokens.items()},
+            "discarded_tokens": {mode: window.summary() for mode, window in self.discarded_tokens.items()},
+        }
+
+
+stream_stats = StreamStepStats()
@@ -0,0 +1,158 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from collections import Counter, defaultdict
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from src.agent.types import Base_LLM_Response
+from src.settings.settings import Config
+from src.utils.stats import Histogram, RollingWindow
+from src.utils.logs import stop_listener
+
+LATENCY_BOUNDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+INPUT_TOKENS_BOUNDS = [512, 1024, 2048, 4096, 8192, 16384, 32768, 65536]
+OUTPUT_TOKENS_BOUNDS = [16, 32, 64, 128, 256, 512, 1024, 2048]
+
+
+def user_id_of(phone: str | None) -> str | None:
+    """Identificador seudónimo del usuario: alcanza para agrupar llamadas sin guardar el teléfono."""
+    return hashlib.sha256(phone.encode()).hexdigest()[:12] if phone else None
+
+
+class ModelCallStats:
+    """Histogramas de las llamadas a un modelo."""
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BOUNDS)
+        self.latency_window = RollingWindow()
+        self.input_tokens = Histogram(INPUT_TOKENS_BOUNDS)
+        self.output_tokens = Histogram(OUTPUT_TOKENS_BOUNDS)
+        self.steps = Counter()
+        self.counts = Counter()
+
+    def add(self, record: dict):
+        self.counts["calls"] += 1
+        self.counts["errors"] += int(bool(record.get("error")))
+        self.counts["unparsed"] += int(not record.get("parsed"))
+        # Respuestas que llegaron al tope: `max_tokens` quedó corto (o el modelo no paró)
+        self.counts["hit_max_tokens"] += int(
+            bool(record.get("max_tokens")) and (record.get("output_tokens") or 0) >= record["max_tokens"]
+        )
+        if record.get("step") is not None:
+            self.steps[str(record["step"])] += 1
+        if record.get("response_time") is not None:
+            self.latency.add(record["response_time"])
+            self.latency_window.add(record["response_time"])
+        if record.get("input_tokens") is not None:
+            self.input_tokens.add(record["input_tokens"])
+        if record.get("output_tokens") is not None:
+            self.output_tokens.add(record["output_tokens"])
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "steps": dict(self.steps),
+            "latency": {**self.latency.summary(), **self.latency_window.summary()},
+            "input_tokens": self.input_tokens.summary(),
+            "output_tokens": self.output_tokens.summary(),
+        }
+
+
+class LLMTelemetry:
+    """
+    Registro de cada llamada del agente al LLM (modelo, tokens, latencia, paso y usuario).
+
+    Con `path`, cada llamada se agrega como una línea JSON a un archivo que rota al llegar a
+    `max_bytes` (se guardan `backup_count` archivos viejos). La escritura ocurre en el hilo de
+    un `QueueListener`, como los logs. Al iniciar se relee el archivo actual para que los
+    histogramas por modelo no arranquen vacíos después de un deploy.
+    """
+
+    def __init__(self, path: str | None = None, *, max_bytes: int = 10_000_000, backup_count: int = 5):
+        self.path = path or None
+        self.models: dict[str, ModelCallStats] = defaultdict(ModelCallStats)
+        self._lock = threading.Lock()
+        self._records: queue.Queue | None = None
+        self._listener: QueueListener | None = None
+
+        if self.path:
+            self._replay()
+            self._start_writer(max_bytes, backup_count)
+
+    def _start_writer(self, max_bytes: int, backup_count: int):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file_handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        self._records = queue.Queue(-1)
+        self._listener = QueueListener(self._records, file_handler)
+        self._listener.start()
+        atexit.register(stop_listener, self._listener)
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    self._aggregate(json.loads(line))
+                except (json.JSONDecodeError, TypeError, KeyError):
+                    continue
+
+    def _aggregate(self, record: dict):
+        with self._lock:
+            self.models[record.get("model") or "-"].add(record)
+
+    def record(
+        self,
+        response: Base_LLM_Response,
+        *,
+        step: int | None = None,
+        user: str | None = None,
+        max_tokens: int | None = None,
+        stream: bool = False,
+        parsed: bool = True,
+        error: str | None = None,
+    ) -> dict:
+        usage = response.usage or {}
+        record = {
+            "date": response.date,
+            "llm_call_id": response.llm_call_id,
+            "type": response.type,
+            "model": usage.get("model") or response.model_name,
+            "user": user_id_of(user),
+            "step": step,
+            "stream": stream,
+            "max_tokens": max_tokens,
+            "messages": len(response.messages_list or []),
+            "input_tokens": usage.get("input_tokens"),
+            "output_tokens": usage.get("output_tokens"),
+            "cached_tokens": usage.get("cached_tokens"),
+            "response_time": usage.get("response_time"),
+            "time_to_action": usage.get("time_to_action"),
+            "parsed": parsed,
+            "error": error,
+        }
+        self._aggregate(record)
+        if self._records is not None:
+            self._records.put_nowait(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False)}))
+        return record
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {model: stats.snapshot() for model, stats in self.models.items()}
+
+    def close(self):
+        if self._listener:
+            stop_listener(self._listener)
+
+
+llm_telemetry = LLMTelemetry(
+    Config.LLM_TELEMETRY_PATH,
+    max_bytes=Config.LLM_TELEMETRY_MAX_BYTES,
+    backup_count=Config.LLM_TELEMETRY_BACKUPS,
+)
@@ -11,7 +11,7 @@ from src.google.google_services import (
     send_google_email,
 )
 from google.oauth2.credentials import Credentials
-from src.scheduler.scheduler import schedule_task
+from src.scheduler.email_jobs import schedule_email
 from src.utils.utils import convertir_a_datetime
 from datetime import datetime
 import re
@@ -90,10 +90,14 @@ def tool_callback(
             r = send_google_email(**kwargs)
             return r
 
-        # Programar el correo
+        # Programar el correo (las credenciales se resuelven al momento del envío)
 
-        s_response = schedule_task(
-            func=send_google_email, kwargs=kwargs, date=scheduled_time
+        s_response = schedule_email(
+            user_phone=user_manager.user_phone,
+            to_emails=to_emails,
+            subject=subject,
+            body=body,
+            date=scheduled_time,
         )
         if s_response.success:
             logging.info(f"Correo agendado para {scheduled_time}.")
@@ -1,26 +1,73 @@
 from src.firebase.users_manager import UserManager
-from src.scheduler.scheduler import scheduler, schedule_chat_manager
+from src.scheduler.scheduler import scheduler
+from src.scheduler.email_jobs import restore_email_jobs
+from src.ingress.ingress import IngressQueue, IngressQueueFull
+from src.ingress.executors import create_backend
+from src.components.llm_pool import async_llm_pool
+from src.agent.streaming import stream_stats
+from src.agent.prompt.assembly import prompt_cache_stats
+from src.components.routing import routing_llm_70b
+from src.components.tokens import token_counter
+from src.components.rate_limit import rate_limits
+from src.agent.telemetry import llm_telemetry
+from src.agent.complexity import complexity_router
+from src.agent.native_tools import tool_mode_stats
+from src.agent.parsing import parse_stats
+from src.agent.budget import turn_stats
+from src.whatsapp.media import media_stats
+from src.whatsapp.audio import chunked_transcriber
+from src.whatsapp.transcriptions import transcription_cache
+from src.ingress.dedup import MessageDedup
+from src.ingress.statuses import DeliveryTracker, StatusSink, WebhookCounters, is_status_only
 from src.google.google_services import flow, db
 from src.google.utils import decode_state
-from src.whatsapp.types import WhatsAppMessage, Props
-from src.whatsapp.whatsapp import chat_manager
+from src.whatsapp.types import WebhookPayload
+from src.whatsapp.whatsapp import run_chat_task
 import logging
 from fastapi import FastAPI, Request, HTTPException, Response
 from fastapi.responses import JSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-import traceback
+import json
 from src.settings.settings import Config
 from fastapi.responses import RedirectResponse, HTMLResponse
 from src.utils.utils import html_wrong_google_url, html_close
+from src.utils.logs import SAMPLED, payload, setup_logging
 
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+setup_logging(
+    Config.LOG_LEVEL,
+    Config.LOG_LEVELS,
+    payload_max_chars=Config.LOG_PAYLOAD_MAX_CHARS,
+    sample_rate=Config.LOG_PAYLOAD_SAMPLE_RATE,
 )
+logger = logging.getLogger(__name__)
 SECRET_KEY = Config.SECRET_KEY
 
+ingress_queue = IngressQueue(
+    run_chat_task,
+    backend=create_backend(Config.INGRESS_EXECUTOR, Config.INGRESS_WORKERS),
+    workers=Config.INGRESS_WORKERS,
+    max_pending=Config.INGRESS_MAX_PENDING,
+    max_pending_per_user=Config.INGRESS_MAX_PENDING_PER_USER,
+    overflow_policy=Config.INGRESS_OVERFLOW_POLICY,
+    debounce_ms=Config.INGRESS_DEBOUNCE_MS,
+    max_debounce_ms=Config.INGRESS_MAX_DEBOUNCE_MS,
+    max_batch=Config.INGRESS_MAX_BATCH,
+)
+message_dedup = MessageDedup(
+    max_entries=Config.DEDUP_MAX_ENTRIES,
+    ttl_seconds=Config.DEDUP_TTL_SECONDS,
+    sqlite_path=Config.DEDUP_SQLITE_PATH or None,
+)
+webhook_counters = WebhookCounters()
+delivery_tracker = DeliveryTracker()
+status_sink = (
+    StatusSink(delivery_tracker, max_pending=Config.STATUS_SINK_MAX_PENDING)
+    if Config.STATUS_SINK_ENABLED
+    else None
+)
+
 app = FastAPI()
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 app.add_middleware(
@@ -56,9 +103,9 @@ async def callback(request: Request):
         if not state:
             raise HTTPException(status_code=400, detail="Falta el parámetro 'state'")
         
-        logging.info(state)
+        logger.debug("state: %s", state)
         decoded_state = decode_state(state)
-        logging.info(decoded_state)
+        logger.debug("decoded_state: %s", decoded_state)
         user_phone = decoded_state["phone_number"]
 
         user_manager = UserManager(db, user_phone)
@@ -68,14 +115,14 @@ async def callback(request: Request):
         return HTMLResponse(content=html_close, status_code=200)
 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Error al intercambiar el código en /callback")
         raise HTTPException(status_code=400, detail=f"Error al intercambiar el código: {e}")
 
 @app.get("/wsp-webhook")
 async def get_wsp_webhook(request: Request, response: Response):
     try:
-        logging.info("GET endpoint hit")
-        logging.info(f"Query parameters: {request.query_params}")
+        logger.info("GET endpoint hit")
+        logger.debug("Query parameters: %s", request.query_params)
         
         if request.method == "OPTIONS":
             response.headers["Access-Control-Allow-Methods"] = "GET, POST"
@@ -87,16 +134,12 @@ async def get_wsp_webhook(request: Request, response: Response):
         return Response(content=hub_challenge)
     
     except Exception as error:
-        logging.error(f"Error in GET /wsp-webhook: {error}")
+        logger.error("Error in GET /wsp-webhook: %s", error)
         raise HTTPException(status_code=400, detail="Error processing request")
 
 @app.post("/wsp-webhook")
 async def post_wsp_webhook(request: Request, response: Response):
     try:
-        logging.info("POST endpoint hit")
-        incoming_message = await request.json()
-        logging.info(f"Incoming Message: {incoming_message}")
-        
         # Handle OPTIONS request (preflight)
         if request.method == "OPTIONS":
             response.headers["Access-Control-Allow-Methods"] = "GET, POST"
@@ -104,27 +147,98 @@ async def post_wsp_webhook(request: Request, response: Response):
             response.headers["Access-Control-Max-Age"] = "3600"
             return Response(status_code=204)
 
-        # Check if the incoming message is a notification
-        is_notif = WhatsAppMessage.is_notification(incoming_message)
-        if not is_notif:
-            message_data = Props.filter_message_data(incoming_message)
-            logging.info("Processing Incoming Message")
-            schedule_chat_manager(chat_manager, db, message_data)
+        raw_body = await request.body()
+
+        # Camino rápido: los callbacks de estado (la mayoría del tráfico) se confirman sin parsear
+        if is_status_only(raw_body):
+            webhook_counters.add(webhook_counters.classify_raw(raw_body))
+            if status_sink:
+                status_sink.submit(raw_body)
+            return JSONResponse(content={"message": "Ok"}, status_code=200)
+
+        try:
+            incoming_message = json.loads(raw_body)
+        except ValueError:
+            webhook_counters.add("invalid")
+            raise
+
+        logger.info("POST endpoint hit")
+        logger.debug("Incoming Message: %s", payload(incoming_message), extra=SAMPLED)
+
+        # Un mismo POST puede traer varios mensajes; sin mensajes es una notificación
+        webhook = WebhookPayload(incoming_message)
+        webhook_counters.add("statuses" if webhook.is_notification else "messages")
+        if webhook.is_notification:
+            logger.debug("Notification received, skipping")
+        if status_sink and webhook.statuses:
+            status_sink.submit(webhook.statuses)
+
+        messages_data = webhook.to_props()
+
+        for message_data in messages_data:
+            # Los reintentos de Meta se descartan aquí, sin leer Firestore ni llamar al LLM
+            if message_dedup.seen(message_data.id):
+                logger.info("Duplicated message %s, skipping", message_data.id)
+                continue
+
+            logger.info("Processing Incoming Message %s", message_data.id)
+            try:
+                ingress_queue.submit(message_data.userPhoneNumber, message_data)
+            except IngressQueueFull as error:
+                message_dedup.forget(message_data.id)
+                logger.warning("Backpressure en /wsp-webhook: %s", error)
+                return JSONResponse(content={"message": "Busy"}, status_code=503)
         
         return JSONResponse(content={"message": "Ok"}, status_code=200)
 
     except Exception as error:
-        logging.debug(f"Error in POST /wsp-webhook: {error}")
+        logger.debug("Error in POST /wsp-webhook: %s", error)
         raise HTTPException(status_code=400, detail="Error processing request")
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return JSONResponse(
+        content={
+            "ingress": ingress_queue.snapshot(),
+            "dedup": message_dedup.snapshot(),
+            "webhook": webhook_counters.to_dict(),
+            "status_sink": status_sink.snapshot() if status_sink else None,
+            "deliveries": delivery_tracker.snapshot() if status_sink else None,
+            "llm_pool": async_llm_pool.snapshot(),
+            "agent_steps": stream_stats.snapshot(),
+            "llm_routing": routing_llm_70b.snapshot(),
+            "prompt_cache": prompt_cache_stats.snapshot(),
+            "tokens": token_counter.snapshot(),
+            "rate_limits": rate_limits.snapshot(),
+            "llm_calls": llm_telemetry.snapshot(),
+            "complexity_routes": complexity_router.snapshot(),
+            "tool_modes": tool_mode_stats.snapshot(),
+            "agent_parsing": parse_stats.snapshot(),
+            "agent_turns": turn_stats.snapshot(),
+            "media": media_stats.snapshot(),
+            "audio_chunking": chunked_transcriber.snapshot(),
+            "transcription_cache": transcription_cache.snapshot(),
+        },
+        status_code=200,
+    )
+
 
 async def startup_event():
-    logging.info("Iniciando el scheduler.")
+    logger.info("Iniciando el scheduler.")
     scheduler.start()
+    restore_email_jobs()
+    await ingress_queue.start()
+    if status_sink:
+        await status_sink.start()
 
 async def shutdown_event():
-    logging.info("Apagando el scheduler.")
+    logger.info("Apagando el scheduler.")
+    await ingress_queue.stop()
+    if status_sink:
+        await status_sink.stop()
+    await async_llm_pool.aclose()
+    llm_telemetry.close()
     scheduler.shutdown()
 
 app.add_event_handler("startup", startup_event)
@@ -0,0 +1,109 @@
+import asyncio
+import weakref
+from urllib.parse import urlparse
+
+import httpx
+from openai import AsyncOpenAI
+
+from src.settings.settings import Config
+
+DEFAULT_PROVIDER = "api.openai.com"
+
+
+def provider_of(base_url: str | None) -> str:
+    """Nombre del proveedor (host del `base_url`) para agrupar conexiones y límites."""
+    return urlparse(base_url).hostname if base_url else DEFAULT_PROVIDER
+
+
+class AsyncLLMPool:
+    """
+    Recursos compartidos por todos los LLMs asíncronos de un event loop:
+
+    - un `httpx.AsyncClient` (pool keep-alive) por `base_url`,
+    - un `AsyncOpenAI` por (`base_url`, `api_key`) montado sobre ese pool,
+    - un semáforo por proveedor que limita las llamadas en vuelo.
+
+    Los clientes y semáforos de asyncio quedan atados al loop que los crea, así que se guardan
+    por loop (un `asyncio.run` distinto obtiene los suyos).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 16,
+        concurrency: dict[str, int] | None = None,
+        max_connections: int = 50,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.concurrency = concurrency or {}
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._by_loop: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _state(self) -> dict:
+        loop = asyncio.get_running_loop()
+        state = self._by_loop.get(loop)
+        if state is None:
+            state = {"http": {}, "clients": {}, "semaphores": {}}
+            self._by_loop[loop] = state
+        return state
+
+    def http_client(self, base_url: str | None) -> httpx.AsyncClient:
+        http = self._state()["http"]
+        if base_url not in http:
+            http[base_url] = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return http[base_url]
+
+    def client(self, api_key: str, base_url: str | None) -> AsyncOpenAI:
+        clients = self._state()["clients"]
+        key = (base_url, api_key)
+        if key not in clients:
+            clients[key] = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=self.http_client(base_url),
+            )
+        return clients[key]
+
+    def semaphore(self, provider: str) -> asyncio.Semaphore:
+        semaphores = self._state()["semaphores"]
+        if provider not in semaphores:
+            semaphores[provider] = asyncio.Semaphore(self.concurrency.get(provider, self.max_concurrency))
+        return semaphores[provider]
+
+    def snapshot(self) -> dict:
+        try:
+            semaphores = self._state()["semaphores"]
+        except RuntimeError:
+            return {}
+        return {
+            provider: {
+                "limit": self.concurrency.get(provider, self.max_concurrency),
+                "available": semaphore._value,
+            }
+            for provider, semaphore in semaphores.items()
+        }
+
+    async def aclose(self):
+        """Cierra los pools del loop actual (llamar al apagar la app)."""
+        loop = asyncio.get_running_loop()
+        state = self._by_loop.pop(loop, None)
+        if state:
+            await asyncio.gather(*(client.aclose() for client in state["http"].values()))
+
+
+async_llm_pool = AsyncLLMPool(
+    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+    concurrency=Config.LLM_CONCURRENCY,
+    max_connections=Config.LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive=Config.LLM_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=Config.LLM_POOL_KEEPALIVE_EXPIRY,
+    timeout=Config.LLM_TIMEOUT_SECONDS,
+)
@@ -1,14 +1,26 @@
+import json
 import logging
 from typing import Any
 from src.components.prompt import ChatTemplate
 from openai import OpenAI
 import time
-import math
 from src.settings.settings import Config
+from src.components.llm_pool import async_llm_pool, provider_of
+from src.components.rate_limit import ProviderRateLimiter, is_rate_limited, rate_limits, retry_after_of
+from src.components.tokens import token_counter
 from abc import ABC, abstractmethod
 from typing import Any
 from typing import Generator
 
+# `audio_transcription_llm` no levanta: devuelve este texto seguido del error
+TRANSCRIPTION_ERROR_PREFIX = "Hubo un error al procesar el audio"
+
+RATE_LIMITED_MESSAGE = "Estoy recibiendo demasiadas consultas en este momento, por favor intenta de nuevo en un minuto."
+RATE_LIMITED_ANSWER = "Action: " + json.dumps(
+    {"action": "final_answer", "action_input": {"answer": RATE_LIMITED_MESSAGE}},
+    ensure_ascii=False,
+) + "<end_action>"
+
 
 class BaseLLM(ABC):
     def __init__(self, api_key=None, base_url=None):
@@ -28,6 +40,9 @@ class BaseLLM(ABC):
         seed: int = None,
         extra_headers: dict[str:Any] = {},
         has_stream=False,
+        stop: list[str] | None = None,
+        tools: list[dict] | None = None,
+        raise_on_error: bool = False,
         **kwargs,
     ) -> Generator[
         tuple[None, None, dict[str, int]]
@@ -111,8 +126,9 @@ class BaseGenericLLM(BaseLLM):
         self, api_key, base_url=None, *, default_model_name, default_headers=None
     ) -> None:
         super().__init__(api_key, base_url)
-        self.llm_client = OpenAI(api_key=api_key, base_url=base_url)
+        self.llm_client = OpenAI(api_key=api_key, base_url=base_url, timeout=Config.LLM_TIMEOUT_SECONDS)
         self.default_model_name = default_model_name
+        self.provider = provider_of(base_url)
         self.default_headers = default_headers or None
 
     def chat_llm(
@@ -126,10 +142,134 @@ class BaseGenericLLM(BaseLLM):
         seed: int = None,
         extra_headers: dict[str:Any] = {"x-use-cache": "0"},
         has_stream=False,
+        stop: list[str] | None = None,
+        tools: list[dict] | None = None,
+        raise_on_error: bool = False,
+        **kwargs,
+    ):
+        """
+        Genera tuplas `(content, messages_list, usage)`. Con `has_stream` se puede cortar
+        antes de tiempo con `.close()`: se cierra la respuesta HTTP y el proveedor deja de generar.
+        Con `raise_on_error` los errores del proveedor se propagan en vez de devolverse como texto.
+        Con `tools` (esquemas de function calling, sin streaming) el usage trae `tool_calls`.
+        """
+        messages_list = self._messages_list(messages)
+        limiter = rate_limits.get(self.provider, model_name or self.default_model_name)
+        reserved = self._reserved_tokens(messages_list, max_tokens)
+        start_time = time.time()
+
+        try:
+            response = self._create_with_limits(
+                limiter,
+                reserved,
+                self._completion_kwargs(
+                    model_name, messages_list, max_tokens, temperature, top_p, seed, extra_headers, has_stream, stop, tools
+                ),
+            )
+            if has_stream:
+                try:
+                    for chunk in response:
+                        yield self._settled(limiter, reserved, self._stream_chunk_output(chunk))
+                finally:
+                    response.close()
+            else:
+                yield self._settled(limiter, reserved, self._response_output(response, messages_list))
+
+        except Exception as e:
+            if raise_on_error:
+                raise
+            yield self._error_output(e, messages_list)
+
+        yield None, messages_list, self._time_usage(start_time, model_name)
+
+    async def achat_llm(
+        self,
+        *,
+        model_name: str | None = None,
+        messages: ChatTemplate,
+        max_tokens=700,
+        temperature=0.1,
+        top_p: float = None,
+        seed: int = None,
+        extra_headers: dict[str:Any] = {"x-use-cache": "0"},
+        has_stream=False,
+        stop: list[str] | None = None,
+        tools: list[dict] | None = None,
+        raise_on_error: bool = False,
         **kwargs,
     ):
-        stream_options = {"include_usage": True} if has_stream else None
-        messages_list = [
+        """
+        Versión asíncrona de `chat_llm` (mismas tuplas `(content, messages_list, usage)`).
+        Usa el pool keep-alive compartido por `base_url` y espera turno en el semáforo del
+        proveedor, así un worker puede tener varias llamadas en vuelo sin bloquear un hilo.
+        """
+        messages_list = self._messages_list(messages)
+        client = async_llm_pool.client(self.api_key, self.base_url)
+        limiter = rate_limits.get(self.provider, model_name or self.default_model_name)
+        reserved = self._reserved_tokens(messages_list, max_tokens)
+
+        async with async_llm_pool.semaphore(self.provider):
+            start_time = time.time()
+            try:
+                response = await self._acreate_with_limits(
+                    client,
+                    limiter,
+                    reserved,
+                    self._completion_kwargs(
+                        model_name, messages_list, max_tokens, temperature, top_p, seed, extra_headers, has_stream, stop, tools
+                    ),
+                )
+                if has_stream:
+                    try:
+                        async for chunk in response:
+                            yield self._settled(limiter, reserved, self._stream_chunk_output(chunk))
+                    finally:
+                        await response.close()
+                else:
+                    yield self._settled(limiter, reserved, self._response_output(response, messages_list))
+
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                yield self._error_output(e, messages_list)
+
+            yield None, messages_list, self._time_usage(start_time, model_name)
+
+    def _create_with_limits(self, limiter: ProviderRateLimiter, reserved: int, kwargs: dict):
+        """Espera turno en el limitador y, ante un 429, respeta el `retry-after` y reintenta."""
+        for attempt in range(Config.LLM_RATE_LIMIT_RETRIES + 1):
+            limiter.acquire(reserved)
+            try:
+                return self.llm_client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == Config.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                limiter.rate_limited(retry_after_of(e), Config.LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS)
+
+    async def _acreate_with_limits(self, client, limiter: ProviderRateLimiter, reserved: int, kwargs: dict):
+        for attempt in range(Config.LLM_RATE_LIMIT_RETRIES + 1):
+            await limiter.aacquire(reserved)
+            try:
+                return await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == Config.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                limiter.rate_limited(retry_after_of(e), Config.LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS)
+
+    @staticmethod
+    def _reserved_tokens(messages_list: list[dict], max_tokens: int | None) -> int:
+        """Estimación para el límite de tokens por minuto: el prompt más el máximo de la respuesta."""
+        return token_counter.count_chat(messages_list) + (max_tokens or 0)
+
+    @staticmethod
+    def _settled(limiter: ProviderRateLimiter, reserved: int, output: tuple) -> tuple:
+        """Corrige la reserva del limitador cuando la salida trae el `usage` real."""
+        limiter.settle(reserved, output[2])
+        return output
+
+    @staticmethod
+    def _messages_list(messages: ChatTemplate) -> list[dict]:
+        return [
             {
                 "role": message.role if message.role != "tool" else "user",
                 "content": message.content,
@@ -137,102 +277,139 @@ class BaseGenericLLM(BaseLLM):
             for message in messages.messages
         ]
 
-        start_time = time.time()
+    def _completion_kwargs(
+        self, model_name, messages_list, max_tokens, temperature, top_p, seed, extra_headers, has_stream, stop=None, tools=None
+    ) -> dict:
+        kwargs = {
+            "model": model_name or self.default_model_name,
+            "messages": messages_list,
+            "temperature": temperature,
+            "top_p": top_p,
+            "seed": seed,
+            "max_tokens": max_tokens,
+            "extra_headers": extra_headers,
+            "stream": has_stream,
+            "stream_options": {"include_usage": True} if has_stream else None,
+        }
+        if stop:
+            kwargs["stop"] = stop
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        return kwargs
 
-        try:
-            response = self.llm_client.chat.completions.create(
-                model=model_name or self.default_model_name,
-                messages=messages_list,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_tokens=max_tokens,
-                extra_headers=extra_headers,
-                stream=has_stream,
-                stream_options=stream_options,
-            )
-            if has_stream:
-                for chunk in response:
-                    # HF + Openai
-                    has_usage = chunk.usage is not None
-                    has_choices = bool(chunk.choices)
-                    if has_usage or not has_choices:
-                        u = {
-                            "input_tokens": chunk.usage.prompt_tokens,
-                            "output_tokens": chunk.usage.completion_tokens,
-                        }
-                        yield None, None, u
-                    # groq
-                    elif hasattr(chunk, "x_groq"):
-                        usage = chunk.x_groq.get("usage", {})
-                        if usage:
-                            u = {
-                                "input_tokens": usage.get("prompt_tokens", 0),
-                                "output_tokens": usage.get("completion_tokens", 0),
-                            }
-                            yield None, None, u
-                    else:
-                        content = chunk.choices[0].delta.content if has_choices else ""
-                        yield content, None, None
-            else:
-                content = response.choices[0].message.content
-                usage = {
-                    "input_tokens": response.usage.prompt_tokens,
-                    "output_tokens": response.usage.completion_tokens,
+    @staticmethod
+    def _stream_chunk_output(chunk) -> tuple:
+        # HF + Openai
+        has_usage = chunk.usage is not None
+        has_choices = bool(chunk.choices)
+        if has_usage or not has_choices:
+            u = {
+                "input_tokens": chunk.usage.prompt_tokens,
+                "output_tokens": chunk.usage.completion_tokens,
+                "cached_tokens": BaseGenericLLM._cached_tokens(chunk.usage),
+            }
+            return None, None, u
+        # groq
+        if hasattr(chunk, "x_groq"):
+            usage = chunk.x_groq.get("usage", {})
+            if usage:
+                u = {
+                    "input_tokens": usage.get("prompt_tokens", 0),
+                    "output_tokens": usage.get("completion_tokens", 0),
+                    "cached_tokens": BaseGenericLLM._cached_tokens(usage),
                 }
+                return None, None, u
+            return None, None, None
+        content = chunk.choices[0].delta.content if has_choices else ""
+        return content, None, None
 
-                yield content, messages_list, usage
+    @staticmethod
+    def _response_output(response, messages_list: list[dict]) -> tuple:
+        message = response.choices[0].message
+        usage = {
+            "input_tokens": response.usage.prompt_tokens,
+            "output_tokens": response.usage.completion_tokens,
+            "cached_tokens": BaseGenericLLM._cached_tokens(response.usage),
+        }
+        # Con `tools`, las llamadas a herramientas viajan junto al usage (como la info de ruteo)
+        if getattr(message, "tool_calls", None):
+            usage["tool_calls"] = [
+                {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                for call in message.tool_calls
+            ]
+        return message.content, messages_list, usage
 
-        except Exception as e:
-            logging.info(f"Error en la solicitud: {e}")
-            content = f"<Answer>Error en la solicitud: {e}</Answer>"
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """
+        Tokens del prompt servidos desde la caché del proveedor. OpenAI y Groq los reportan en
+        `prompt_tokens_details.cached_tokens`; otros (p. ej. DeepSeek) en `prompt_cache_hit_tokens`.
+        """
+        get = usage.get if isinstance(usage, dict) else lambda key, default=None: getattr(usage, key, default)
+        details = get("prompt_tokens_details")
+        if details:
+            cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+            if cached:
+                return cached
+        return get("prompt_cache_hit_tokens") or 0
 
-            usage = {
-                "input_tokens": BaseGenericLLM._get_tokens_quantity(messages_list),
-                "output_tokens": 0,
-            }
-            yield content, None, usage
-
-        finally:
-            t2 = time.time()
-            response_time = t2 - start_time
-            time_usage = {
-                "response_time": response_time,
-                "model": model_name or self.default_model_name,
-            }
+    @staticmethod
+    def _error_output(e: Exception, messages_list: list[dict]) -> tuple:
+        logging.info(f"Error en la solicitud: {e}")
+        if is_rate_limited(e):
+            # Respuesta final válida para el agente en vez de un texto que no puede parsear
+            content = RATE_LIMITED_ANSWER
+        else:
+            content = f"<Answer>Error en la solicitud: {e}</Answer>"
 
-            yield None, messages_list, time_usage
+        usage = {
+            "input_tokens": token_counter.count_chat(messages_list),
+            "output_tokens": 0,
+        }
+        return content, None, usage
 
-    def audio_transcription_llm(self, file_path: str, temperature: float = 0.1):
+    def _time_usage(self, start_time: float, model_name: str | None) -> dict:
+        return {
+            "response_time": time.time() - start_time,
+            "model": model_name or self.default_model_name,
+        }
 
+    def audio_transcription_llm(
+        self,
+        file_path: str | None = None,
+        temperature: float = 0.1,
+        *,
+        audio: bytes | None = None,
+        filename: str = "audio.ogg",
+    ):
+        """Transcribe un archivo (`file_path`) o un audio ya en memoria (`audio`, con `filename` para el formato)."""
+        limiter = rate_limits.get(self.provider, self.default_model_name)
         try:
-            with open(file_path, "rb") as audio_file:
-                response = self.llm_client.audio.transcriptions.create(
-                    model=self.default_model_name,
-                    file=audio_file,
-                    language=Config.LANGUAGE,
-                    response_format="json",
-                    temperature=temperature,
-                    extra_headers={"x-use-cache": "0"},
-                )
+            limiter.acquire(0)
+            kwargs = {
+                "model": self.default_model_name,
+                "language": Config.LANGUAGE,
+                "response_format": "json",
+                "temperature": temperature,
+                "extra_headers": {"x-use-cache": "0"},
+            }
+            if audio is not None:
+                response = self.llm_client.audio.transcriptions.create(file=(filename, audio), **kwargs)
+            else:
+                with open(file_path, "rb") as audio_file:
+                    response = self.llm_client.audio.transcriptions.create(file=audio_file, **kwargs)
 
             return response.text
 
         except Exception as e:
+            if is_rate_limited(e):
+                limiter.rate_limited(retry_after_of(e), Config.LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS)
             logging.error(f"Error en la solicitud: {e}")
-            message = f"Hubo un error al procesar el audio: {str(e)}"
+            message = f"{TRANSCRIPTION_ERROR_PREFIX}: {str(e)}"
 
             return message
 
-    @staticmethod
-    def _get_tokens_quantity(messages_list: list[dict]):
-        text = ""
-        for item in messages_list:
-            text += f"""{item["role"]}:\n{item["content"]}\n\n"""
-
-        w = [char for char in text]
-        return math.ceil(len(w) / 4)
-
 
 GROQ_API_KEY = Config.GROQ_API_KEY
 HF_API_KEY = Config.HF_TOKEN
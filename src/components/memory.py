@@ -4,15 +4,11 @@ import src.firebase.types as usr_collection_types
 import logging
 from src.firebase.users_manager import UserManager
 from datetime import datetime, timezone
-from src.agent.prompt.prompt import get_agent_prompt_2, get_task_prompt
+from src.agent.prompt.assembly import prompt_assembler
 from src.components.tool import BaseTool
 
-now = datetime.now().strftime(
-    "Today's date is %B %d, %Y, and the current time is %H:%M:%S."
-)
-
-user_message_mask = """{now}
-User current message is: 
+# Sin fecha ni hora: el mensaje queda igual byte a byte en el historial (la hora va al final del prompt)
+user_message_mask = """User current message is: 
 {user_message}
 Interact with him in spanish."""
 
@@ -29,33 +25,35 @@ class Memory:
         self.tools = tools
         self.user_manager = user_manager
 
-        self.update_if_new_chat()
+        self.drop_stored_system_prompt()
 
-    def update_if_new_chat(self):
-        if not self.user_manager.user_document.messages:
-            system_message_ = usr_collection_types.MessageDataType(
-                sender="system",
-                content=get_task_prompt(tools=self.tools),
-                role="system",
-                created_at=datetime.now(
-                    timezone.utc
-                ).isoformat(),
-                waid="system",
-            )
-            self.user_manager.user_document.messages.append(system_message_)
+    def drop_stored_system_prompt(self):
+        """
+        El system prompt ya no se guarda en el documento: se arma desde el código en cada paso
+        (`prompt_assembler`). Los chats viejos lo pierden al guardarse.
+        """
+        messages = self.user_manager.user_document.messages
+        if any(msg.role == "system" for msg in messages):
+            self.user_manager.user_document.messages = [msg for msg in messages if msg.role != "system"]
 
     def add_user_message(self, message, waid):
+        self.add_user_messages([(message, waid)])
+
+    def add_user_messages(self, messages: list[tuple[str, str]]):
+        """Agrega varios mensajes seguidos del usuario como un solo turno. `messages` es una lista de (contenido, waid)."""
         new_message = usr_collection_types.MessageDataType(
             sender=self.user_manager.user_phone,
-            content=user_message_mask.format(now=now, user_message=message),
+            content=user_message_mask.format(
+                user_message="\n".join(message for message, _ in messages)
+            ),
             role="user",
             created_at=datetime.now(
                 timezone.utc
             ).isoformat(),
-            waid=waid,
+            waid=messages[-1][1],
         )
         self.user_manager.user_document.messages.append(new_message)
-        self.user_manager.user_document.current_waids.append(waid)
+        self.user_manager.user_document.current_waids.extend(waid for _, waid in messages)
         self.user_manager.user_document.last_message = new_message
 
     def add_assistant_message(self, message, waid):
@@ -85,6 +83,17 @@ class Memory:
         self.user_manager.user_document.messages.append(new_message)
         self.user_manager.user_document.last_message = new_message
 
-    def get_messages_chat_template(self) -> ChatTemplate:
-        messages = [msg.get_llm_legible_message() for msg in self.user_manager.user_document.messages]
-        return ChatTemplate(messages=messages)
+    def get_messages_chat_template(
+        self, model_name: str | None = None, reserve_tokens: int = 0, native: bool = False
+    ) -> ChatTemplate:
+        """
+        Con `model_name`, recorta el historial más viejo para que entre en el contexto del modelo dejando
+        `reserve_tokens` para la respuesta. Con `native`, usa el system prompt para function calling.
+        """
+        return prompt_assembler.assemble(
+            self.tools,
+            self.user_manager.user_document.messages,
+            model_name=model_name,
+            reserve_tokens=reserve_tokens,
+            native=native,
+        )
@@ -15,8 +15,11 @@ class ChatTemplate:
         self,
         *,
         messages: list[ChatMessage],
+        prefix_version: str | None = None,
     ):
         self.messages: list[ChatMessage] = messages
+        # Versión del prefijo estable (system prompt) con que se armó, para las métricas de caché
+        self.prefix_version: str | None = prefix_version
         
     def get_messages_dict(self):
         return [item.to_dict() for item in self.messages]
\ No newline at end of file
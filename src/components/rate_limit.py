@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+from src.settings.settings import Config
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+# Formato de Groq en `x-ratelimit-reset-*`: "7.66s", "2m59.56s", "250ms"
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+
+class RateLimitWaitTooLong(Exception):
+    """El limitador local tendría que esperar más que el máximo configurado; mejor fallar (o pasar a otro proveedor)."""
+
+    status_code = 429
+
+    def __init__(self, key: str, wait: float):
+        super().__init__(f"Límite de {key}: habría que esperar {wait:.1f}s")
+        self.retry_after = wait
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _duration_seconds(value: str) -> float | None:
+    match = _DURATION.match(value.strip())
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(group) if group else 0.0 for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+
+def retry_after_of(error: Exception) -> float | None:
+    """
+    Segundos a esperar según la respuesta 429: `retry-after-ms`, `retry-after` (segundos o fecha
+    HTTP) o, en Groq, el `x-ratelimit-reset-*` del balde agotado (`x-ratelimit-remaining-*` en 0).
+    El de requests es la ventana diaria, así que sin saber cuál se agotó no se usa ninguno.
+    """
+    if isinstance(error, RateLimitWaitTooLong):
+        return error.retry_after
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        value = headers["retry-after"]
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    resets = []
+    for bucket in ("requests", "tokens"):
+        try:
+            exhausted = float(headers.get(f"x-ratelimit-remaining-{bucket}")) <= 0
+        except (TypeError, ValueError):
+            continue
+        if exhausted and headers.get(f"x-ratelimit-reset-{bucket}"):
+            resets.append(_duration_seconds(headers[f"x-ratelimit-reset-{bucket}"]))
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+class TokenBucket:
+    """
+    Balde de `capacity` unidades que se recarga a `capacity` por minuto. `reserve` descuenta
+    aunque no alcance (el saldo queda negativo) y devuelve cuánto esperar: así las llamadas
+    concurrentes quedan en fila, cada una detrás de la anterior.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.per_second = capacity / 60
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.available -= min(amount, self.capacity)
+        return max(0.0, -self.available / self.per_second)
+
+    def adjust(self, amount: float, now: float):
+        """Corrige una reserva (positivo: se consumió más de lo reservado; negativo: devuelve)."""
+        self._refill(now)
+        self.available = min(self.capacity, self.available - amount)
+
+
+class ProviderRateLimiter:
+    """
+    Límites de requests y tokens por minuto de un proveedor (o de un modelo de un proveedor).
+
+    Antes de cada llamada se reserva un request y una estimación de tokens (prompt + `max_tokens`);
+    cuando llega el `usage` real se corrige la reserva. Si el proveedor responde 429, se pausa
+    hasta su `retry-after`.
+    """
+
+    def __init__(self, key: str, *, rpm: int | None = None, tpm: int | None = None, max_wait_seconds: float = 30.0):
+        self.key = key
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_wait_seconds = max_wait_seconds
+        self.blocked_until = 0.0
+        self.waits = RollingWindow()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self.blocked_until - now,
+                self.requests.reserve(1, now) if self.requests else 0.0,
+                self.tokens.reserve(tokens, now) if self.tokens else 0.0,
+            )
+            if wait > self.max_wait_seconds:
+                # No se hace la llamada: se devuelve lo reservado
+                if self.requests:
+                    self.requests.adjust(-1, now)
+                if self.tokens:
+                    self.tokens.adjust(-min(tokens, self.tokens.capacity), now)
+                self.counts["rejected"] += 1
+                raise RateLimitWaitTooLong(self.key, wait)
+
+            self.counts["calls"] += 1
+            self.counts["delayed"] += int(wait > 0)
+        self.waits.add(wait)
+        if wait > 0:
+            logger.info("%s: esperando %.2fs por límite de uso", self.key, wait)
+        return wait
+
+    def acquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, reserved: int, usage: dict | None):
+        """Ajusta el balde de tokens con el `usage` real de la llamada."""
+        if not self.tokens or not usage or "input_tokens" not in usage:
+            return
+        used = (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+        with self._lock:
+            self.tokens.adjust(used - min(reserved, self.tokens.capacity), time.monotonic())
+
+    def rate_limited(self, retry_after: float | None, default_backoff: float = 5.0):
+        """El proveedor respondió 429: nadie más sale hacia él hasta que pase `retry_after`."""
+        retry_after = default_backoff if retry_after is None else retry_after
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.counts["rate_limited"] += 1
+        logger.warning("%s: 429 del proveedor, pausa de %.2fs", self.key, retry_after)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "counts": dict(self.counts),
+                "wait_seconds": self.waits.summary(),
+                "blocked_for": max(0.0, self.blocked_until - now),
+                "requests_available": self.requests.available if self.requests else None,
+                "tokens_available": self.tokens.available if self.tokens else None,
+            }
+
+
+class RateLimits:
+    """
+    Limitadores por proveedor (host del `base_url`). Los límites se configuran por `host` o por
+    `host/modelo` (Groq los aplica por modelo); sin límites configurados solo se respeta el `retry-after`.
+    """
+
+    def __init__(
+        self,
+        rpm: dict[str, int] | None = None,
+        tpm: dict[str, int] | None = None,
+        *,
+        max_wait_seconds: float = 30.0,
+    ):
+        self.rpm = rpm or {}
+        self.tpm = tpm or {}
+        self.max_wait_seconds = max_wait_seconds
+        self._limiters: dict[str, ProviderRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, provider: str, model_name: str | None) -> str:
+        model_key = f"{provider}/{model_name}"
+        return model_key if model_key in self.rpm or model_key in self.tpm else provider
+
+    def get(self, provider: str, model_name: str | None = None) -> ProviderRateLimiter:
+        key = self._key(provider, model_name)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(
+                    key,
+                    ProviderRateLimiter(
+                        key, rpm=self.rpm.get(key), tpm=self.tpm.get(key), max_wait_seconds=self.max_wait_seconds
+                    ),
+                )
+        return limiter
+
+    def share(self, processes: int):
+        """
+        Para un proceso de un pool de `processes`: cada uno se queda con su parte de los límites
+        (los baldes no se comparten entre procesos), así el total no pasa de lo configurado.
+        """
+        processes = max(1, processes)
+        with self._lock:
+            self.rpm = {key: max(1, value // processes) for key, value in self.rpm.items()}
+            self.tpm = {key: max(1, value // processes) for key, value in self.tpm.items()}
+            self._limiters.clear()
+
+    def snapshot(self) -> dict:
+        return {key: limiter.snapshot() for key, limiter in list(self._limiters.items())}
+
+
+rate_limits = RateLimits(
+    Config.LLM_RPM,
+    Config.LLM_TPM,
+    max_wait_seconds=Config.LLM_RATE_LIMIT_MAX_WAIT_SECONDS,
+)
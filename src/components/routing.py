@@ -0,0 +1,459 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any
+
+from src.components.llms import GROQ_API_KEY, BaseGenericLLM, BaseLLM, GenericLLM, default_llms
+from src.components.prompt import ChatTemplate
+from src.settings.settings import Config
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Breaker por proveedor a partir de los últimos `window` resultados. Se abre si la tasa de
+    errores o de respuestas lentas supera el umbral; tras `cooldown_seconds` deja pasar una
+    sola llamada de prueba (half-open) que lo cierra o lo vuelve a abrir.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 50,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_seconds: float | None = None,
+        slow_rate: float = 0.5,
+        cooldown_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.opened = 0
+        self._outcomes: deque[tuple[bool, float]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = "half_open"
+                self._probing = False
+            # Si la prueba nunca se llegó a usar (p. ej. era el backup y no hizo falta), se da otra
+            if self.state == "half_open" and (
+                not self._probing or time.monotonic() - self._probe_at >= self.cooldown_seconds
+            ):
+                self._probing = True
+                self._probe_at = time.monotonic()
+                return True
+            return False
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            self._outcomes.append((ok, latency))
+            if self.state == "half_open":
+                if ok:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            if self.state == "closed" and len(self._outcomes) >= self.min_calls:
+                errors = sum(not ok for ok, _ in self._outcomes) / len(self._outcomes)
+                slow = (
+                    sum(latency > self.slow_seconds for _, latency in self._outcomes) / len(self._outcomes)
+                    if self.slow_seconds
+                    else 0.0
+                )
+                if errors >= self.error_rate or slow >= self.slow_rate:
+                    logger.warning(
+                        "Circuit breaker abierto para %s (errores %.0f%%, lentas %.0f%%)",
+                        self.name, errors * 100, slow * 100,
+                    )
+                    self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls = len(self._outcomes)
+            errors = sum(not ok for ok, _ in self._outcomes)
+        return {"state": self.state, "opened": self.opened, "window_calls": calls, "window_errors": errors}
+
+
+class RoutingLLM(BaseLLM):
+    """
+    LLM que reparte cada llamada entre varios proveedores equivalentes (el primero es el
+    principal). Si el principal no respondió cuando pasa su percentil `hedge_percentile` de
+    latencia, se lanza la misma petición al siguiente proveedor y gana la primera respuesta
+    correcta; la otra se cancela (en el camino síncrono el hilo no se puede interrumpir: su
+    resultado se descarta). Si un proveedor falla se pasa al siguiente, y los proveedores con
+    el circuit breaker abierto se saltan.
+
+    Cada proveedor usa su propio modelo por defecto: el `model_name` que llegue se ignora.
+    El streaming no se duplica: solo hace failover si el proveedor falla antes del primer token.
+    """
+
+    def __init__(
+        self,
+        providers: list[BaseGenericLLM],
+        *,
+        hedge_percentile: float = 95,
+        hedge_min_delay: float = 1.0,
+        hedge_max_delay: float = 8.0,
+        hedge_min_samples: int = 20,
+        breaker_options: dict[str, Any] | None = None,
+        max_threads: int = 16,
+    ):
+        super().__init__()
+        self.providers = providers
+        self.names = [f"{p.provider}:{p.default_model_name}" for p in providers]
+        self.default_model_name = providers[0].default_model_name
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers = {name: CircuitBreaker(name, **(breaker_options or {})) for name in self.names}
+        self.latency = {name: RollingWindow() for name in self.names}
+        self.counts = Counter()
+        self.wins = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="llm-hedge")
+
+    def _candidates(self) -> list[int]:
+        allowed = [i for i, name in enumerate(self.names) if self.breakers[name].allow()]
+        if not allowed:
+            # Todos abiertos: mejor intentar en orden que no responder
+            self.counts["all_open"] += 1
+            return list(range(len(self.providers)))
+        return allowed
+
+    def _hedge_delay(self, index: int) -> float:
+        window = self.latency[self.names[index]]
+        if window.count < self.hedge_min_samples:
+            return self.hedge_max_delay
+        delay = window.percentile(self.hedge_percentile)
+        return min(max(delay, self.hedge_min_delay), self.hedge_max_delay)
+
+    def _record(self, index: int, ok: bool, latency: float):
+        name = self.names[index]
+        self.breakers[name].record(ok, latency)
+        if ok:
+            self.latency[name].add(latency)
+        else:
+            self.counts[f"errors:{name}"] += 1
+
+    def _call(self, index: int, kwargs: dict) -> list[tuple]:
+        start = time.perf_counter()
+        try:
+            output = list(self.providers[index].chat_llm(**kwargs, raise_on_error=True))
+        except Exception:
+            self._record(index, False, time.perf_counter() - start)
+            raise
+        self._record(index, True, time.perf_counter() - start)
+        return output
+
+    async def _acall(self, index: int, kwargs: dict) -> list[tuple]:
+        start = time.perf_counter()
+        try:
+            output = [item async for item in self.providers[index].achat_llm(**kwargs, raise_on_error=True)]
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(index, False, time.perf_counter() - start)
+            raise
+        self._record(index, True, time.perf_counter() - start)
+        return output
+
+    def _route_info(self, index: int, hedged: bool) -> dict:
+        name = self.names[index]
+        self.counts["calls"] += 1
+        self.wins[name] += 1
+        if index != 0:
+            self.counts["served_by_backup"] += 1
+        return {"provider": name, "hedged": hedged}
+
+    def _hedged(self, kwargs: dict) -> tuple[list[tuple], dict]:
+        candidates = self._candidates()
+        futures = {}
+        launched = 0
+        hedged = False
+        last_error: Exception | None = None
+
+        def launch():
+            nonlocal launched
+            index = candidates[launched]
+            launched += 1
+            futures[self._executor.submit(self._call, index, kwargs)] = index
+
+        launch()
+        hedge_delay = self._hedge_delay(candidates[0])
+        while futures:
+            can_hedge = not hedged and launched < len(candidates)
+            done, _ = wait(futures, timeout=hedge_delay if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                self.counts["hedges"] += 1
+                launch()
+                continue
+
+            for future in done:
+                index = futures.pop(future)
+                try:
+                    output = future.result()
+                except Exception as error:
+                    last_error = error
+                    continue
+                for loser in futures:
+                    loser.cancel()
+                return output, self._route_info(index, hedged)
+
+            if not futures and launched < len(candidates):
+                self.counts["failovers"] += 1
+                launch()
+
+        raise last_error
+
+    async def _ahedged(self, kwargs: dict) -> tuple[list[tuple], dict]:
+        candidates = self._candidates()
+        tasks = {}
+        launched = 0
+        hedged = False
+        last_error: Exception | None = None
+
+        def launch():
+            nonlocal launched
+            index = candidates[launched]
+            launched += 1
+            tasks[asyncio.create_task(self._acall(index, kwargs))] = index
+
+        launch()
+        hedge_delay = self._hedge_delay(candidates[0])
+        try:
+            while tasks:
+                can_hedge = not hedged and launched < len(candidates)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    self.counts["hedges"] += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    index = tasks.pop(task)
+                    try:
+                        output = task.result()
+                    except Exception as error:
+                        last_error = error
+                        continue
+                    return output, self._route_info(index, hedged)
+
+                if not tasks and launched < len(candidates):
+                    self.counts["failovers"] += 1
+                    launch()
+
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def chat_llm(
+        self,
+        *,
+        model_name: str | None = None,
+        messages: ChatTemplate | None = None,
+        max_tokens=700,
+        temperature: float = 0.1,
+        top_p: float = None,
+        seed: int = None,
+        extra_headers: dict[str:Any] = {"x-use-cache": "0"},
+        has_stream=False,
+        stop: list[str] | None = None,
+        tools: list[dict] | None = None,
+        raise_on_error: bool = False,
+        **kwargs,
+    ):
+        call_kwargs = dict(
+            messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p,
+            seed=seed, extra_headers=extra_headers, has_stream=has_stream, stop=stop, tools=tools,
+        )
+        if has_stream:
+            yield from self._stream(call_kwargs, raise_on_error)
+            return
+
+        try:
+            output, route = self._hedged(call_kwargs)
+        except Exception as e:
+            self.counts["failed"] += 1
+            if raise_on_error:
+                raise
+            messages_list = BaseGenericLLM._messages_list(messages)
+            yield BaseGenericLLM._error_output(e, messages_list)
+            yield None, messages_list, {"model": self.default_model_name}
+            return
+
+        yield from output
+        yield None, None, route
+
+    async def achat_llm(
+        self,
+        *,
+        model_name: str | None = None,
+        messages: ChatTemplate | None = None,
+        max_tokens=700,
+        temperature: float = 0.1,
+        top_p: float = None,
+        seed: int = None,
+        extra_headers: dict[str:Any] = {"x-use-cache": "0"},
+        has_stream=False,
+        stop: list[str] | None = None,
+        tools: list[dict] | None = None,
+        raise_on_error: bool = False,
+        **kwargs,
+    ):
+        call_kwargs = dict(
+            messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p,
+            seed=seed, extra_headers=extra_headers, has_stream=has_stream, stop=stop, tools=tools,
+        )
+        if has_stream:
+            async for item in self._astream(call_kwargs, raise_on_error):
+                yield item
+            return
+
+        try:
+            output, route = await self._ahedged(call_kwargs)
+        except Exception as e:
+            self.counts["failed"] += 1
+            if raise_on_error:
+                raise
+            messages_list = BaseGenericLLM._messages_list(messages)
+            yield BaseGenericLLM._error_output(e, messages_list)
+            yield None, messages_list, {"model": self.default_model_name}
+            return
+
+        for item in output:
+            yield item
+        yield None, None, route
+
+    def _stream(self, call_kwargs: dict, raise_on_error: bool):
+        last_error: Exception | None = None
+        for position, index in enumerate(self._candidates()):
+            start = time.perf_counter()
+            started = False
+            generation = self.providers[index].chat_llm(**call_kwargs, raise_on_error=True)
+            try:
+                for item in generation:
+                    started = started or bool(item[0])
+                    yield item
+            except GeneratorExit:
+                # El consumidor cortó el stream (p. ej. acción completa): la llamada fue buena
+                self._record(index, True, time.perf_counter() - start)
+                self._route_info(index, False)
+                raise
+            except Exception as error:
+                self._record(index, False, time.perf_counter() - start)
+                last_error = error
+                if started:
+                    break
+                if position:
+                    self.counts["failovers"] += 1
+                continue
+            finally:
+                generation.close()
+            self._record(index, True, time.perf_counter() - start)
+            yield None, None, self._route_info(index, False)
+            return
+
+        self.counts["failed"] += 1
+        if raise_on_error:
+            raise last_error
+        messages_list = BaseGenericLLM._messages_list(call_kwargs["messages"])
+        yield BaseGenericLLM._error_output(last_error, messages_list)
+
+    async def _astream(self, call_kwargs: dict, raise_on_error: bool):
+        last_error: Exception | None = None
+        for position, index in enumerate(self._candidates()):
+            start = time.perf_counter()
+            started = False
+            generation = self.providers[index].achat_llm(**call_kwargs, raise_on_error=True)
+            try:
+                async for item in generation:
+                    started = started or bool(item[0])
+                    yield item
+            except GeneratorExit:
+                # El consumidor cortó el stream (p. ej. acción completa): la llamada fue buena
+                self._record(index, True, time.perf_counter() - start)
+                self._route_info(index, False)
+                raise
+            except Exception as error:
+                self._record(index, False, time.perf_counter() - start)
+                last_error = error
+                if started:
+                    break
+                if position:
+                    self.counts["failovers"] += 1
+                continue
+            finally:
+                await generation.aclose()
+            self._record(index, True, time.perf_counter() - start)
+            yield None, None, self._route_info(index, False)
+            return
+
+        self.counts["failed"] += 1
+        if raise_on_error:
+            raise last_error
+        messages_list = BaseGenericLLM._messages_list(call_kwargs["messages"])
+        yield BaseGenericLLM._error_output(last_error, messages_list)
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "wins": dict(self.wins),
+            "providers": {
+                name: {
+                    "breaker": self.breakers[name].snapshot(),
+                    "latency": self.latency[name].summary(),
+                    "hedge_delay": self._hedge_delay(i),
+                }
+                for i, name in enumerate(self.names)
+            },
+        }
+
+
+routing_llm_70b = RoutingLLM(
+    [
+        default_llms["from_HF_llama3_3_70b_instruct"],
+        GenericLLM.from_groq_llama3_3_70b(GROQ_API_KEY),
+    ],
+    hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
+    hedge_min_delay=Config.LLM_HEDGE_MIN_DELAY_SECONDS,
+    hedge_max_delay=Config.LLM_HEDGE_MAX_DELAY_SECONDS,
+    hedge_min_samples=Config.LLM_HEDGE_MIN_SAMPLES,
+    breaker_options={
+        "window": Config.LLM_BREAKER_WINDOW,
+        "min_calls": Config.LLM_BREAKER_MIN_CALLS,
+        "error_rate": Config.LLM_BREAKER_ERROR_RATE,
+        "slow_seconds": Config.LLM_BREAKER_SLOW_SECONDS,
+        "cooldown_seconds": Config.LLM_BREAKER_COOLDOWN_SECONDS,
+    },
+    max_threads=Config.LLM_HEDGE_THREADS,
+)
@@ -0,0 +1,143 @@
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from typing import Iterable, Protocol
+
+from src.settings.settings import Config
+from src.utils.cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+DEFAULT_FAMILY = "default"
+
+# Tokens que agrega la plantilla de chat por mensaje (cabecera con el rol y fin de turno)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class _Message(Protocol):
+    role: str
+    content: str
+
+
+def family_of(model_name: str | None) -> str:
+    """Familia de tokenizer de un modelo (todos los Llama 3.x comparten el mismo)."""
+    name = (model_name or "").lower()
+    if "llama-3" in name or "llama3" in name:
+        return "llama3"
+    if "whisper" in name:
+        return "whisper"
+    return DEFAULT_FAMILY
+
+
+class TokenCounter:
+    """
+    Cuenta tokens con el tokenizer real de cada familia de modelos, cargado desde un archivo
+    local (`tokenizer.json`, sin red), o con `len / 4` si no hay tokenizer disponible.
+
+    Los conteos de mensajes se memorizan: en el propio objeto (sirve entre pasos del mismo
+    turno) y en un LRU por contenido (sirve entre turnos, cuando el historial se vuelve a leer
+    de Firestore), así cada turno solo tokeniza los mensajes nuevos.
+    """
+
+    def __init__(
+        self,
+        tokenizer_paths: dict[str, str] | None = None,
+        *,
+        context_tokens: dict[str, int] | None = None,
+        default_context_tokens: int = 32000,
+        max_cached_messages: int = 50000,
+    ):
+        self.tokenizer_paths = tokenizer_paths or {}
+        self.context_tokens = context_tokens or {}
+        self.default_context_tokens = default_context_tokens
+        self.counts = Counter()
+        self._tokenizers: dict[str, object | None] = {}
+        self._cache = LRUTTLCache(max_entries=max_cached_messages)
+        self._lock = threading.Lock()
+
+    def _tokenizer(self, family: str):
+        if family in self._tokenizers:
+            return self._tokenizers[family]
+        with self._lock:
+            if family not in self._tokenizers:
+                self._tokenizers[family] = self._load(family)
+            return self._tokenizers[family]
+
+    def _load(self, family: str):
+        path = self.tokenizer_paths.get(family)
+        if not path:
+            return None
+        if Tokenizer is None:
+            logger.warning("`tokenizers` no está instalado, se usa len/4 para %s", family)
+            return None
+        if not os.path.exists(path):
+            logger.warning("No existe el tokenizer %s para %s, se usa len/4", path, family)
+            return None
+        return Tokenizer.from_file(path)
+
+    def count(self, text: str, model_name: str | None = None) -> int:
+        if not text:
+            return 0
+        tokenizer = self._tokenizer(family_of(model_name))
+        if tokenizer is None:
+            self.counts["fallback"] += 1
+            return math.ceil(len(text) / 4)
+        self.counts["tokenizer"] += 1
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_message(self, message: _Message, model_name: str | None = None) -> int:
+        family = family_of(model_name)
+        memo = message.__dict__.setdefault("_token_counts", {})
+        if family in memo:
+            self.counts["memo_hits"] += 1
+            return memo[family]
+
+        key = (family, message.role, message.content)
+        tokens = self._cache.get(key)
+        if tokens is None:
+            self.counts["cache_misses"] += 1
+            tokens = self.count(message.content, model_name) + MESSAGE_OVERHEAD_TOKENS
+            self._cache.set(key, tokens)
+        else:
+            self.counts["cache_hits"] += 1
+        memo[family] = tokens
+        return tokens
+
+    def count_messages(self, messages: Iterable[_Message], model_name: str | None = None) -> int:
+        return sum(self.count_message(message, model_name) for message in messages)
+
+    def count_chat(self, messages_list: list[dict], model_name: str | None = None) -> int:
+        """Para la lista de dicts que se envía al proveedor (sin memo: los dicts se arman en cada llamada)."""
+        return sum(self.count(item["content"] or "", model_name) + MESSAGE_OVERHEAD_TOKENS for item in messages_list)
+
+    def context_window(self, model_name: str | None = None) -> int:
+        return self.context_tokens.get(family_of(model_name), self.default_context_tokens)
+
+    def input_budget(self, model_name: str | None = None, reserve_tokens: int = 0) -> int:
+        """Tokens disponibles para el prompt dejando `reserve_tokens` para la respuesta."""
+        return self.context_window(model_name) - reserve_tokens
+
+    def fits(self, messages: Iterable[_Message], model_name: str | None = None, reserve_tokens: int = 0) -> bool:
+        return self.count_messages(messages, model_name) <= self.input_budget(model_name, reserve_tokens)
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "cached_messages": len(self._cache),
+            "tokenizers": {family: tokenizer is not None for family, tokenizer in self._tokenizers.items()},
+        }
+
+
+token_counter = TokenCounter(
+    Config.TOKENIZER_PATHS,
+    context_tokens=Config.LLM_CONTEXT_TOKENS,
+    default_context_tokens=Config.LLM_DEFAULT_CONTEXT_TOKENS,
+    max_cached_messages=Config.TOKEN_CACHE_MAX_ENTRIES,
+)
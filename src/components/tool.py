@@ -101,6 +101,28 @@ class BaseTool:
 
         return descriptions
 
+    def to_openai_tool(self) -> dict:
+        """Esquema de la herramienta en el formato `tools` de OpenAI (function calling)."""
+        parameters = inspect.signature(self._func).parameters
+        properties = {}
+        required = []
+        for name, spec in self.inputs.items():
+            json_type = spec["type"].removeprefix("Optional[").removesuffix("]")
+            properties[name] = {"type": json_type, "description": spec["description"]}
+            if json_type == "array":
+                properties[name]["items"] = {}
+            if not spec["type"].startswith("Optional[") and parameters[name].default is inspect.Parameter.empty:
+                required.append(name)
+
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
     def __call__(self, *args, **kwargs):
         return self._func(*args, **kwargs)  # Llama a la función decorada
 
@@ -55,18 +55,19 @@ class UsersCollection:
         bot_phone: str = None,
         google_auth: str = None,
         last_interaction: str = None,
-        messages: List[MessageDataType] = [],
+        messages: List[MessageDataType] | None = None,
         last_message: Optional[MessageDataType] = None,
-        current_waids: list[str] = [],
-        url_map: dict = {}
+        current_waids: list[str] | None = None,
+        url_map: dict | None = None
     ):
+        # Listas nuevas por documento: con `[]` como default los usuarios nuevos compartían historial
         self.phone = phone
         self.last_interaction = last_interaction
-        self.messages = messages
+        self.messages = messages if messages is not None else []
         self.last_message = last_message
-        self.current_waids = current_waids
+        self.current_waids = current_waids if current_waids is not None else []
         self.google_auth = google_auth
-        self.url_map = url_map
+        self.url_map = url_map if url_map is not None else {}
         self.bot_phone = bot_phone
         # self.system_prompt = 
 
@@ -4,6 +4,12 @@ import logging
 from datetime import datetime
 from src.google.utils import encode_creds, decode_creds
 from google.oauth2.credentials import Credentials
+from src.utils.logs import payload
+
+logger = logging.getLogger(__name__)
+
+# Los duplicados se filtran en el webhook (MessageDedup); en el documento solo guardamos los últimos
+MAX_CURRENT_WAIDS = 100
 
 
 class CredsResponse:
@@ -44,7 +50,7 @@ class UserManager:
                 return user_doc, user_ref, True
 
         except Exception as error:
-            logging.error(f"Error en find_contact_by_user_phone: {error}")
+            logger.error("Error en find_contact_by_user_phone: %s", error)
 
         return user_doc, user_ref, False
 
@@ -61,6 +67,12 @@ class UserManager:
         # Guardar el token
         self.user_document.google_auth = jwt_token
 
+    def save_google_auth(self, credentials: Credentials):
+        """Guarda solo las credenciales, sin reescribir el resto del documento (chat en curso)."""
+        self.save_jwt_to_firebase(credentials)
+        if self.user_exists:
+            self.user_ref.update({"google_auth": self.user_document.google_auth})
+
     def get_creds_from_firebase(self) -> CredsResponse:
         try:
             # Obtener el documento del usuario
@@ -78,7 +90,7 @@ class UserManager:
             return CredsResponse(True, "Token expirado, el usuario debe hacer login.")
 
         except Exception as e:
-            print(f"Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             return CredsResponse(True, f"Error inesperado: {e}")
 
     def find_short_url(self, short_id: str) -> str | None:
@@ -92,7 +104,7 @@ class UserManager:
                 return auth_url
 
         except Exception as error:
-            print(f"Error en find_contact_by_user_phone: {error}")
+            logger.error("Error en find_short_url: %s", error)
             return None, None
 
     def get_initial_conversation_messages(
@@ -101,7 +113,7 @@ class UserManager:
         system_message: str,
     ):
         try:
-            logging.info(f"El usuario con teléfono {self.user_phone} no existe.")
+            logger.info("El usuario con teléfono %s no existe.", self.user_phone)
             system_message_ = usr_collection_types.MessageDataType(
                 sender="system",
                 content=system_message,
@@ -120,7 +132,7 @@ class UserManager:
             return [system_message_, new_message]
 
         except Exception as error:
-            logging.info(f"Error al guardar el mensaje: {error}")
+            logger.error("Error al guardar el mensaje: %s", error)
             return []
 
     def create_new_user_chat(
@@ -134,29 +146,33 @@ class UserManager:
             self.user_document.messages = messages
             self.user_document.phone = self.user_phone
             self.user_document.bot_phone = self.bot_phone
-            logging.info("Conversación creada")
+            logger.info("Conversación creada")
 
         except Exception as error:
-            logging.info(f"Error al guardar el mensaje: {error}")
+            logger.error("Error al guardar el mensaje: %s", error)
             return
 
     def save_to_chat(self):
+        self.user_document.current_waids = self.user_document.current_waids[-MAX_CURRENT_WAIDS:]
 
         try:
-            log_message = f"""\n------------------------ USER CHAT ------------------------\n------------------------ USER CHAT ------------------------\n{self.user_document.to_json()}\n------------------------ USER CHAT ------------------------\n------------------------ USER CHAT ------------------------"""
-
-            logging.info(log_message)
+            user_json = self.user_document.to_json()
+            logger.debug("USER CHAT %s: %s", self.user_phone, payload(user_json))
 
             if self.user_exists:
-                self.user_ref.update(self.user_document.to_json())
-                logging.info("Mensaje guardado exitosamente.")
+                self.user_ref.update(user_json)
+                logger.info(
+                    "Mensaje guardado exitosamente (%s, %d mensajes).",
+                    self.user_phone,
+                    len(self.user_document.messages),
+                )
                 return
             else:
-                self.user_ref.create(self.user_document.to_json())
-                logging.info("Conversación creada")
+                self.user_ref.create(user_json)
+                logger.info("Conversación creada")
 
         except Exception as error:
-            logging.info(f"Error al guardar el mensaje: {error}")
+            logger.error("Error al guardar el mensaje: %s", error)
             return
 
 
@@ -85,6 +85,8 @@ def send_google_email(c: Credentials, to_emails: str, subject: str, body: str):
     from_email = "me"
     to_emails = to_emails.split(",")
     to_emails = [email.strip() for email in to_emails]
+    # Destinatarios a los que ya se envió: ante un error, quien reintenta no los repite
+    sent = []
 
     try:
         for to_email in to_emails:
@@ -101,10 +103,11 @@ def send_google_email(c: Credentials, to_emails: str, subject: str, body: str):
                 userId="me", body={"raw": raw_message}
             ).execute()
             logging.info(f"Correo enviado a {to_email}")
-        return {"success": True, "message": f"Correo enviado a: {', '.join(to_emails)}"}
+            sent.append(to_email)
+        return {"success": True, "message": f"Correo enviado a: {', '.join(to_emails)}", "sent": sent}
     except Exception as e:
-        traceback.logging.error_exc()
-        return {"success": False,"message": str(e)}
+        logging.exception("Error al enviar el correo")
+        return {"success": False,"message": str(e), "sent": sent}
 
 def list_calendar_events(
     creds: Credentials, calendar_id="primary", *, date_min: str, date_max: str
@@ -0,0 +1,60 @@
+import logging
+
+from src.utils.cache import LRUTTLCache, SQLiteTTLStore
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDedup:
+    """
+    Índice de ids de mensajes de WhatsApp (waid) ya recibidos, para descartar los reintentos
+    de Meta en el webhook antes de leer Firestore o llamar al LLM.
+
+    Nivel 1: LRU en memoria con TTL. Nivel 2 (opcional, si se pasa `sqlite_path`): SQLite
+    local, para no reprocesar mensajes tras un reinicio. Ambos niveles expiran solos.
+    """
+
+    def __init__(self, *, max_entries: int = 50000, ttl_seconds: float = 86400, sqlite_path: str | None = None):
+        self.memory = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.store = (
+            SQLiteTTLStore(sqlite_path, "seen_messages", ttl_seconds=ttl_seconds)
+            if sqlite_path
+            else None
+        )
+        self.duplicates = 0
+        self.unique = 0
+
+    def seen(self, message_id: str) -> bool:
+        """Marca `message_id` como recibido. Devuelve True si ya se había recibido antes."""
+        if not message_id:
+            return False
+
+        duplicate = not self.memory.add(message_id)
+        if not duplicate and self.store:
+            try:
+                duplicate = not self.store.add(message_id)
+            except Exception as error:
+                logger.error("Error en el índice de duplicados SQLite: %s", error)
+
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.unique += 1
+        return duplicate
+
+    def forget(self, message_id: str):
+        """Desmarca un mensaje que no se llegó a encolar, para que el reintento de Meta sí se procese."""
+        self.memory.pop(message_id)
+        if self.store:
+            try:
+                self.store.delete(message_id)
+            except Exception as error:
+                logger.error("Error en el índice de duplicados SQLite: %s", error)
+
+    def snapshot(self) -> dict:
+        return {
+            "unique": self.unique,
+            "duplicates": self.duplicates,
+            "memory_entries": len(self.memory),
+            "sqlite": bool(self.store),
+        }
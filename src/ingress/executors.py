@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("thread", "process", "asyncio")
+
+
+class ExecutorBackend(ABC):
+    """Dónde se ejecuta cada turno del agente que despacha la cola de entrada."""
+
+    mode = ""
+
+    def __init__(self, workers: int = 4):
+        self.workers = max(1, workers)
+
+    def start(self):
+        pass
+
+    @abstractmethod
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class _PoolBackend(ExecutorBackend):
+    def __init__(self, workers: int = 4):
+        super().__init__(workers)
+        self._pool: Executor | None = None
+
+    @abstractmethod
+    def _create_pool(self) -> Executor:
+        pass
+
+    def start(self):
+        self._pool = self._create_pool()
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ThreadPoolBackend(_PoolBackend):
+    """Hilos en el mismo proceso. Bueno para trabajo de I/O (LLM, Firestore); el CPU compite por el GIL."""
+
+    mode = "thread"
+
+    def _create_pool(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingress")
+
+
+def _init_process_worker(processes: int):
+    """Al arrancar cada proceso del pool: logging como en el servidor y su parte de los límites de los LLMs."""
+    from src.components.rate_limit import rate_limits
+    from src.settings.settings import Config
+    from src.utils.logs import setup_logging
+
+    setup_logging(
+        Config.LOG_LEVEL,
+        Config.LOG_LEVELS,
+        payload_max_chars=Config.LOG_PAYLOAD_MAX_CHARS,
+        sample_rate=Config.LOG_PAYLOAD_SAMPLE_RATE,
+    )
+    rate_limits.share(processes)
+
+
+class ProcessPoolBackend(_PoolBackend):
+    """
+    Procesos separados (`spawn`), sin GIL compartido. `func` debe ser una función de módulo y
+    sus argumentos picklables: nada de clientes (`db`, OpenAI); cada proceso crea los suyos al
+    importar los módulos.
+
+    Limitaciones: cada proceso tiene sus propios singletons (métricas, cachés, telemetría), así
+    que `/metrics` del servidor no muestra los números del agente, los LLMs ni los audios; y los
+    límites `LLM_RPM`/`LLM_TPM` se dividen en partes iguales entre los procesos, aunque uno
+    esté ocioso y otro saturado.
+    """
+
+    mode = "process"
+
+    def __init__(self, workers: int = 4, start_method: str = "spawn"):
+        super().__init__(workers)
+        self.start_method = start_method
+
+    def _create_pool(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_process_worker,
+            initargs=(self.workers,),
+        )
+
+
+class AsyncioBackend(ExecutorBackend):
+    """
+    Corrutinas en el event loop del servidor. Solo sirve con handlers `async`: las funciones
+    síncronas (como `run_chat_task`, que es lo que corre en producción) van a un pool de
+    `workers` hilos, es decir, se comporta igual que `thread`.
+    """
+
+    mode = "asyncio"
+
+    def __init__(self, workers: int = 4):
+        super().__init__(workers)
+        self._pool: ThreadPoolExecutor | None = None
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingress-asyncio")
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        if inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(getattr(func, "__call__", None)):
+            return await func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def create_backend(mode: str, workers: int = 4) -> ExecutorBackend:
+    backends = {
+        ThreadPoolBackend.mode: ThreadPoolBackend,
+        ProcessPoolBackend.mode: ProcessPoolBackend,
+        AsyncioBackend.mode: AsyncioBackend,
+    }
+    if mode not in backends:
+        raise ValueError(f"Modo de ejecución no soportado: '{mode}'. Opciones: {', '.join(EXECUTOR_MODES)}.")
+    logger.info("Backend de ejecución: %s (%d workers)", mode, workers)
+    if mode == ProcessPoolBackend.mode:
+        logger.warning(
+            "Modo process: /metrics no incluye las métricas de los procesos (agente, LLMs, audios) "
+            "y LLM_RPM/LLM_TPM se reparten entre los %d procesos",
+            workers,
+        )
+    elif mode == AsyncioBackend.mode:
+        logger.warning("Modo asyncio: el turno del agente es síncrono y corre en %d hilos, igual que en modo thread", workers)
+    return backends[mode](workers)
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable
+
+from src.ingress.executors import ExecutorBackend, ThreadPoolBackend
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("reject", "drop_oldest", "drop_newest")
+
+
+class IngressQueueFull(Exception):
+    """La cola está llena y la política de desborde es `reject`."""
+
+
+class IngressItem:
+    def __init__(self, key: str, payload: Any):
+        self.key = key
+        self.payload = payload
+        self.enqueued_at = time.monotonic()
+
+
+class IngressMetrics:
+    def __init__(self, max_samples: int = 1000):
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.batches = 0
+        self.coalesced_batches = 0
+        self.llm_calls_saved = 0
+        self.wait_time = RollingWindow(max_samples)
+        self.run_time = RollingWindow(max_samples)
+
+    def to_dict(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "max_depth": self.max_depth,
+            "batches": self.batches,
+            "coalesced_batches": self.coalesced_batches,
+            "llm_calls_saved": self.llm_calls_saved,
+            "wait_time": self.wait_time.summary(),
+            "run_time": self.run_time.summary(),
+        }
+
+
+class IngressQueue:
+    """
+    Cola de entrada en proceso para los mensajes del webhook.
+
+    Cada usuario tiene su propio carril (FIFO): sus mensajes se procesan en orden de
+    llegada y nunca en paralelo, mientras que carriles distintos avanzan en paralelo hasta
+    `workers` a la vez. El `handler` se llama como `handler(key, payloads)` en el `backend`
+    configurado (hilos, procesos o asyncio) y recibe siempre una lista: los mensajes
+    que llegan seguidos (separados por menos de `debounce_ms`, sin esperar más de
+    `max_debounce_ms` desde el primero) o mientras el carril está ocupado se agrupan en
+    un solo lote de hasta `max_batch` mensajes, es decir, un solo turno del agente.
+
+    La cola está acotada globalmente (`max_pending`) y por usuario
+    (`max_pending_per_user`); al llenarse aplica `overflow_policy`:
+
+    - `reject`: `submit` lanza `IngressQueueFull` (el webhook responde 503 y Meta reintenta).
+    - `drop_oldest`: descarta el mensaje pendiente más antiguo del carril más cargado (si no
+      hay ninguno pendiente, rechaza como `reject`).
+    - `drop_newest`: descarta el mensaje entrante.
+
+    `submit` debe llamarse desde el event loop donde se llamó a `start`.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, list[Any]], Any],
+        *,
+        backend: ExecutorBackend | None = None,
+        workers: int = 4,
+        max_pending: int = 1000,
+        max_pending_per_user: int = 20,
+        overflow_policy: str = "reject",
+        debounce_ms: int = 0,
+        max_debounce_ms: int = 0,
+        max_batch: int = 10,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Política de desborde no soportada: '{overflow_policy}'. Opciones: {', '.join(OVERFLOW_POLICIES)}."
+            )
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.backend = backend or ThreadPoolBackend(self.workers)
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self.overflow_policy = overflow_policy
+        self.debounce = max(0, debounce_ms) / 1000
+        self.max_debounce = max(debounce_ms, max_debounce_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self.metrics = IngressMetrics()
+
+        self._lanes: dict[str, deque[IngressItem]] = {}
+        self._scheduled: set[str] = set()
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._ready: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    async def start(self):
+        self._ready = asyncio.Queue()
+        self.backend.start()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingress-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            "Ingress iniciado: %d workers (%s), max_pending=%d, max_pending_per_user=%s, overflow_policy=%s, "
+            "debounce=%.0fms",
+            self.workers,
+            self.backend.mode,
+            self.max_pending,
+            self.max_pending_per_user,
+            self.overflow_policy,
+            self.debounce * 1000,
+        )
+
+    async def stop(self, drain_timeout: float = 10.0):
+        deadline = time.monotonic() + drain_timeout
+        for key in list(self._timers):
+            self._timers.pop(key).cancel()
+            self._ready.put_nowait(key)
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning("Ingress detenido con %d mensajes sin procesar.", self._pending)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.backend.shutdown()
+
+    def submit(self, key: str, payload: Any) -> bool:
+        """Encola `payload` en el carril `key`. Devuelve False si el mensaje fue descartado."""
+        if self._ready is None:
+            raise RuntimeError("IngressQueue.start() no ha sido llamado.")
+
+        lane = self._lanes.get(key)
+        lane_full = lane is not None and len(lane) >= self.max_pending_per_user
+        if self._pending >= self.max_pending or lane_full:
+            if self.overflow_policy == "reject":
+                self.metrics.rejected += 1
+                raise IngressQueueFull(f"Cola de entrada llena (pendientes={self._pending}).")
+            if self.overflow_policy == "drop_newest":
+                self.metrics.dropped += 1
+                logger.warning("Ingress lleno, mensaje descartado para %s.", key)
+                return False
+            if not self._drop_oldest(key if lane_full else None):
+                # No había nada pendiente que descartar: se rechaza como con `reject`
+                self.metrics.rejected += 1
+                raise IngressQueueFull(f"Cola de entrada llena (pendientes={self._pending}).")
+
+        if lane is None:
+            lane = self._lanes[key] = deque()
+        lane.append(IngressItem(key, payload))
+        self._pending += 1
+        self.metrics.enqueued += 1
+        self.metrics.max_depth = max(self.metrics.max_depth, self._pending)
+
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._schedule(key)
+        elif key in self._timers:
+            # Llegó otro mensaje durante la ventana: se reinicia el debounce
+            self._timers.pop(key).cancel()
+            self._schedule(key)
+        return True
+
+    def _schedule(self, key: str):
+        """Pasa el carril a la cola de listos cuando su ventana de debounce se cierra."""
+        self._timers.pop(key, None)
+        lane = self._lanes.get(key)
+        if not lane:
+            self._release(key)
+            return
+
+        now = time.monotonic()
+        ready_at = min(
+            lane[-1].enqueued_at + self.debounce,
+            lane[0].enqueued_at + self.max_debounce,
+        )
+        if ready_at <= now:
+            self._ready.put_nowait(key)
+        else:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(ready_at - now, self._schedule, key)
+
+    def _drop_oldest(self, key: str | None) -> bool:
+        """Descarta el mensaje más antiguo de `key` (o del carril con más pendientes). Devuelve si descartó alguno."""
+        if key is None:
+            # Los carriles en proceso pueden estar vacíos: solo cuentan los que tienen pendientes
+            key = max((k for k, lane in self._lanes.items() if lane), key=lambda k: len(self._lanes[k]), default=None)
+        lane = self._lanes.get(key)
+        if not lane:
+            return False
+        dropped = lane.popleft()
+        self._pending -= 1
+        self.metrics.dropped += 1
+        logger.warning("Ingress lleno, mensaje más antiguo descartado para %s.", dropped.key)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes.get(key)
+            if not lane:
+                self._release(key)
+                continue
+
+            items = [lane.popleft() for _ in range(min(len(lane), self.max_batch))]
+            self._pending -= len(items)
+            self._in_flight += 1
+            started_at = time.monotonic()
+            for item in items:
+                self.metrics.wait_time.add(started_at - item.enqueued_at)
+
+            self.metrics.batches += 1
+            if len(items) > 1:
+                # Cada mensaje agrupado es al menos una llamada al LLM que no se hace
+                self.metrics.coalesced_batches += 1
+                self.metrics.llm_calls_saved += len(items) - 1
+                logger.info("%d mensajes de %s agrupados en un solo turno.", len(items), key)
+
+            try:
+                await self.backend.run(self.handler, key, [item.payload for item in items])
+                self.metrics.processed += len(items)
+            except Exception:
+                self.metrics.failed += len(items)
+                logger.exception("Error procesando los mensajes de %s", key)
+            finally:
+                self.metrics.run_time.add(time.monotonic() - started_at)
+                self._in_flight -= 1
+                self._release(key)
+
+    def _release(self, key: str):
+        if self._lanes.get(key):
+            self._schedule(key)
+            return
+        self._lanes.pop(key, None)
+        self._scheduled.discard(key)
+
+    def snapshot(self) -> dict:
+        return {
+            "depth": self._pending,
+            "in_flight": self._in_flight,
+            "lanes": len(self._lanes),
+            "workers": self.workers,
+            "executor": self.backend.mode,
+            "overflow_policy": self.overflow_policy,
+            "debounce_ms": self.debounce * 1000,
+            **self.metrics.to_dict(),
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import re
+from collections import Counter
+from typing import Callable
+
+from src.utils.cache import LRUTTLCache
+from src.whatsapp.types import WebhookPayload
+
+logger = logging.getLogger(__name__)
+
+# Cualquier body con mensajes contiene la clave `"messages":` (ojo: `"field": "messages"` es un
+# valor, no una clave). Si no aparece en los bytes, no hay que parsear el JSON para saber que
+# es una notificación. Un falso positivo solo implica tomar el camino normal.
+MESSAGES_KEY = re.compile(rb'"messages"\s*:')
+STATUSES_KEY = re.compile(rb'"statuses"\s*:')
+
+
+def is_status_only(raw_body: bytes) -> bool:
+    return MESSAGES_KEY.search(raw_body) is None
+
+
+class WebhookCounters:
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, webhook_class: str):
+        self.counts[webhook_class] += 1
+
+    def classify_raw(self, raw_body: bytes) -> str:
+        if MESSAGES_KEY.search(raw_body):
+            return "messages"
+        if STATUSES_KEY.search(raw_body):
+            return "statuses"
+        return "other"
+
+    def to_dict(self) -> dict:
+        return {name: self.counts[name] for name in ("messages", "statuses", "other", "invalid")}
+
+
+class DeliveryTracker:
+    """Último estado conocido (sent, delivered, read, failed) de cada mensaje enviado por el bot."""
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 86400):
+        self.last_status = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.counts = Counter()
+
+    def __call__(self, statuses: list[dict]):
+        for status in statuses:
+            state = status.get("status", "")
+            self.counts[state] += 1
+            self.last_status.set(
+                status.get("id", ""),
+                {
+                    "status": state,
+                    "timestamp": status.get("timestamp", ""),
+                    "recipient_id": status.get("recipient_id", ""),
+                },
+            )
+            if state == "failed":
+                logger.warning("Mensaje %s no entregado: %s", status.get("id"), status.get("errors"))
+
+    def get(self, waid: str) -> dict | None:
+        return self.last_status.get(waid)
+
+    def snapshot(self) -> dict:
+        return {"by_status": dict(self.counts), "tracked": len(self.last_status)}
+
+
+class StatusSink:
+    """
+    Cola de baja prioridad para los callbacks de estado. El webhook responde sin esperar:
+    encola el body crudo (o los statuses ya extraídos) y un único consumidor los parsea y
+    se los pasa a `handler` cuando el event loop está libre. Si la cola se llena, se
+    descartan: nunca hacen esperar al camino de los mensajes.
+    """
+
+    def __init__(self, handler: Callable[[list[dict]], None], *, max_pending: int = 10000):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._consume(), name="status-sink")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, item: bytes | list[dict]):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _consume(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                statuses = WebhookPayload(json.loads(item)).statuses if isinstance(item, bytes) else item
+                if statuses:
+                    self.handler(statuses)
+                    self.processed += len(statuses)
+            except Exception:
+                self.failed += 1
+                logger.exception("Error procesando statuses del webhook")
+            # Cedemos el loop entre items para no competir con las requests
+            await asyncio.sleep(0)
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue else 0,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,354 @@
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from apscheduler.triggers.date import DateTrigger
+from google.oauth2.credentials import Credentials
+
+from src.firebase.users_manager import UserManager
+from src.google.google_services import db, refresh_access_token, send_google_email
+from src.scheduler.scheduler import SchedulerResponse, scheduler
+from src.settings.settings import Config
+
+logger = logging.getLogger(__name__)
+
+
+class EmailJob:
+    """Registro compacto de un correo programado. No guarda credenciales: se resuelven al enviar."""
+
+    def __init__(
+        self,
+        id: str,
+        user_phone: str,
+        to_emails: str,
+        subject: str,
+        body: str,
+        due_at: datetime,
+        status: str = "pending",
+        attempts: int = 0,
+        last_error: str = "",
+        created_at: str = "",
+        sent_to: str = "",
+    ):
+        self.id = id
+        self.user_phone = user_phone
+        self.to_emails = to_emails
+        self.subject = subject
+        self.body = body
+        self.due_at = due_at
+        self.status = status
+        self.attempts = attempts
+        self.last_error = last_error
+        self.created_at = created_at or datetime.now().isoformat()
+        self.sent_to = sent_to
+
+    @property
+    def pending_recipients(self) -> str:
+        """Los destinatarios que todavía no recibieron el correo (los de `sent_to` no se repiten)."""
+        sent = {email.strip() for email in self.sent_to.split(",") if email.strip()}
+        return ",".join(email.strip() for email in self.to_emails.split(",") if email.strip() not in sent)
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "EmailJob":
+        return cls(
+            id=row["id"],
+            user_phone=row["user_phone"],
+            to_emails=row["to_emails"],
+            subject=row["subject"],
+            body=row["body"],
+            due_at=datetime.fromisoformat(row["due_at"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            last_error=row["last_error"] or "",
+            created_at=row["created_at"],
+            sent_to=row["sent_to"] or "",
+        )
+
+
+class EmailJobStore:
+    """
+    Job store en SQLite local para los correos programados.
+
+    Estados: `pending` -> `sending` -> `sent`, o `failed` tras agotar los intentos, o `missed`
+    si el correo venció hace más de `EMAIL_JOB_MAX_LATENESS_SECONDS` (p. ej. el servicio estuvo
+    caído). Un job en `sending` al arrancar vuelve a `pending` (entrega al menos una vez).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS email_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_phone TEXT NOT NULL,
+                    to_emails TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    due_at TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    sent_to TEXT NOT NULL DEFAULT ''
+                )"""
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(email_jobs)")}
+            if "sent_to" not in columns:
+                conn.execute("ALTER TABLE email_jobs ADD COLUMN sent_to TEXT NOT NULL DEFAULT ''")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS email_jobs_status_due_at ON email_jobs (status, due_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, job: EmailJob):
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO email_jobs
+                (id, user_phone, to_emails, subject, body, due_at, status, attempts, last_error, created_at, sent_to)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    job.id,
+                    job.user_phone,
+                    job.to_emails,
+                    job.subject,
+                    job.body,
+                    job.due_at.isoformat(),
+                    job.status,
+                    job.attempts,
+                    job.last_error,
+                    job.created_at,
+                    job.sent_to,
+                ),
+            )
+
+    def get(self, job_id: str) -> EmailJob | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM email_jobs WHERE id = ?", (job_id,)).fetchone()
+        return EmailJob.from_row(row) if row else None
+
+    def pending(self) -> list[EmailJob]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM email_jobs WHERE status = 'pending' ORDER BY due_at"
+            ).fetchall()
+        return [EmailJob.from_row(row) for row in rows]
+
+    def overdue(self, now: datetime) -> list[EmailJob]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM email_jobs WHERE status = 'pending' AND due_at <= ? ORDER BY due_at",
+                (now.isoformat(),),
+            ).fetchall()
+        return [EmailJob.from_row(row) for row in rows]
+
+    def claim(self, job_id: str) -> bool:
+        """Pasa el job a `sending` si sigue pendiente. Evita envíos dobles entre el trigger y la barrida."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE email_jobs SET status = 'sending', attempts = attempts + 1 WHERE id = ? AND status = 'pending'",
+                (job_id,),
+            )
+        return cursor.rowcount == 1
+
+    def set_status(self, job_id: str, status: str, last_error: str = ""):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE email_jobs SET status = ?, last_error = ? WHERE id = ?",
+                (status, last_error, job_id),
+            )
+
+    def add_sent(self, job: EmailJob, emails: list[str]):
+        """Registra los destinatarios que ya recibieron el correo, para no repetirlos al reintentar."""
+        if not emails:
+            return
+        job.sent_to = ",".join(filter(None, [job.sent_to, *emails]))
+        with self._connect() as conn:
+            conn.execute("UPDATE email_jobs SET sent_to = ? WHERE id = ?", (job.sent_to, job.id))
+
+    def requeue_interrupted(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE email_jobs SET status = 'pending' WHERE status = 'sending'")
+        return cursor.rowcount
+
+
+# Raíz del proyecto: las rutas relativas del store no dependen del directorio de trabajo
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+_email_job_store: EmailJobStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_email_job_store() -> EmailJobStore:
+    """
+    El store se abre recién al usarse (al arrancar o al programar el primer correo), no al
+    importar: los procesos que solo importan las herramientas no crean la base.
+    """
+    global _email_job_store
+    with _store_lock:
+        if _email_job_store is None:
+            _email_job_store = EmailJobStore(os.path.join(PROJECT_ROOT, Config.EMAIL_JOBS_SQLITE_PATH))
+        return _email_job_store
+
+
+def schedule_email(
+    *, user_phone: str, to_emails: str, subject: str, body: str, date: datetime
+) -> SchedulerResponse:
+    try:
+        if date < datetime.now():
+            raise ValueError("La fecha proporcionada está en el pasado.")
+
+        job = EmailJob(
+            id=f"email-job--{uuid.uuid4().hex}",
+            user_phone=user_phone,
+            to_emails=to_emails,
+            subject=subject,
+            body=body,
+            due_at=date,
+        )
+        get_email_job_store().add(job)
+        _add_scheduler_job(job)
+
+        m = f"Correo {job.id} programado para: {date}. Destinatarios: {to_emails}"
+        logger.info(m)
+        return SchedulerResponse(success=True, message=m)
+
+    except Exception as e:
+        m = f"Error al programar el correo: {str(e)}"
+        logger.error(m)
+        return SchedulerResponse(success=False, message=m)
+
+
+def _add_scheduler_job(job: EmailJob):
+    scheduler.add_job(
+        dispatch_email_job,
+        trigger=DateTrigger(run_date=job.due_at),
+        kwargs={"job_id": job.id},
+        id=job.id,
+        replace_existing=True,
+        misfire_grace_time=Config.EMAIL_JOB_MISFIRE_GRACE_SECONDS,
+        coalesce=True,
+    )
+
+
+def resolve_credentials(user_phone: str) -> Credentials | None:
+    """Lee las credenciales de Google del usuario y las renueva si expiraron, al momento del envío."""
+    user_manager = UserManager(db, user_phone)
+    creds_response = user_manager.get_creds_from_firebase()
+    if creds_response.need_login:
+        logger.error("El usuario %s debe volver a autenticarse en google.", user_phone)
+        return None
+
+    credentials = refresh_access_token(creds_response.response)
+    if credentials:
+        user_manager.save_google_auth(credentials)
+    return credentials
+
+
+def dispatch_email_job(job_id: str):
+    job = get_email_job_store().get(job_id)
+    if not job or job.status != "pending":
+        return
+    dispatch_email_jobs([job])
+
+
+def dispatch_email_jobs(jobs: list[EmailJob]):
+    """Envía los jobs agrupados por usuario, resolviendo las credenciales una vez por usuario."""
+    store = get_email_job_store()
+    jobs_by_user: dict[str, list[EmailJob]] = defaultdict(list)
+    for job in jobs:
+        if store.claim(job.id):
+            jobs_by_user[job.user_phone].append(job)
+
+    for user_phone, user_jobs in jobs_by_user.items():
+        try:
+            credentials = resolve_credentials(user_phone)
+        except Exception as e:
+            logger.exception("Error al resolver las credenciales de %s", user_phone)
+            credentials, error = None, str(e)
+        else:
+            error = "Credenciales no disponibles, el usuario debe hacer login."
+
+        for job in user_jobs:
+            if credentials and not job.pending_recipients:
+                # Ya les llegó a todos (p. ej. se cortó antes de marcarlo como enviado)
+                error = ""
+            elif credentials:
+                try:
+                    res = send_google_email(credentials, job.pending_recipients, job.subject, job.body)
+                    store.add_sent(job, res.get("sent", []))
+                    error = "" if res.get("success") else res.get("message", "")
+                except Exception as e:
+                    error = str(e)
+
+            if credentials and not error:
+                store.set_status(job.id, "sent")
+                logger.info("Correo %s enviado (%d intento(s)).", job.id, job.attempts + 1)
+            elif job.attempts + 1 >= Config.EMAIL_JOB_MAX_ATTEMPTS:
+                store.set_status(job.id, "failed", error)
+                logger.error("Correo %s descartado tras %d intentos: %s", job.id, job.attempts + 1, error)
+            else:
+                # Vuelve a pendiente; la barrida periódica lo reintenta solo con los destinatarios que faltan
+                store.set_status(job.id, "pending", error)
+                logger.error("Error al enviar el correo %s, se reintentará: %s", job.id, error)
+
+
+def catch_up_email_jobs():
+    """Envía en bloque los correos vencidos (misfires, reintentos, caídas del servicio)."""
+    now = datetime.now()
+    max_lateness = timedelta(seconds=Config.EMAIL_JOB_MAX_LATENESS_SECONDS)
+
+    store = get_email_job_store()
+    overdue, missed = [], []
+    for job in store.overdue(now):
+        (overdue if now - job.due_at <= max_lateness else missed).append(job)
+
+    for job in missed:
+        store.set_status(job.id, "missed", f"Vencido desde {job.due_at}")
+        logger.error("Correo %s no enviado: venció el %s.", job.id, job.due_at)
+
+    if overdue:
+        logger.info("Enviando %d correos vencidos.", len(overdue))
+        dispatch_email_jobs(overdue)
+
+
+def restore_email_jobs():
+    """Al arrancar: recupera los jobs del store, envía los vencidos y reprograma los futuros."""
+    store = get_email_job_store()
+    interrupted = store.requeue_interrupted()
+    if interrupted:
+        logger.warning("%d correos interrumpidos durante el envío vuelven a la cola.", interrupted)
+
+    now = datetime.now()
+    future_jobs = [job for job in store.pending() if job.due_at > now]
+    for job in future_jobs:
+        _add_scheduler_job(job)
+    logger.info("%d correos programados restaurados.", len(future_jobs))
+
+    # La primera barrida corre de inmediato en el scheduler (sin bloquear el arranque)
+    scheduler.add_job(
+        catch_up_email_jobs,
+        "interval",
+        seconds=Config.EMAIL_JOB_SWEEP_SECONDS,
+        next_run_time=now,
+        id="email-jobs-catch-up",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+    )
@@ -39,8 +39,3 @@ def schedule_task(func: Callable[..., Any], kwargs: dict = {}, *, date: datetime
         m = f"Error al programar la tarea: {str(e)}"
         logging.error(m)
         return SchedulerResponse(success=False, message=m)
-
-def schedule_chat_manager(chat_manager: Callable[..., Any], db, message_data):
-    logging.info("Agendando chat_manager para procesamiento en segundo plano.")
-    now=datetime.now()
-    scheduler.add_job(chat_manager, 'date', run_date=now, kwargs={'db': db, 'message_data': message_data})
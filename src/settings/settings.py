@@ -18,3 +18,123 @@ class Config:
     TIMEZONE = env("TIMEZONE")
     LANGUAGE = env("LANGUAGE")
 
+    # Cola de entrada del webhook
+    INGRESS_WORKERS = env.int("INGRESS_WORKERS", default=4)
+    # thread, process o asyncio (con el handler síncrono actual, asyncio equivale a thread)
+    INGRESS_EXECUTOR = env("INGRESS_EXECUTOR", default="thread")
+    INGRESS_MAX_PENDING = env.int("INGRESS_MAX_PENDING", default=1000)
+    INGRESS_MAX_PENDING_PER_USER = env.int("INGRESS_MAX_PENDING_PER_USER", default=20)
+    INGRESS_OVERFLOW_POLICY = env("INGRESS_OVERFLOW_POLICY", default="reject")
+    INGRESS_DEBOUNCE_MS = env.int("INGRESS_DEBOUNCE_MS", default=300)
+    INGRESS_MAX_DEBOUNCE_MS = env.int("INGRESS_MAX_DEBOUNCE_MS", default=4000)
+    INGRESS_MAX_BATCH = env.int("INGRESS_MAX_BATCH", default=10)
+
+    # Índice de mensajes duplicados (reintentos de Meta). Sin ruta solo se usa memoria
+    DEDUP_MAX_ENTRIES = env.int("DEDUP_MAX_ENTRIES", default=50000)
+    DEDUP_TTL_SECONDS = env.int("DEDUP_TTL_SECONDS", default=172800)
+    DEDUP_SQLITE_PATH = env("DEDUP_SQLITE_PATH", default="")
+
+    # Callbacks de estado (sent/delivered/read): seguimiento de entregas en segundo plano
+    STATUS_SINK_ENABLED = env.bool("STATUS_SINK_ENABLED", default=False)
+    STATUS_SINK_MAX_PENDING = env.int("STATUS_SINK_MAX_PENDING", default=10000)
+
+    # Notas de voz: se descargan en memoria con tope de tamaño (16 MB es el máximo de audio de WhatsApp).
+    # Con directorio se guarda además una copia, que se borra pasado MEDIA_RETENTION_SECONDS
+    MEDIA_MAX_BYTES = env.int("MEDIA_MAX_BYTES", default=16 * 1024 * 1024)
+    MEDIA_DOWNLOAD_TIMEOUT_SECONDS = env.float("MEDIA_DOWNLOAD_TIMEOUT_SECONDS", default=30.0)
+    MEDIA_RETENTION_DIR = env("MEDIA_RETENTION_DIR", default="")
+    MEDIA_RETENTION_SECONDS = env.int("MEDIA_RETENTION_SECONDS", default=86400)
+
+    # Caché de transcripciones por sha256 del audio e idioma (las notas reenviadas no se vuelven a transcribir).
+    # Sin ruta solo se usa memoria
+    TRANSCRIPTION_CACHE_MAX_ENTRIES = env.int("TRANSCRIPTION_CACHE_MAX_ENTRIES", default=10000)
+    TRANSCRIPTION_CACHE_TTL_SECONDS = env.int("TRANSCRIPTION_CACHE_TTL_SECONDS", default=2592000)
+    TRANSCRIPTION_CACHE_SQLITE_PATH = env("TRANSCRIPTION_CACHE_SQLITE_PATH", default="")
+
+    # Notas de voz largas: se pasan a 16 kHz mono, se cortan en los silencios en chunks de ~AUDIO_CHUNK_SECONDS
+    # y se transcriben en paralelo. El umbral de silencio es en dB relativos al nivel medio de la nota
+    AUDIO_CHUNKING_ENABLED = env.bool("AUDIO_CHUNKING_ENABLED", default=True)
+    AUDIO_CHUNK_SECONDS = env.float("AUDIO_CHUNK_SECONDS", default=30.0)
+    AUDIO_MAX_CHUNK_SECONDS = env.float("AUDIO_MAX_CHUNK_SECONDS", default=60.0)
+    AUDIO_MIN_SILENCE_MS = env.int("AUDIO_MIN_SILENCE_MS", default=400)
+    AUDIO_SILENCE_THRESH_DB = env.float("AUDIO_SILENCE_THRESH_DB", default=-16.0)
+    AUDIO_KEEP_SILENCE_MS = env.int("AUDIO_KEEP_SILENCE_MS", default=150)
+    AUDIO_CHUNK_FORMAT = env("AUDIO_CHUNK_FORMAT", default="flac")
+    AUDIO_TRANSCRIPTION_WORKERS = env.int("AUDIO_TRANSCRIPTION_WORKERS", default=4)
+
+    # Correos programados (job store persistente)
+    EMAIL_JOBS_SQLITE_PATH = env("EMAIL_JOBS_SQLITE_PATH", default="data/email_jobs.sqlite3")
+    EMAIL_JOB_MISFIRE_GRACE_SECONDS = env.int("EMAIL_JOB_MISFIRE_GRACE_SECONDS", default=300)
+    EMAIL_JOB_MAX_LATENESS_SECONDS = env.int("EMAIL_JOB_MAX_LATENESS_SECONDS", default=86400)
+    EMAIL_JOB_MAX_ATTEMPTS = env.int("EMAIL_JOB_MAX_ATTEMPTS", default=3)
+    EMAIL_JOB_SWEEP_SECONDS = env.int("EMAIL_JOB_SWEEP_SECONDS", default=60)
+
+    # Logging: nivel global, niveles por subsistema ("src.agent=DEBUG,src.firebase=WARNING")
+    # y tope/muestreo de los payloads grandes (webhooks, documentos de usuario)
+    LOG_LEVEL = env("LOG_LEVEL", default="INFO")
+    LOG_LEVELS = env("LOG_LEVELS", default="")
+    LOG_PAYLOAD_MAX_CHARS = env.int("LOG_PAYLOAD_MAX_CHARS", default=2000)
+    LOG_PAYLOAD_SAMPLE_RATE = env.float("LOG_PAYLOAD_SAMPLE_RATE", default=1.0)
+
+    # Registro de llamadas al LLM (JSON por línea, con rotación). Sin ruta solo quedan los histogramas en memoria
+    LLM_TELEMETRY_PATH = env("LLM_TELEMETRY_PATH", default="")
+    LLM_TELEMETRY_MAX_BYTES = env.int("LLM_TELEMETRY_MAX_BYTES", default=10_000_000)
+    LLM_TELEMETRY_BACKUPS = env.int("LLM_TELEMETRY_BACKUPS", default=5)
+
+    # Cliente asíncrono de LLMs: llamadas en vuelo por proveedor (host del base_url) y pool HTTP
+    LLM_MAX_CONCURRENCY = env.int("LLM_MAX_CONCURRENCY", default=16)
+    LLM_CONCURRENCY = env.dict("LLM_CONCURRENCY", cast={"value": int}, default={})
+    LLM_POOL_MAX_CONNECTIONS = env.int("LLM_POOL_MAX_CONNECTIONS", default=50)
+    LLM_POOL_MAX_KEEPALIVE = env.int("LLM_POOL_MAX_KEEPALIVE", default=20)
+    LLM_POOL_KEEPALIVE_EXPIRY = env.float("LLM_POOL_KEEPALIVE_EXPIRY", default=30.0)
+    LLM_TIMEOUT_SECONDS = env.float("LLM_TIMEOUT_SECONDS", default=60.0)
+
+    # Límites de uso por minuto (requests y tokens) por proveedor o por proveedor/modelo
+    LLM_RPM = env.dict("LLM_RPM", cast={"value": int}, default={})
+    LLM_TPM = env.dict("LLM_TPM", cast={"value": int}, default={})
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS = env.float("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", default=30.0)
+    LLM_RATE_LIMIT_RETRIES = env.int("LLM_RATE_LIMIT_RETRIES", default=2)
+    LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS = env.float("LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", default=5.0)
+
+    # Agente: generar en streaming y cortar apenas el JSON de la acción está completo
+    AGENT_STREAMING = env.bool("AGENT_STREAMING", default=True)
+
+    # Presupuesto por turno del agente (0 = sin límite) y tiempo máximo por paso del LLM
+    AGENT_TURN_TIMEOUT_SECONDS = env.float("AGENT_TURN_TIMEOUT_SECONDS", default=90.0)
+    AGENT_TURN_MAX_TOKENS = env.int("AGENT_TURN_MAX_TOKENS", default=0)
+    AGENT_TURN_MAX_TOOL_CALLS = env.int("AGENT_TURN_MAX_TOOL_CALLS", default=6)
+    AGENT_STEP_TIMEOUT_SECONDS = env.float("AGENT_STEP_TIMEOUT_SECONDS", default=45.0)
+    AGENT_STEP_THREADS = env.int("AGENT_STEP_THREADS", default=32)
+
+    # Modo de herramientas del agente: "text" (JSON en el texto, `SYSTEM_2`) o "native" (function calling)
+    AGENT_TOOL_MODE = env("AGENT_TOOL_MODE", default="text")
+    AGENT_NATIVE_TOOLS_MODELS = env.list(
+        "AGENT_NATIVE_TOOLS_MODELS", default=["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
+    )
+
+    # Ruteo por complejidad: pasos simples (saludos, gracias, charla corta) al 8B y el resto al 70B
+    LLM_COMPLEXITY_ROUTING_ENABLED = env.bool("LLM_COMPLEXITY_ROUTING_ENABLED", default=False)
+    LLM_SMALL_MAX_CHARS = env.int("LLM_SMALL_MAX_CHARS", default=80)
+    # USD por millón de tokens (entrada y salida promediados), para estimar costo y ahorro por ruta
+    LLM_PRICE_PER_MTOK = env.dict("LLM_PRICE_PER_MTOK", cast={"value": float}, default={})
+
+    # Ruteo entre proveedores del 70B: hedging por percentil de latencia y circuit breakers
+    LLM_ROUTING_ENABLED = env.bool("LLM_ROUTING_ENABLED", default=False)
+    LLM_HEDGE_PERCENTILE = env.float("LLM_HEDGE_PERCENTILE", default=95.0)
+    LLM_HEDGE_MIN_DELAY_SECONDS = env.float("LLM_HEDGE_MIN_DELAY_SECONDS", default=1.0)
+    LLM_HEDGE_MAX_DELAY_SECONDS = env.float("LLM_HEDGE_MAX_DELAY_SECONDS", default=8.0)
+    LLM_HEDGE_MIN_SAMPLES = env.int("LLM_HEDGE_MIN_SAMPLES", default=20)
+    LLM_HEDGE_THREADS = env.int("LLM_HEDGE_THREADS", default=16)
+    LLM_BREAKER_WINDOW = env.int("LLM_BREAKER_WINDOW", default=50)
+    LLM_BREAKER_MIN_CALLS = env.int("LLM_BREAKER_MIN_CALLS", default=10)
+    LLM_BREAKER_ERROR_RATE = env.float("LLM_BREAKER_ERROR_RATE", default=0.5)
+    LLM_BREAKER_SLOW_SECONDS = env.float("LLM_BREAKER_SLOW_SECONDS", default=20.0)
+    LLM_BREAKER_COOLDOWN_SECONDS = env.float("LLM_BREAKER_COOLDOWN_SECONDS", default=30.0)
+
+    # Conteo de tokens: tokenizer.json local por familia ("llama3=/ruta/tokenizer.json"), si no len/4,
+    # y ventana de contexto por familia para recortar el historial
+    TOKENIZER_PATHS = env.dict("TOKENIZER_PATHS", default={})
+    LLM_CONTEXT_TOKENS = env.dict("LLM_CONTEXT_TOKENS", cast={"value": int}, default={"llama3": 32768})
+    LLM_DEFAULT_CONTEXT_TOKENS = env.int("LLM_DEFAULT_CONTEXT_TOKENS", default=8192)
+    TOKEN_CACHE_MAX_ENTRIES = env.int("TOKEN_CACHE_MAX_ENTRIES", default=50000)
+    HISTORY_TRIM_BLOCK = env.int("HISTORY_TRIM_BLOCK", default=10)
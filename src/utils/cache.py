@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Caché en memoria acotada por número de entradas (LRU) y por antigüedad (TTL en segundos)."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _expires_at(self) -> float:
+        return time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key: Hashable, value: Any = True):
+        with self._lock:
+            self._data[key] = (self._expires_at(), value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def add(self, key: Hashable, value: Any = True) -> bool:
+        """Guarda `key` solo si no existe (o expiró). Devuelve True si se agregó."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                return False
+            self._data[key] = (self._expires_at(), value)
+            self._data.move_to_end(key)
+            self._evict()
+            return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def _evict(self):
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        # Las entradas más antiguas están al inicio; limpiamos las que ya expiraron
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+
+
+class SQLiteTTLStore:
+    """
+    Tabla clave/valor en SQLite local con expiración por fila. Pensada como segundo nivel,
+    persistente entre reinicios, detrás de un `LRUTTLCache`. Las filas expiradas se borran
+    automáticamente cada `prune_every` escrituras.
+    """
+
+    def __init__(self, path: str, table: str, ttl_seconds: float | None = None, prune_every: int = 1000):
+        if not table.isidentifier():
+            raise ValueError(f"Nombre de tabla inválido: '{table}'.")
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl_seconds if self.ttl_seconds else float("inf")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else default
+
+    def set(self, key: str, value: str = ""):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._expires_at()),
+            )
+            self._after_write()
+
+    def add(self, key: str, value: str = "") -> bool:
+        """Inserta `key` solo si no existe (o expiró), de forma atómica. Devuelve True si se agregó."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""INSERT INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+                WHERE {self.table}.expires_at <= ?""",
+                (key, value, self._expires_at(), time.time()),
+            )
+            self._after_write()
+            return cursor.rowcount > 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._prune()
+
+    def _prune(self) -> int:
+        cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Pasar `extra=SAMPLED` en un log de payload para que se registre solo una fracción de las veces
+SAMPLED = {"sampled": True}
+
+_payload_max_chars = 2000
+
+
+class Payload:
+    """
+    Payload para loguear de forma perezosa: solo se serializa si el registro se emite, y se
+    trunca a `max_chars`. `obj` puede ser un callable (p. ej. `doc.to_json`) para no pagar ni
+    la construcción del dict cuando el nivel está deshabilitado.
+    """
+
+    __slots__ = ("obj", "max_chars")
+
+    def __init__(self, obj: Any | Callable[[], Any], max_chars: int | None = None):
+        self.obj = obj
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        obj = self.obj() if callable(self.obj) else self.obj
+        text = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, default=str)
+        max_chars = self.max_chars or _payload_max_chars
+        if len(text) > max_chars:
+            return f"{text[:max_chars]}... [{len(text) - max_chars} caracteres más]"
+        return text
+
+
+def payload(obj: Any | Callable[[], Any], max_chars: int | None = None) -> Payload:
+    return Payload(obj, max_chars)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar solo `rate` de los registros marcados con `extra=SAMPLED`."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and self.rate < 1.0:
+            return random.random() < self.rate
+        return True
+
+
+def parse_levels(levels: str) -> dict[str, str]:
+    """`"src.agent=DEBUG,src.firebase=WARNING"` -> `{"src.agent": "DEBUG", "src.firebase": "WARNING"}`."""
+    parsed = {}
+    for item in levels.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def setup_logging(
+    level: str = "INFO",
+    levels: str = "",
+    *,
+    payload_max_chars: int = 2000,
+    sample_rate: float = 1.0,
+) -> QueueListener:
+    """
+    Configura el logging del servicio: nivel global, niveles por subsistema (nombre de módulo),
+    y un `QueueHandler` para que la escritura a consola ocurra en el hilo del `QueueListener`
+    y no en los hilos que atienden las requests.
+    """
+    global _payload_max_chars
+    _payload_max_chars = payload_max_chars
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    for name, subsystem_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener: QueueListener):
+    """Vacía la cola y detiene el hilo del listener; se puede llamar más de una vez."""
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,78 @@
+import math
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Percentil `q` (0-100) por el método nearest-rank. Devuelve 0.0 si no hay datos."""
+    data = sorted(values)
+    if not data:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(data)))
+    return data[min(rank, len(data)) - 1]
+
+
+class RollingWindow:
+    """Ventana acotada de muestras (latencias, tiempos de espera...) con resumen por percentiles."""
+
+    def __init__(self, max_samples: int = 1000):
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, q)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            count, total, max_ = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "max": max_,
+        }
+
+
+class Histogram:
+    """Conteos por bucket de límites fijos (cada bucket incluye su límite superior; el último es +inf)."""
+
+    def __init__(self, bounds: Iterable[float]):
+        self.bounds = sorted(bounds)
+        self._buckets = [0] * (len(self.bounds) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        with self._lock:
+            self._buckets[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def summary(self) -> dict:
+        with self._lock:
+            buckets = list(self._buckets)
+            count, total = self.count, self.total
+        labels = [f"<={bound:g}" for bound in self.bounds] + ["+inf"]
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "buckets": dict(zip(labels, buckets)),
+        }
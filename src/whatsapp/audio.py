@@ -0,0 +1,214 @@
+import io
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from pydub import AudioSegment
+    from pydub.exceptions import CouldntDecodeError, CouldntEncodeError
+    from pydub.silence import detect_nonsilent
+except ImportError:
+    AudioSegment = None
+    CouldntDecodeError = CouldntEncodeError = ValueError
+
+from src.components.llms import TRANSCRIPTION_ERROR_PREFIX, BaseGenericLLM, default_llms
+from src.settings.settings import Config
+from src.utils.stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+# Lo que Whisper usa internamente: mandar más resolución solo agranda la subida
+SAMPLE_RATE = 16000
+
+
+class AudioChunk:
+    """Un tramo de la nota ya codificado para subir; `index` es su orden en la nota."""
+
+    def __init__(self, index: int, start_ms: int, end_ms: int, data: bytes, filename: str):
+        self.index = index
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.data = data
+        self.filename = filename
+
+
+def load_audio(data: bytes, fmt: str | None = None) -> "AudioSegment":
+    """Decodifica la nota (OGG/Opus en WhatsApp, o lo que entienda ffmpeg) a PCM mono de 16 kHz y 16 bits."""
+    audio = AudioSegment.from_file(io.BytesIO(data), format=fmt)
+    return audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+
+
+def speech_ranges(audio: "AudioSegment", *, min_silence_ms: int, silence_thresh_db: float) -> list[list[int]]:
+    """Tramos con voz `[inicio, fin]` en ms; el umbral de silencio es relativo al nivel medio de la nota."""
+    if audio.dBFS == float("-inf"):
+        return []
+    return detect_nonsilent(
+        audio, min_silence_len=min_silence_ms, silence_thresh=audio.dBFS + silence_thresh_db, seek_step=10
+    )
+
+
+def chunk_bounds(
+    ranges: list[list[int]],
+    *,
+    length_ms: int,
+    chunk_ms: int,
+    max_chunk_ms: int,
+    keep_silence_ms: int,
+) -> list[tuple[int, int]]:
+    """
+    Agrupa los tramos con voz en chunks de hasta `chunk_ms`, cortando siempre en un silencio. El
+    silencio del principio y del final queda afuera, un tramo sin pausas de más de `max_chunk_ms`
+    se parte a la fuerza y un último chunk muy corto se une al anterior (el proveedor cobra un
+    mínimo por petición). Cada chunk conserva `keep_silence_ms` de silencio a cada lado.
+    """
+    bounds: list[list[int]] = []
+    for start, end in ranges:
+        while end - start > max_chunk_ms:
+            bounds.append([start, start + max_chunk_ms])
+            start += max_chunk_ms
+        if bounds and end - bounds[-1][0] <= chunk_ms:
+            bounds[-1][1] = end
+        else:
+            bounds.append([start, end])
+
+    if len(bounds) > 1 and bounds[-1][1] - bounds[-1][0] < chunk_ms / 3 and bounds[-1][1] - bounds[-2][0] <= max_chunk_ms:
+        last = bounds.pop()
+        bounds[-1][1] = last[1]
+
+    return [(max(0, start - keep_silence_ms), min(length_ms, end + keep_silence_ms)) for start, end in bounds]
+
+
+class ChunkedTranscriber:
+    """
+    Transcripción de notas de voz largas en paralelo: decodifica, pasa a 16 kHz mono, descarta
+    el silencio de los bordes, corta en los silencios en chunks de ~`chunk_seconds` y los transcribe
+    a la vez (hasta `workers` en vuelo), uniendo los textos en orden.
+
+    Las notas que entran en un solo chunk se mandan tal cual (el OGG/Opus original pesa menos que
+    el chunk recodificado). Sin pydub/ffmpeg, si la nota no se puede decodificar o si falla algún
+    chunk, se transcribe la nota completa en una sola petición.
+    """
+
+    def __init__(
+        self,
+        llm: BaseGenericLLM,
+        *,
+        chunk_seconds: float = 30.0,
+        max_chunk_seconds: float = 60.0,
+        min_silence_ms: int = 400,
+        silence_thresh_db: float = -16.0,
+        keep_silence_ms: int = 150,
+        chunk_format: str = "flac",
+        workers: int = 4,
+    ):
+        self.llm = llm
+        self.chunk_ms = int(chunk_seconds * 1000)
+        self.max_chunk_ms = int(max_chunk_seconds * 1000)
+        self.min_silence_ms = min_silence_ms
+        self.silence_thresh_db = silence_thresh_db
+        self.keep_silence_ms = keep_silence_ms
+        self.chunk_format = chunk_format
+        self.workers = workers
+        self._pool: ThreadPoolExecutor | None = None
+        self.preprocessing = RollingWindow()
+        self.chunks = RollingWindow()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcription")
+            return self._pool
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def split(self, data: bytes) -> list[AudioChunk]:
+        """Los chunks a transcribir (vacío si la nota es solo silencio)."""
+        audio = load_audio(data)
+        ranges = speech_ranges(audio, min_silence_ms=self.min_silence_ms, silence_thresh_db=self.silence_thresh_db)
+        bounds = chunk_bounds(
+            ranges,
+            length_ms=len(audio),
+            chunk_ms=self.chunk_ms,
+            max_chunk_ms=self.max_chunk_ms,
+            keep_silence_ms=self.keep_silence_ms,
+        )
+        if not bounds:
+            return []
+        if len(bounds) == 1:
+            # Un solo chunk: no vale la pena recodificarlo
+            return [AudioChunk(0, *bounds[0], data, "")]
+
+        chunks = []
+        for index, (start, end) in enumerate(bounds):
+            buffer = io.BytesIO()
+            audio[start:end].export(buffer, format=self.chunk_format)
+            chunks.append(AudioChunk(index, start, end, buffer.getvalue(), f"chunk-{index}.{self.chunk_format}"))
+        return chunks
+
+    def _single(self, data: bytes, filename: str) -> str:
+        return self.llm.audio_transcription_llm(audio=data, filename=filename)
+
+    def transcribe(self, data: bytes, filename: str = "audio.ogg") -> str:
+        if AudioSegment is None:
+            self._count("single_shot")
+            return self._single(data, filename)
+
+        start = time.perf_counter()
+        try:
+            chunks = self.split(data)
+        except (CouldntDecodeError, OSError, IndexError) as e:
+            logger.warning("No se pudo preparar el audio %s, se transcribe entero: %s", filename, e)
+            self._count("decode_failed")
+            return self._single(data, filename)
+        except CouldntEncodeError as e:
+            # Falló al recodificar los chunks: como en una sola petición, el error va como texto
+            logger.error("No se pudieron codificar los chunks de %s: %s", filename, e)
+            self._count("encode_failed")
+            return f"{TRANSCRIPTION_ERROR_PREFIX}: {e}"
+        self.preprocessing.add(time.perf_counter() - start)
+
+        if not chunks:
+            self._count("silent")
+            return ""
+        if len(chunks) == 1:
+            self._count("single_shot")
+            return self._single(data, filename)
+
+        texts = list(self.pool.map(lambda chunk: self._single(chunk.data, chunk.filename), chunks))
+        if any(text.startswith(TRANSCRIPTION_ERROR_PREFIX) for text in texts):
+            logger.warning("Falló algún chunk de %s, se transcribe entero", filename)
+            self._count("fallback")
+            return self._single(data, filename)
+
+        self._count("chunked")
+        self.chunks.add(len(chunks))
+        logger.info("Audio %s transcrito en %d chunks", filename, len(chunks))
+        return " ".join(text.strip() for text in texts if text and text.strip())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "counts": counts,
+            "preprocessing_seconds": self.preprocessing.summary(),
+            "chunks_per_note": self.chunks.summary(),
+        }
+
+
+chunked_transcriber = ChunkedTranscriber(
+    default_llms["from_groq_whisper_large"],
+    chunk_seconds=Config.AUDIO_CHUNK_SECONDS,
+    max_chunk_seconds=Config.AUDIO_MAX_CHUNK_SECONDS,
+    min_silence_ms=Config.AUDIO_MIN_SILENCE_MS,
+    silence_thresh_db=Config.AUDIO_SILENCE_THRESH_DB,
+    keep_silence_ms=Config.AUDIO_KEEP_SILENCE_MS,
+    chunk_format=Config.AUDIO_CHUNK_FORMAT,
+    workers=Config.AUDIO_TRANSCRIPTION_WORKERS,
+)
@@ -0,0 +1,208 @@
+import io
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from src.components.llms import default_llms
+from src.settings.settings import Config
+from src.utils.logs import payload
+from src.utils.stats import RollingWindow
+from src.whatsapp.audio import chunked_transcriber
+from src.whatsapp.requests.requests_ import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 64 * 1024
+
+
+class MediaTooLarge(Exception):
+    """El media supera `MEDIA_MAX_BYTES` (según los metadatos, el `Content-Length` o lo ya descargado)."""
+
+    def __init__(self, media_id: str, size: int, max_bytes: int):
+        super().__init__(f"Media {media_id}: {size} bytes, máximo {max_bytes}")
+        self.size = size
+
+
+class VoiceNote:
+    """Una nota de voz descargada en memoria; `path` solo si se retuvo en disco."""
+
+    def __init__(self, media_id: str, user_id: str, data: bytes, mime_type: str = "audio/ogg"):
+        self.media_id = media_id
+        self.user_id = user_id
+        self.data = data
+        self.mime_type = mime_type
+        self.path: str | None = None
+
+    @property
+    def filename(self) -> str:
+        # Whisper deduce el formato de la extensión
+        return f"{self.media_id}.ogg"
+
+
+class MediaRetention:
+    """
+    Copia opcional de las notas de voz en `directory/users/<id>/` (para depurar transcripciones).
+    Los archivos con más de `max_age_seconds` se borran, revisando como mucho cada `purge_interval`.
+    """
+
+    def __init__(self, directory: str, max_age_seconds: float, purge_interval: float = 300.0):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    def store(self, note: VoiceNote) -> str:
+        save_path = os.path.join(self.directory, "users", str(note.user_id))
+        os.makedirs(save_path, exist_ok=True)
+        file_path = os.path.abspath(os.path.join(save_path, note.filename))
+        with open(file_path, "wb") as audio_file:
+            audio_file.write(note.data)
+        self.purge()
+        return file_path
+
+    def purge(self, force: bool = False) -> int:
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_purge < self.purge_interval:
+                return 0
+            self._last_purge = now
+
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(file_path) > self.max_age_seconds:
+                        os.remove(file_path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info("Retención de media: %d archivos borrados", removed)
+        return removed
+
+
+class MediaStats:
+    """Latencia de descarga y de transcripción por separado, tamaños y resultados."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.download = RollingWindow(max_samples)
+        self.transcription = RollingWindow(max_samples)
+        self.size_bytes = RollingWindow(max_samples)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "counts": counts,
+            "download_seconds": self.download.summary(),
+            "transcription_seconds": self.transcription.summary(),
+            "size_bytes": self.size_bytes.summary(),
+        }
+
+
+media_stats = MediaStats()
+media_retention = (
+    MediaRetention(Config.MEDIA_RETENTION_DIR, Config.MEDIA_RETENTION_SECONDS)
+    if Config.MEDIA_RETENTION_DIR
+    else None
+)
+
+
+def _read_capped(response: requests.Response, media_id: str, max_bytes: int) -> bytes:
+    """Lee el cuerpo en chunks y corta apenas pasa `max_bytes`, sin esperar el resto."""
+    length = int(response.headers.get("Content-Length") or 0)
+    if length > max_bytes:
+        raise MediaTooLarge(media_id, length, max_bytes)
+
+    buffer = io.BytesIO()
+    for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise MediaTooLarge(media_id, buffer.tell(), max_bytes)
+    return buffer.getvalue()
+
+
+def download_voice_note(
+    media_id: str,
+    user_id: str,
+    *,
+    session: requests.Session = WhatsAppSession,
+    max_bytes: int = Config.MEDIA_MAX_BYTES,
+    timeout: float = Config.MEDIA_DOWNLOAD_TIMEOUT_SECONDS,
+) -> VoiceNote | None:
+    """
+    Descarga la nota de voz a memoria: los metadatos y el archivo por la misma sesión (pool de
+    conexiones y token de Meta ya configurados), en streaming y con tope de tamaño.
+    """
+    start = time.perf_counter()
+    try:
+        response = session.get(f"{Config.META_BASE_ENDPOINT}/{media_id}", timeout=timeout)
+        if response.status_code != 200:
+            logger.error("Failed to get media URL: %s", payload(response.text))
+            media_stats.count("failed")
+            return None
+
+        metadata = response.json()
+        if int(metadata.get("file_size") or 0) > max_bytes:
+            raise MediaTooLarge(media_id, int(metadata["file_size"]), max_bytes)
+
+        with session.get(metadata.get("url"), stream=True, timeout=timeout) as media_response:
+            if media_response.status_code != 200:
+                logger.error(
+                    "Audio couldn't be downloaded (%s): %s",
+                    media_response.status_code,
+                    payload(media_response.text),
+                )
+                media_stats.count("failed")
+                return None
+            data = _read_capped(media_response, media_id, max_bytes)
+
+    except MediaTooLarge as e:
+        logger.warning("Nota de voz descartada: %s", e)
+        media_stats.count("too_large")
+        return None
+    except requests.RequestException:
+        logger.exception("Error al descargar el media %s", media_id)
+        media_stats.count("failed")
+        return None
+
+    elapsed = time.perf_counter() - start
+    media_stats.download.add(elapsed)
+    media_stats.size_bytes.add(len(data))
+    media_stats.count("downloaded")
+    logger.info("Audio %s descargado en memoria: %d bytes en %.2fs", media_id, len(data), elapsed)
+
+    note = VoiceNote(media_id, user_id, data, metadata.get("mime_type") or "audio/ogg")
+    if media_retention:
+        try:
+            note.path = media_retention.store(note)
+            media_stats.count("retained")
+        except OSError:
+            logger.exception("No se pudo guardar la copia de %s", media_id)
+    return note
+
+
+def transcribe_voice_note(note: VoiceNote) -> str:
+    """Transcribe desde memoria con Whisper (en chunks paralelos si es larga) y registra la latencia."""
+    start = time.perf_counter()
+    if Config.AUDIO_CHUNKING_ENABLED:
+        transcription = chunked_transcriber.transcribe(note.data, note.filename)
+    else:
+        transcription = default_llms["from_groq_whisper_large"].audio_transcription_llm(
+            audio=note.data, filename=note.filename
+        )
+    media_stats.transcription.add(time.perf_counter() - start)
+    media_stats.count("transcribed")
+    return transcription
@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import Counter
+
+from src.settings.settings import Config
+from src.utils.cache import LRUTTLCache, SQLiteTTLStore
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCache:
+    """
+    Transcripciones por contenido: la clave es el `sha256` que manda Meta en el webhook (igual
+    para todas las copias reenviadas de una nota) y el idioma. Con un acierto no se descarga
+    el audio ni se llama a Whisper.
+
+    Nivel 1: LRU en memoria con TTL. Nivel 2 (opcional, si se pasa `sqlite_path`): SQLite
+    local, para no perder las transcripciones tras un reinicio. Ambos niveles expiran solos.
+    """
+
+    def __init__(self, *, max_entries: int = 10000, ttl_seconds: float = 2592000, sqlite_path: str | None = None):
+        self.memory = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.store = (
+            SQLiteTTLStore(sqlite_path, "transcriptions", ttl_seconds=ttl_seconds)
+            if sqlite_path
+            else None
+        )
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sha256: str, language: str) -> str:
+        return f"{language}:{sha256}"
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def get(self, sha256: str, language: str = Config.LANGUAGE) -> str | None:
+        if not sha256:
+            self._count("no_sha256")
+            return None
+
+        key = self._key(sha256, language)
+        transcription = self.memory.get(key)
+        if transcription is not None:
+            self._count("memory_hits")
+            return transcription
+
+        if self.store:
+            try:
+                transcription = self.store.get(key)
+            except Exception as error:
+                logger.error("Error en la caché de transcripciones SQLite: %s", error)
+            if transcription is not None:
+                self.memory.set(key, transcription)
+                self._count("sqlite_hits")
+                return transcription
+
+        self._count("misses")
+        return None
+
+    def set(self, sha256: str, transcription: str, language: str = Config.LANGUAGE):
+        if not sha256:
+            return
+        key = self._key(sha256, language)
+        self.memory.set(key, transcription)
+        if self.store:
+            try:
+                self.store.set(key, transcription)
+            except Exception as error:
+                logger.error("Error en la caché de transcripciones SQLite: %s", error)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        hits = counts.get("memory_hits", 0) + counts.get("sqlite_hits", 0)
+        lookups = hits + counts.get("misses", 0)
+        return {
+            "counts": counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "sqlite": bool(self.store),
+        }
+
+
+transcription_cache = TranscriptionCache(
+    max_entries=Config.TRANSCRIPTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.TRANSCRIPTION_CACHE_TTL_SECONDS,
+    sqlite_path=Config.TRANSCRIPTION_CACHE_SQLITE_PATH or None,
+)
@@ -316,14 +316,11 @@ class WhatsAppMessage:
     
     @classmethod
     def is_notification(cls, body_dict: Dict[str, Any]):
-        body = cls.from_json(body_dict)
+        """True si el webhook no trae ningún mensaje (solo statuses u otras notificaciones)."""
         try:
-            for entry in body.entry:
-                for change in entry.changes:
-                    if not change.value.messages:
-                        # no message, it's a notification
-                        logging.info("Notification received, skipping")
-                        return True
+            if WebhookPayload(body_dict).is_notification:
+                logging.info("Notification received, skipping")
+                return True
         except Exception as error:
             logging.error("isNotification failed", exc_info=True)
             return False
@@ -337,12 +334,14 @@ class WhatsAppMessage:
 
 
 class MessageInfo:
-    def __init__(self, content: str, type: str, time: str, role: str, username: str):
+    def __init__(self, content: str, type: str, time: str, role: str, username: str, sha256: str = ""):
         self.content = content
         self.type = type
         self.time = time
         self.role = role
         self.username = username
+        # Hash del media (audios): igual en todas las copias reenviadas
+        self.sha256 = sha256
 
     @classmethod
     def from_json(cls, data: dict):
@@ -352,6 +351,7 @@ class MessageInfo:
             time=data.get("time", ""),
             role=data.get("role", ""),
             username=data.get("username", ""),
+            sha256=data.get("sha256", ""),
         )
     
     def to_json(self):
@@ -361,6 +361,7 @@ class MessageInfo:
             "time": self.time,
             "role": self.role,
             "username": self.username,
+            "sha256": self.sha256,
         }
 
 
@@ -404,87 +405,208 @@ class Props:
     
     @classmethod
     def filter_message_data(cls, body_json: Dict[str, Any]) -> "Props":
-        bot_phone_number = ""
-        bot_phone_number_id = ""
-        user_phone_number = ""
-        user_name = ""
-        local_message = None
-        context = None
-        id = ""
-
-        body = WhatsAppMessage.from_json(body_json)
+        """Devuelve solo el primer mensaje del webhook. Ver `filter_messages_data`."""
+        messages_data = cls.filter_messages_data(body_json)
+        if messages_data:
+            return messages_data[0]
 
-        try:
-            for entry in body.entry:
-                for change in entry.changes:
-                    if not change.value.messages:
-                        continue
-
-                    for message in change.value.messages:
-                        if message.context:
-                            context = {
-                                "from": message.context.from_,
-                                "id": message.context.id,
-                            }
-
-                        user_name = change.value.contacts[0].profile.name
-                        user_phone_number = message.from_
-                        bot_phone_number = change.value.metadata.display_phone_number
-                        bot_phone_number_id = change.value.metadata.phone_number_id
-                        id = message.id
-                        local_message = message
-
-                        if message.type not in ["text", "button", "interactive", "audio"]:
-                            props_dict = {
-                                "messageInfo": {
-                                    "content": "not-allowed",
-                                    "type": local_message.type if local_message else "",
-                                    "time": (
-                                        local_message.timestamp if local_message else ""
-                                    ),
-                                    "role": "user",
-                                    "username": user_name,
-                                },
-                                "id": id,
-                                "userPhoneNumber": user_phone_number,
-                                "botPhoneNumber": bot_phone_number,
-                                "botPhoneNumberId": bot_phone_number_id,
-                            }
-
-                            return cls.from_json(props_dict)
-                        else:
-                            message_info = {
-                                "content": message.get_important_content(),
-                                "type": message.type,
-                                "time": message.timestamp,
-                                "username": user_name,
-                                "role": "user",
-                            }
-                            props_dict = {
-                                "context": context,
-                                "messageInfo": message_info,
-                                "userPhoneNumber": user_phone_number,
-                                "botPhoneNumber": bot_phone_number,
-                                "botPhoneNumberId": bot_phone_number_id,
-                                "id": id,
-                            }
-                            return cls.from_json(props_dict)
-
-        except Exception as e:
-            print("isAllowedTypeMessage failed", e)
-
-            props_dict = {
+        return cls.from_json(
+            {
                 "messageInfo": {
                     "content": "not-allowed",
-                    "type": local_message.type if local_message else "",
-                    "time": local_message.timestamp if local_message else "",
-                    "username": user_name,
+                    "type": "",
+                    "time": "",
+                    "username": "",
                     "role": "user",
                 },
-                "id": id,
-                "userPhoneNumber": user_phone_number,
-                "botPhoneNumber": bot_phone_number,
-                "botPhoneNumberId": bot_phone_number_id,
+                "id": "",
+                "userPhoneNumber": "",
+                "botPhoneNumber": "",
+                "botPhoneNumberId": "",
             }
+        )
+
+    @classmethod
+    def filter_messages_data(cls, body_json: Dict[str, Any]) -> List["Props"]:
+        """
+        Convierte un webhook de Meta en una lista de Props, uno por cada mensaje de
+        todos los `entry`/`changes`/`messages` del body, ordenados por timestamp.
+        """
+        return WebhookPayload(body_json).to_props()
+
+
+def _timestamp_key(timestamp: str) -> int:
+    try:
+        return int(timestamp)
+    except (TypeError, ValueError):
+        return 0
+
+
+# Parser perezoso del webhook: una sola pasada por entry/changes/value para clasificar y
+# extraer, sin construir el árbol completo de objetos. Los sub-objetos (Text, Audio...)
+# se crean solo al accederlos y se guardan en su slot.
+
+_ALLOWED_TYPES = ("text", "button", "interactive", "audio")
+
+
+class ValueView:
+    __slots__ = ("_data", "_metadata")
+
+    def __init__(self, data: dict):
+        self._data = data
+        self._metadata = None
 
-        return cls.from_json(props_dict)
+    @property
+    def metadata(self) -> Metadata:
+        if self._metadata is None:
+            self._metadata = Metadata.from_json(self._data.get("metadata") or {})
+        return self._metadata
+
+    def contact_name(self, wa_id: str) -> str:
+        contacts = self._data.get("contacts") or ()
+        for contact in contacts:
+            if contact.get("wa_id") == wa_id:
+                return (contact.get("profile") or {}).get("name", "")
+        return (contacts[0].get("profile") or {}).get("name", "") if contacts else ""
+
+
+class MessageView:
+    __slots__ = ("_data", "value", "_context", "_text", "_button", "_image", "_audio")
+
+    def __init__(self, data: dict, value: ValueView):
+        self._data = data
+        self.value = value
+        self._context = None
+        self._text = None
+        self._button = None
+        self._image = None
+        self._audio = None
+
+    @property
+    def id(self) -> str:
+        return self._data.get("id", "")
+
+    @property
+    def from_(self) -> str:
+        return self._data.get("from", "")
+
+    @property
+    def timestamp(self) -> str:
+        return self._data.get("timestamp", "")
+
+    @property
+    def type(self) -> str:
+        return self._data.get("type", "")
+
+    @property
+    def context(self) -> Context:
+        if self._context is None:
+            self._context = Context.from_json(self._data.get("context") or {})
+        return self._context
+
+    @property
+    def text(self) -> Text:
+        if self._text is None:
+            self._text = Text.from_json(self._data.get("text") or {})
+        return self._text
+
+    @property
+    def button(self) -> Button:
+        if self._button is None:
+            self._button = Button.from_json(self._data.get("button") or {})
+        return self._button
+
+    @property
+    def image(self) -> Image:
+        if self._image is None:
+            self._image = Image.from_json(self._data.get("image") or {})
+        return self._image
+
+    @property
+    def audio(self) -> Audio:
+        if self._audio is None:
+            self._audio = Audio.from_json(self._data.get("audio") or {})
+        return self._audio
+
+    def get_important_content(self) -> str:
+        if self.type == "button":
+            return self.button.text
+        if self.type == "text":
+            return self.text.body
+        if self.type == "interactive":
+            return "interactive"
+        if self.type == "audio":
+            return self.audio.id
+        return ""
+
+    def to_props(self) -> Props:
+        user_name = ""
+        try:
+            user_name = self.value.contact_name(self.from_)
+            allowed = self.type in _ALLOWED_TYPES
+            return Props(
+                id=self.id,
+                context=self.context if allowed else Context("", ""),
+                messageInfo=MessageInfo(
+                    content=self.get_important_content() if allowed else "not-allowed",
+                    type=self.type,
+                    time=self.timestamp,
+                    role="user",
+                    username=user_name,
+                    sha256=self.audio.sha256 if allowed and self.type == "audio" else "",
+                ),
+                userPhoneNumber=self.from_,
+                botPhoneNumber=self.value.metadata.display_phone_number,
+                botPhoneNumberId=self.value.metadata.phone_number_id,
+            )
+
+        except Exception as e:
+            logging.error(f"isAllowedTypeMessage failed: {e}")
+            return Props(
+                id=self._data.get("id", "") if isinstance(self._data, dict) else "",
+                context=Context("", ""),
+                messageInfo=MessageInfo(
+                    content="not-allowed",
+                    type="",
+                    time="",
+                    role="user",
+                    username=user_name,
+                ),
+                userPhoneNumber="",
+                botPhoneNumber="",
+                botPhoneNumberId="",
+            )
+
+
+class WebhookPayload:
+    """
+    Clasificación y extracción de un body del webhook en una sola pasada. Se usa tanto para
+    saber si es una notificación como para obtener los Props de cada mensaje.
+    """
+
+    __slots__ = ("_data", "messages", "statuses")
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        self.messages: List[MessageView] = []
+        self.statuses: List[dict] = []
+
+        for entry in data.get("entry") or ():
+            for change in entry.get("changes") or ():
+                value = change.get("value") or {}
+                messages = value.get("messages")
+                if messages:
+                    value_view = ValueView(value)
+                    self.messages.extend(MessageView(message, value_view) for message in messages)
+                statuses = value.get("statuses")
+                if statuses:
+                    self.statuses.extend(statuses)
+
+    @property
+    def is_notification(self) -> bool:
+        return not self.messages
+
+    def to_props(self) -> List[Props]:
+        props_list = [message.to_props() for message in self.messages]
+        props_list.sort(key=lambda props: _timestamp_key(props.messageInfo.time))
+        return props_list
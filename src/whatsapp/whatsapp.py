@@ -7,11 +7,18 @@ from src.agent.tools.google_auth import google_auth_url
 from src.agent.tools.calendar_events import list_events, manage_events
 from src.settings.settings import Config
 from src.components.memory import Memory
-from src.agent.agent_ import AgentExecutor, default_agent, default_llms
-from src.whatsapp.requests.requests_ import WhatsAppSession, requests
+from src.agent.agent_ import AgentExecutor, default_agent
+from src.whatsapp.requests.requests_ import WhatsAppSession
+from src.whatsapp.media import download_voice_note, transcribe_voice_note
+from src.whatsapp.transcriptions import transcription_cache
+from src.components.llms import TRANSCRIPTION_ERROR_PREFIX
 from src.firebase.users_manager import UserManager
+from src.google.google_services import db
+from src.utils.logs import payload
 import logging
 
+logger = logging.getLogger(__name__)
+
 tools: dict[str, BaseTool] = {
     "email_scheduler": email_scheduler,
     "google_auth_url": google_auth_url,
@@ -43,110 +50,104 @@ def send_whatsapp_message(
             r = response.json()
             waid = r["messages"][0]["id"]
 
-            print("Mensaje enviado:", response.json())
+            logger.info("Mensaje enviado a %s: %s", to_phone, waid)
             return waid
         else:
-            print(f"Error {response.status_code}: {response.text}")
+            logger.error("Error %s al enviar mensaje: %s", response.status_code, payload(response.text))
 
             return ""
 
-    except Exception as e:
-        logging.error(e)
+    except Exception:
+        logger.exception("Error al enviar mensaje a %s", to_phone)
         return ""
 
 
-def download_whatsapp_voice_note(audio_id: str, user_id):
-    url = f"{Config.META_BASE_ENDPOINT}/{audio_id}"
-    response = WhatsAppSession.get(url)
-    # WhatsAppSession.headers.update(
-    #     {
-    #         "Content-Type": "audio/ogg",
-    #     }
-    # )
-
-    if response.status_code == 200:
-        media_url = response.json().get("url")
-        # Step 2: Download the media
-        media_response = requests.get(
-            media_url,
-            headers={
-                "Authorization": f"Bearer {Config.META_TOKEN}",  # Si la URL no incluye la autorización
-            },
-        )
-        if media_response.status_code == 200:
-            import os
-
-            save_path = f"../../media/users/{user_id}"
-            os.makedirs(save_path, exist_ok=True)
-
-            # Construir la ruta completa
-            file_path = os.path.join(save_path, f"{audio_id}.ogg")
-            with open(file_path, "wb") as audio_file:
-                audio_file.write(media_response.content)
-            logging.info(f"Audio downloaded successfully as {audio_id}.ogg")
-            full_file_path = os.path.abspath(file_path)
-            return full_file_path
-        else:
-            logging.error(media_response.status_code)
-            logging.error(media_response.text)
-            logging.error("Audio couldn't be downloaded")
-            return None
-    else:
-        logging.error(f"Failed to get media URL: {response.text}")
-        return None
-
-
-def chat_manager(db: firestore.Client, message_data: wsp_types.Props):
+def get_user_content(message_data: wsp_types.Props) -> str | None:
+    """Texto que el agente debe leer para un mensaje: el cuerpo si es texto o la transcripción si es audio."""
     content = message_data.messageInfo.content
     message_type = message_data.messageInfo.type
 
-    user_phone = message_data.userPhoneNumber
-    bot_phone = message_data.botPhoneNumber
-    waid = message_data.id
+    if message_type == "text":
+        return content
+
+    if message_type == "audio":
+        # Las notas reenviadas traen el mismo sha256: con un acierto no se descarga ni se transcribe
+        sha256 = message_data.messageInfo.sha256
+        cached = transcription_cache.get(sha256)
+        if cached is not None:
+            logger.info("Transcripción de %s desde la caché", content)
+            return cached
+
+        voice_note = download_voice_note(content, message_data.userPhoneNumber)
+
+        if voice_note:
+            audio_transcription = transcribe_voice_note(voice_note)
+            logger.debug("Audio transcription: %s", payload(audio_transcription))
+            if not audio_transcription.startswith(TRANSCRIPTION_ERROR_PREFIX):
+                transcription_cache.set(sha256, audio_transcription)
+            return audio_transcription
+
+    return None
+
+
+def chat_manager(db: firestore.Client, messages_data: list[wsp_types.Props]):
+    """
+    Procesa en un solo turno del agente los mensajes seguidos de un mismo usuario
+    (ya agrupados y en orden por la cola de entrada).
+    """
+    if not messages_data:
+        return
+
+    last_message_data = messages_data[-1]
+    user_phone = last_message_data.userPhoneNumber
+    bot_phone = last_message_data.botPhoneNumber
 
-    user_manager = UserManager(db, user_phone, bot_phone, waid)
+    user_manager = UserManager(db, user_phone, bot_phone, last_message_data.id)
     memory = Memory(tools=tools, user_manager=user_manager)
     collector = Collector()
 
+    # Nunca el `default_agent` compartido: otro turno en paralelo le cambiaría la memoria
     agent_executor = AgentExecutor(
-                agent=default_agent, tools=tools, memory=memory, collector=collector
+                agent=default_agent.for_turn(), tools=tools, memory=memory, collector=collector
             )
 
-    if message_type == "text":
-        if waid not in user_manager.user_document.current_waids:
-            memory.add_user_message(content, waid)
-            response = agent_executor.invoke()
-
-            waid = send_whatsapp_message(
-                to_phone=memory.user_manager.user_phone,
-                message=response.final_answer,
-            )
-            memory.add_assistant_message(response.content, waid)
-            user_manager.save_to_chat()
-            return
-
-    elif message_type == "audio":
-        voice_note_path = download_whatsapp_voice_note(content, user_phone)
-        logging.info(f"Voice note downloaded in: {voice_note_path}")
-
-        if voice_note_path:
-            audio_transcription = default_llms[
-                "from_groq_whisper_large"
-            ].audio_transcription_llm(file_path=voice_note_path)
-            logging.info(f"Audio transcription: {audio_transcription}")
-
-            memory.add_user_message(audio_transcription, waid)
-            response = agent_executor.invoke()
-
-            waid = send_whatsapp_message(
-                to_phone=memory.user_manager.user_phone,
-                message=response.final_answer,
-            )
+    user_messages = []
+    for message_data in messages_data:
+        waid = message_data.id
+        if waid in user_manager.user_document.current_waids:
+            continue
 
-            memory.add_assistant_message(response.content, waid)
-            user_manager.save_to_chat()
-            return
+        content = get_user_content(message_data)
+        if content:
+            user_messages.append((content, waid))
 
+    if not user_messages:
         return
-    
-    return 
+
+    if len(user_messages) > 1:
+        logger.info(
+            "%d mensajes de %s en un solo turno, %d llamadas al LLM ahorradas.",
+            len(user_messages),
+            user_phone,
+            len(user_messages) - 1,
+        )
+
+    memory.add_user_messages(user_messages)
+    response = agent_executor.invoke()
+
+    waid = send_whatsapp_message(
+        to_phone=memory.user_manager.user_phone,
+        message=response.final_answer,
+    )
+    memory.add_assistant_message(response.content, waid)
+    user_manager.save_to_chat()
+
+
+def run_chat_task(user_phone: str, messages_data: list[wsp_types.Props]):
+    """
+    Punto de entrada de la cola de entrada. Solo recibe datos picklables (el teléfono y los
+    Props); el cliente de Firestore es el del proceso que lo ejecuta, así sirve igual para
+    el backend de hilos que para el de procesos.
+    """
+    logger.info("Turno de %s con %d mensaje(s)", user_phone, len(messages_data))
+    chat_manager(db, messages_data)